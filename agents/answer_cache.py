@@ -0,0 +1,188 @@
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.execution_context import get_execution_context
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Stems of operation words and of their opposites. Questions that differ in any of them, or in a negation, ask
+# for different things however close their embeddings are, e.g. "create an instance" and "terminate an instance".
+INTENT_STEMS = ("creat", "launch", "start", "run", "stop", "terminat", "reboot", "delet", "remov", "destroy", "enabl",
+                "disabl", "allow", "deny", "block", "grant", "revok", "attach", "detach", "add", "updat", "modif",
+                "chang", "resiz", "increas", "decreas", "open", "clos", "encrypt", "decrypt", "public", "privat",
+                "restor", "backup", "cop", "mov", "renam", "upload", "download", "import", "export", "list",
+                "describ", "show", "get")
+# "t" is what the tokenizer leaves of don't, can't, isn't, ...
+NEGATIONS = {"not", "no", "never", "without", "t"}
+
+
+def intent(query: str) -> FrozenSet[str]:
+    """
+    The operation stems and negations of a question.
+    """
+    words = TOKEN_PATTERN.findall(query.lower())
+    return frozenset(stem for word in words for stem in INTENT_STEMS if word.startswith(stem)) | \
+        NEGATIONS.intersection(words)
+
+
+class HashingEmbedder:
+    """
+    Local embedding of a question: hashed words and word bigrams, L2-normalized.
+
+    Needs no model or network call, which is enough to match rephrasings and repeats of the same question.
+    Any LangChain `Embeddings.embed_query` can be used instead.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def __call__(self, text: str) -> np.ndarray:
+        words = TOKEN_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return vector
+
+
+class AnswerCache:
+    """
+    Semantic cache of final answers to questions that needed no tool call.
+
+    Questions are embedded into rows of a NumPy matrix and looked up by cosine similarity against every live
+    entry at once. A lookup hits when the closest question of the same namespace (the model) and the same AWS
+    profile of the execution context scores at least `threshold`, so users never get each other's answers.
+    Both questions also need the same operation words and negations (see `intent`), since a bag of words
+    can't tell "enable public access" from "disable public access".
+    Entries expire after `ttl` seconds and the least recently used one is replaced once `max_entries` is
+    reached. Answers built from tool output are account-specific and never stored.
+    """
+
+    def __init__(self, embedder: Optional[Callable[[str], Sequence[float]]] = None, threshold: float = 0.9,
+                 ttl: float = 3600, max_entries: int = 2048, min_words: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_words = min_words
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Allocated on the first store, once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._namespaces: List[Optional[Tuple[str, Optional[str]]]] = [None] * max_entries
+        self._intents: List[Optional[FrozenSet[str]]] = [None] * max_entries
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._elapsed = np.zeros(max_entries)
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def _embed(self, query: str) -> Optional[np.ndarray]:
+        vector = np.asarray(self.embedder(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _cacheable(self, query: str) -> bool:
+        # Short follow-ups such as "yes" or "the second one" depend on the conversation, not only the question
+        return len(TOKEN_PATTERN.findall(query.lower())) >= self.min_words
+
+    def lookup(self, namespace: str, query: str) -> Optional[str]:
+        if not self._cacheable(query):
+            self.bypassed += 1
+            return None
+        vector = self._embed(query)
+        namespace = _scoped(namespace)
+        operations = intent(query)
+        with self._lock:
+            if vector is None or self._vectors is None or not self._size:
+                self.misses += 1
+                return None
+            now = self.clock()
+            scores = self._vectors[:self._size] @ vector
+            live = self._expires[:self._size] > now
+            live &= np.fromiter((ns == namespace for ns in self._namespaces[:self._size]), bool, self._size)
+            live &= np.fromiter((ops == operations for ops in self._intents[:self._size]), bool, self._size)
+            scores[~live] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._last_used[best] = now
+            self.saved_seconds += self._elapsed[best]
+            return self._answers[best]
+
+    def store(self, namespace: str, query: str, answer: str, elapsed: float, used_tools: bool = False):
+        if used_tools or not answer or not self._cacheable(query):
+            return
+        vector = self._embed(query)
+        if vector is None:
+            return
+        namespace = _scoped(namespace)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            now = self.clock()
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Reuse an expired slot if there is one, else the least recently used
+                expired = np.flatnonzero(self._expires <= now)
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._namespaces[slot] = namespace
+            self._intents[slot] = intent(query)
+            self._answers[slot] = answer
+            self._elapsed[slot] = elapsed
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._namespaces = [None] * self.max_entries
+            self._intents = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+def _scoped(namespace: str) -> Tuple[str, Optional[str]]:
+    return namespace, get_execution_context().profile
+
+
+answer_cache = AnswerCache(
+    threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD") or 0.9),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL") or 3600),
+    max_entries=int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES") or 2048),
+)
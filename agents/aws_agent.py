@@ -1,38 +1,54 @@
 import os
-from typing import Text, Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional, Text
+from uuid import uuid4
 
 from dotenv import load_dotenv
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.memory import ConversationBufferWindowMemory
+from langchain.agents import create_tool_calling_agent
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 
-from prompts.aws_agent_prompt import prompt_template
-from tools import AWSCLICreateTool, AWSCLIDeleteTool, AWSCLIDescribeTool, AWSCLIUpdateTool, AWSCLIGetTool
+from agents.answer_cache import AnswerCache
+from agents.batch import BATCH_MAX_CONCURRENCY, abatch_ask
+from agents.budget import TurnBudget, active_budget, apartial_answer, partial_answer
+from agents.clients import clients
+from agents.confirmation import arun_pending, declined_turn, is_confirmation, is_decline, run_pending
+from agents.executor import AGENT_VERBOSE, ParallelToolAgentExecutor
+from agents.history import HISTORY_SUMMARY, ChatHistory, LLMSummarizer
+from agents.streaming import stream_agent_events
+from agents.toolset import CONSOLIDATED_AWS_TOOL, agent_tools
+from prompts.aws_agent_prompt import consolidated_tool_prompt, prompt_template
+from tools import ConfirmationGate, confirmation_gate
 
 load_dotenv()
 
 
 class AWSCLIHelperAgent:
     def __init__(self, temperature: float = 0, model_name: Text = "gpt-4o",
-                 openai_api_key: Optional[Text] = None):
+                 openai_api_key: Optional[Text] = None, llm: Optional[BaseChatModel] = None,
+                 answer_cache: Optional[AnswerCache] = None, consolidated_tool: bool = CONSOLIDATED_AWS_TOOL):
         # Load the API key from environment if not provided
         if openai_api_key is None:
             openai_api_key = os.getenv("OPENAI_API_KEY")
 
-        # Initialize the ChatOpenAI model with the specified parameters
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature, openai_api_key=openai_api_key, max_tokens=225)
+        # Initialize the ChatOpenAI model with the specified parameters, on the process-wide connection pool
+        if llm is None:
+            llm = clients.openai_chat(model_name, temperature=temperature, openai_api_key=openai_api_key,
+                                      max_tokens=225)
+        self.llm = llm
+        self.model_name = model_name
+        # Optional semantic cache of answers that needed no tool call
+        self.answer_cache = answer_cache
 
         # Initialize tools
-        self.tools = [AWSCLIUpdateTool(), AWSCLIDescribeTool(), AWSCLICreateTool(), AWSCLIDeleteTool(), AWSCLIGetTool()]
+        self.tools = agent_tools(consolidated_tool)
 
         # Define system prompt
-        self.system_prompt = prompt_template
+        self.system_prompt = consolidated_tool_prompt(prompt_template) if consolidated_tool else prompt_template
 
-        # Initialize memory for the conversation
-        self.memory = ConversationBufferWindowMemory(
-            memory_key="chat_history"
-        )
+        # Default conversation history, used when the caller doesn't pass a per-session one
+        self.summarizer = LLMSummarizer(self.llm) if HISTORY_SUMMARY else None
+        self.history = ChatHistory(k=5, summarizer=self.summarizer)
 
         # Create an agent instance
         self.agent = create_tool_calling_agent(
@@ -46,15 +62,133 @@ class AWSCLIHelperAgent:
         )
 
         # Create an agent_executor instance
-        self.agent_executor = AgentExecutor(
+        self.agent_executor = ParallelToolAgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
-            memory=self.memory
+            verbose=AGENT_VERBOSE,
+            return_intermediate_steps=True,
         )
 
-    def ask_question(self, query: str) -> Text:
-        response = self.agent_executor.invoke({
-            "user_input": query
-        })
-        return response['output']
+    def ask_question(self, query: str, history: Optional[ChatHistory] = None) -> Text:
+        history = history if history is not None else self.history
+        turn = self.run_turn(query, history)
+        history.add_turn(query, turn["output"], turn["tool_outputs"], turn["pending_action"])
+        return turn["output"]
+
+    async def ask_question_async(self, query: str, history: Optional[ChatHistory] = None) -> Text:
+        history = history if history is not None else self.history
+        turn = await self.arun_turn(query, history)
+        history.add_turn(query, turn["output"], turn["tool_outputs"], turn["pending_action"])
+        return turn["output"]
+
+    def batch_ask(self, queries: List[Dict], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict]:
+        """
+        Answers independent {"query", "context"} items concurrently, each with a fresh history, and yields
+        their results as they finish. See agents/batch.py.
+        """
+        return abatch_ask(self.arun_turn, self.new_history, queries, max_concurrency)
+
+    def run_turn(self, query: str, history: ChatHistory, callbacks: Optional[List] = None) -> Dict:
+        """
+        Answers `query` without adding it to `history`. Returns the answer, the (tool, input, output) steps that
+        produced it, the command waiting for confirmation and whether the answer came from the answer cache.
+        """
+        pending = history.pending_action
+        if pending is not None and is_confirmation(query):
+            return run_pending(self.llm, self.tools, pending, callbacks)
+        if pending is not None and is_decline(query):
+            return declined_turn()
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            return {"output": answer, "tool_outputs": [], "cached": True, "pending_action": None}
+        start = time.perf_counter()
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            response = self.agent_executor.within(budget).invoke(
+                {"chat_history": history.as_text(), "user_input": query}, config={"callbacks": callbacks})
+            if budget.exhausted:
+                # Out of iterations or time: answer from what the tools returned so far
+                response["output"] = partial_answer(self.llm, query, response["intermediate_steps"], budget,
+                                                    callbacks)
+        return self._turn(query, history, response, gate, time.perf_counter() - start, budget)
+
+    async def arun_turn(self, query: str, history: ChatHistory, callbacks: Optional[List] = None) -> Dict:
+        pending = history.pending_action
+        if pending is not None and is_confirmation(query):
+            return await arun_pending(self.llm, self.tools, pending, callbacks)
+        if pending is not None and is_decline(query):
+            return declined_turn()
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            return {"output": answer, "tool_outputs": [], "cached": True, "pending_action": None}
+        start = time.perf_counter()
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            response = await self.agent_executor.within(budget).ainvoke(
+                {"chat_history": history.as_text(), "user_input": query}, config={"callbacks": callbacks})
+            if budget.exhausted:
+                response["output"] = await apartial_answer(self.llm, query, response["intermediate_steps"], budget,
+                                                           callbacks)
+        return self._turn(query, history, response, gate, time.perf_counter() - start, budget)
+
+    def _turn(self, query: str, history: ChatHistory, response: Dict, gate: ConfirmationGate, elapsed: float,
+              budget: TurnBudget) -> Dict:
+        steps = response["intermediate_steps"]
+        if not budget.exhausted:
+            self._store_answer(query, response["output"], elapsed, bool(steps), history)
+        return {
+            "output": response["output"],
+            "tool_outputs": [(action.tool, action.tool_input, output) for action, output in steps],
+            "cached": False,
+            "pending_action": gate.pending,
+            "budget_exhausted": budget.exhausted,
+        }
+
+    async def astream(self, query: str, history: Optional[ChatHistory] = None) -> AsyncIterator[Dict]:
+        history = history if history is not None else self.history
+        if history.pending_action is not None and (is_confirmation(query) or is_decline(query)):
+            # Answered without the agent loop: run or drop the confirmed command
+            turn = await self.arun_turn(query, history)
+            for tool, tool_input, output in turn["tool_outputs"]:
+                run_id = str(uuid4())
+                yield {"event": "tool_start", "tool": tool, "run_id": run_id, "input": tool_input}
+                yield {"event": "tool_end", "tool": tool, "run_id": run_id, "status": output.get("status", "success")}
+            history.add_turn(query, turn["output"], turn["tool_outputs"])
+            yield {"event": "token", "data": turn["output"]}
+            yield {"event": "end", "output": turn["output"]}
+            return
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            history.add_turn(query, answer)
+            yield {"event": "token", "data": answer}
+            yield {"event": "end", "output": answer}
+            return
+        start = time.perf_counter()
+        used_tools = False
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            async for event in stream_agent_events(self.agent_executor.within(budget),
+                                                   {"chat_history": history.as_text(), "user_input": query}):
+                if event["event"] == "tool_start":
+                    used_tools = True
+                elif event["event"] == "end":
+                    steps = event.pop("intermediate_steps")
+                    if budget.exhausted:
+                        event["output"] = await apartial_answer(self.llm, query, steps, budget)
+                        event["budget_exhausted"] = budget.exhausted
+                        yield {"event": "token", "data": event["output"]}
+                    else:
+                        self._store_answer(query, event["output"], time.perf_counter() - start, used_tools,
+                                           history)
+                    history.add_turn(query, event["output"], pending_action=gate.pending)
+                yield event
+
+    def _cached_answer(self, query: str, history: ChatHistory) -> Optional[Text]:
+        # Answers to follow-ups depend on the conversation, which may hold account data from earlier tool output
+        if self.answer_cache is None or not history.is_empty():
+            return None
+        return self.answer_cache.lookup(self.model_name, query)
+
+    def _store_answer(self, query: str, answer: Text, elapsed: float, used_tools: bool, history: ChatHistory):
+        if self.answer_cache is not None and history.is_empty():
+            self.answer_cache.store(self.model_name, query, answer, elapsed, used_tools)
+
+    def new_history(self) -> ChatHistory:
+        return ChatHistory(k=5, summarizer=self.summarizer)
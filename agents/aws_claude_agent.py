@@ -1,33 +1,60 @@
 import os
-from typing import Text
+import time
+from typing import AsyncIterator, Dict, List, Optional, Text
+from uuid import uuid4
 
-import boto3
 from dotenv import load_dotenv
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.memory import ConversationBufferWindowMemory
+from langchain.agents import create_tool_calling_agent
 
 # from langchain_community.chat_models import BedrockChat
 from langchain_aws import ChatBedrock
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from tools import (
-    AWSCLICreateTool,
-    AWSCLIDeleteTool,
-    AWSCLIDescribeTool,
-    AWSCLIGetTool,
-    AWSCLIUpdateTool,
-)
+from agents.bedrock_caching import PromptCacheStats, PromptCachingBedrockClient, supports_prompt_caching
+from agents.answer_cache import AnswerCache
+from agents.batch import BATCH_MAX_CONCURRENCY, abatch_ask
+from agents.budget import TurnBudget, active_budget, apartial_answer, partial_answer
+from agents.clients import clients
+from agents.confirmation import arun_pending, declined_turn, is_confirmation, is_decline, run_pending
+from agents.executor import AGENT_VERBOSE, ParallelToolAgentExecutor
+from agents.history import HISTORY_SUMMARY, ChatHistory, LLMSummarizer
+from agents.streaming import stream_agent_events
+from agents.toolset import CONSOLIDATED_AWS_TOOL, agent_tools
+from prompts.aws_agent_prompt import consolidated_tool_prompt
+from tools import ConfirmationGate, confirmation_gate
 
 load_dotenv()
 
-bedrock = boto3.client(service_name="bedrock-runtime", region_name=os.getenv("AWS_REGION"))
+# Marks the system prompt and tool schemas as a cacheable prefix on the Bedrock requests of models that
+# support prompt caching, see agents/bedrock_caching.py
+PROMPT_CACHING = os.getenv("BEDROCK_PROMPT_CACHING", "true").lower() == "true"
 
 
 class AWSCLIHelperAgent:
-    def __init__(self, model_id: str):
+    """
+    Claude agent on Bedrock. With `prompt_caching` the system prompt and tool schemas are sent as a cacheable
+    prefix, but only to models on the allowlist of agents/bedrock_caching.py. The Claude 3.5 Sonnet (20240620)
+    and Claude 3 Haiku models serve.py uses are not on it, so there it takes effect once they move to newer ones.
+    """
+
+    def __init__(self, model_id: str, llm: Optional[BaseChatModel] = None, prompt_caching: bool = PROMPT_CACHING,
+                 answer_cache: Optional[AnswerCache] = None, consolidated_tool: bool = CONSOLIDATED_AWS_TOOL):
         # Initialize the Bedrock model with the specified parameters
         # self.llm = BedrockChat(model_id=model_id, client=bedrock)
-        self.messages = []
-        self.llm = ChatBedrock(model_id=model_id, client=bedrock)
+        self.model_id = model_id
+        # Optional semantic cache of answers that needed no tool call
+        self.answer_cache = answer_cache
+        self.cache_stats = PromptCacheStats()
+        if llm is None:
+            # Shared by all Claude agents, created on first use instead of at import time
+            bedrock = clients.bedrock()
+            caching = prompt_caching and supports_prompt_caching(model_id)
+            client = PromptCachingBedrockClient(bedrock, self.cache_stats) if caching else bedrock
+            llm = ChatBedrock(model_id=model_id, client=client)
+        self.llm = llm
+        # Default conversation history, used when the caller doesn't pass a per-session one
+        self.summarizer = LLMSummarizer(self.llm) if HISTORY_SUMMARY else None
+        self.history = ChatHistory(k=3, summarizer=self.summarizer)
         print("new model")
         # # Define system prompt
         self.system_prompt = (
@@ -44,6 +71,7 @@ class AWSCLIHelperAgent:
             "8. Provide the results or any relevant feedback to the user after completing the task.\n"
             "9. Do not show any backend command generation process to the user; consider the user as a layman who only wants to see the necessary information.\n"
             "10. Display the required and optional fields to the user before filling them in, and again after filling them in. Always ask for the user's confirmation to proceed before executing any task.\n"
+            "    Create, update and delete tools don't run right away: call them as soon as all fields are filled, the command is held until the user confirms and runs by itself when they type 'yes'. Never call the tool again for a command waiting for confirmation.\n"
             "    Please confirm if you want to proceed with this action. Type 'yes' to confirm or 'no' to cancel.\n"
             "11. Make sure any task related to AWS involves the necessary 'aws' commands executed in the backend, ensuring they work in the terminal.\n"
             "12. Apply AWS free-tier policy when creating resources. Ensure that resources are created within AWS free tier only.\n"
@@ -54,18 +82,16 @@ class AWSCLIHelperAgent:
             "When a user provides an input, complete the corresponding task using the appropriate AWS tools, "
             "and include any relevant notes or explanations to assist the user.\n\n"
             "Automated Field Filling:\n"
-            "- When the user mentions 'auto fill' or 'auto generate', always invoke `AWSCLIGetTool` to retrieve all required fields for the user-requested service and fill them in the described outcome.\n"
-            "- If you can't find details in the user account, use this [Amazon Linux 2023 AMI: ami-0bb84b8ffd87024d8].\n\n"
+            "- When the user mentions 'auto fill' or 'auto generate', first invoke `aws_inventory_lookup_tool` with resource 'defaults' to get the AMI, instance type, VPC, subnet, security group and key pair from the user's account, and fill them in the described outcome.\n"
+            "- Only invoke `aws_cli_get_tool` for required fields the inventory doesn't have, or when it says the inventory is not collected yet.\n\n"
             "Guardrails:\n"
             "- Limit the creation of resources to one per request. If a user attempts to create more than one resource in a single request, inform them of this limitation and ask them to create one resource at a time.\n"
             "- Ensure that the user has the necessary permissions to perform the requested action. If they do not, inform them that they need to obtain the necessary permissions before proceeding.\n"
             "- Validate all user inputs to ensure they are in the correct format and within the allowed range of values. If a user input is invalid, inform them of the error and ask them to provide a valid input.\n"
             "- Monitor the usage of AWS services to prevent any potential misuse or abuse. If suspicious activity is detected, inform the user and take appropriate action.\n"
-            "Previous conversation:\n"
-            "{chat_history}\n\n"
-            "New human question: {user_input}\n"
-            "Response:\n"
         )
+        # The system prompt is static so Bedrock can cache it. The previous conversation and the new
+        # question are sent as messages through the chat_history placeholder and the human turn.
 
         # self.system_prompt = """
         #     You are an AWS Assistant bot specialized in assisting users with their AWS service-related queries. Your primary role is to understand user requirements and provide the necessary information to help them accomplish their tasks effectively.
@@ -89,8 +115,8 @@ class AWSCLIHelperAgent:
         #             Required fields: Essential parameters for task completion.
         #             Optional fields: Non-essential parameters providing additional control or functionality.
         #         Automated Field Filling:
-        #             Use AWSCLIGetTool to auto-fill required fields when the user mentions 'auto fill' or 'auto generate'.
-        #             If details cannot be retrieved, use [Amazon Linux 2023 AMI: ami-0bb84b8ffd87024d8].
+        #             Use aws_inventory_lookup_tool to auto-fill required fields when the user mentions 'auto fill' or 'auto generate'.
+        #             Use AWSCLIGetTool for fields the inventory doesn't have.
         #     Guardrails:
         #         Resource Limitation: Limit resource creation to one per request. Inform users if they attempt to create more than one resource.
         #         Permission Checks: Ensure users have necessary permissions. Inform them if permissions are lacking.
@@ -100,14 +126,10 @@ class AWSCLIHelperAgent:
         #     Previous conversation: {chat_history}
         #     New user question: {user_input}
         #     Response:"""
+        if consolidated_tool:
+            self.system_prompt = consolidated_tool_prompt(self.system_prompt)
         # Initialize tools
-        self.tools = [
-            AWSCLIUpdateTool(),
-            AWSCLIDescribeTool(),
-            AWSCLICreateTool(),
-            AWSCLIDeleteTool(),
-            AWSCLIGetTool(),
-        ]
+        self.tools = agent_tools(consolidated_tool)
 
         # Create an agent instance
         self.agent = create_tool_calling_agent(
@@ -124,19 +146,137 @@ class AWSCLIHelperAgent:
         )
 
         # Create an agent_executor instance
-        self.agent_executor = AgentExecutor(
+        self.agent_executor = ParallelToolAgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=AGENT_VERBOSE,
+            return_intermediate_steps=True,
             # memory=ConversationBufferWindowMemory(memory_key="chat_history"),
         )
 
-    def ask_question(self, query: str) -> Text:
-        print(self.llm.model_id)
-        response = self.agent_executor.invoke({"chat_history": self.messages[-6:], "user_input": query})
-        self.messages.append({"role": "user", "content": query})
-        self.messages.append({"role": "assistant", "content": response["output"]})
-        return response["output"]
+    def ask_question(self, query: str, history: Optional[ChatHistory] = None) -> Text:
+        history = history if history is not None else self.history
+        turn = self.run_turn(query, history)
+        history.add_turn(query, turn["output"], turn["tool_outputs"], turn["pending_action"])
+        return turn["output"]
+
+    async def ask_question_async(self, query: str, history: Optional[ChatHistory] = None) -> Text:
+        history = history if history is not None else self.history
+        turn = await self.arun_turn(query, history)
+        history.add_turn(query, turn["output"], turn["tool_outputs"], turn["pending_action"])
+        return turn["output"]
+
+    def batch_ask(self, queries: List[Dict], max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict]:
+        """
+        Answers independent {"query", "context"} items concurrently, each with a fresh history, and yields
+        their results as they finish. See agents/batch.py.
+        """
+        return abatch_ask(self.arun_turn, self.new_history, queries, max_concurrency)
+
+    def run_turn(self, query: str, history: ChatHistory, callbacks: Optional[List] = None) -> Dict:
+        """
+        Answers `query` without adding it to `history`. Returns the answer, the (tool, input, output) steps that
+        produced it, the command waiting for confirmation and whether the answer came from the answer cache.
+        """
+        pending = history.pending_action
+        if pending is not None and is_confirmation(query):
+            return run_pending(self.llm, self.tools, pending, callbacks)
+        if pending is not None and is_decline(query):
+            return declined_turn()
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            return {"output": answer, "tool_outputs": [], "cached": True, "pending_action": None}
+        start = time.perf_counter()
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            response = self.agent_executor.within(budget).invoke(
+                {"chat_history": history.recent(), "user_input": query}, config={"callbacks": callbacks})
+            if budget.exhausted:
+                # Out of iterations or time: answer from what the tools returned so far
+                response["output"] = partial_answer(self.llm, query, response["intermediate_steps"], budget,
+                                                    callbacks)
+        return self._turn(query, history, response, gate, time.perf_counter() - start, budget)
+
+    async def arun_turn(self, query: str, history: ChatHistory, callbacks: Optional[List] = None) -> Dict:
+        pending = history.pending_action
+        if pending is not None and is_confirmation(query):
+            return await arun_pending(self.llm, self.tools, pending, callbacks)
+        if pending is not None and is_decline(query):
+            return declined_turn()
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            return {"output": answer, "tool_outputs": [], "cached": True, "pending_action": None}
+        start = time.perf_counter()
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            response = await self.agent_executor.within(budget).ainvoke(
+                {"chat_history": history.recent(), "user_input": query}, config={"callbacks": callbacks})
+            if budget.exhausted:
+                response["output"] = await apartial_answer(self.llm, query, response["intermediate_steps"], budget,
+                                                           callbacks)
+        return self._turn(query, history, response, gate, time.perf_counter() - start, budget)
+
+    def _turn(self, query: str, history: ChatHistory, response: Dict, gate: ConfirmationGate, elapsed: float,
+              budget: TurnBudget) -> Dict:
+        steps = response["intermediate_steps"]
+        if not budget.exhausted:
+            self._store_answer(query, response["output"], elapsed, bool(steps), history)
+        return {
+            "output": response["output"],
+            "tool_outputs": [(action.tool, action.tool_input, output) for action, output in steps],
+            "cached": False,
+            "pending_action": gate.pending,
+            "budget_exhausted": budget.exhausted,
+        }
+
+    async def astream(self, query: str, history: Optional[ChatHistory] = None) -> AsyncIterator[Dict]:
+        history = history if history is not None else self.history
+        if history.pending_action is not None and (is_confirmation(query) or is_decline(query)):
+            # Answered without the agent loop: run or drop the confirmed command
+            turn = await self.arun_turn(query, history)
+            for tool, tool_input, output in turn["tool_outputs"]:
+                run_id = str(uuid4())
+                yield {"event": "tool_start", "tool": tool, "run_id": run_id, "input": tool_input}
+                yield {"event": "tool_end", "tool": tool, "run_id": run_id, "status": output.get("status", "success")}
+            history.add_turn(query, turn["output"], turn["tool_outputs"])
+            yield {"event": "token", "data": turn["output"]}
+            yield {"event": "end", "output": turn["output"]}
+            return
+        answer = self._cached_answer(query, history)
+        if answer is not None:
+            history.add_turn(query, answer)
+            yield {"event": "token", "data": answer}
+            yield {"event": "end", "output": answer}
+            return
+        start = time.perf_counter()
+        used_tools = False
+        with active_budget() as budget, confirmation_gate(ConfirmationGate()) as gate:
+            async for event in stream_agent_events(self.agent_executor.within(budget),
+                                                   {"chat_history": history.recent(), "user_input": query}):
+                if event["event"] == "tool_start":
+                    used_tools = True
+                elif event["event"] == "end":
+                    steps = event.pop("intermediate_steps")
+                    if budget.exhausted:
+                        event["output"] = await apartial_answer(self.llm, query, steps, budget)
+                        event["budget_exhausted"] = budget.exhausted
+                        yield {"event": "token", "data": event["output"]}
+                    else:
+                        self._store_answer(query, event["output"], time.perf_counter() - start, used_tools,
+                                           history)
+                    history.add_turn(query, event["output"], pending_action=gate.pending)
+                yield event
+
+    def _cached_answer(self, query: str, history: ChatHistory) -> Optional[Text]:
+        # Answers to follow-ups depend on the conversation, which may hold account data from earlier tool output
+        if self.answer_cache is None or not history.is_empty():
+            return None
+        return self.answer_cache.lookup(self.model_id, query)
+
+    def _store_answer(self, query: str, answer: Text, elapsed: float, used_tools: bool, history: ChatHistory):
+        if self.answer_cache is not None and history.is_empty():
+            self.answer_cache.store(self.model_id, query, answer, elapsed, used_tools)
+
+    def new_history(self) -> ChatHistory:
+        return ChatHistory(k=3, summarizer=self.summarizer)
 
 
 # Flask app
@@ -0,0 +1,46 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from agents.history import ChatHistory
+from tools import ExecutionContext, execution_context
+
+# Questions of one batch answered at the same time, also the most a caller can ask for. AWS commands are further
+# bounded by the scheduler, but every question also makes model calls.
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY") or 8)
+
+
+async def abatch_ask(arun_turn: Callable[[str, ChatHistory], Awaitable[Dict]],
+                     new_history: Callable[[], ChatHistory], queries: List[Dict[str, Any]],
+                     max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict]:
+    """
+    Answers independent questions concurrently and yields their results in the order they finish.
+
+    Every item of `queries` has a "query" and optionally the "context" to run it in, so each question can use
+    another profile. Every question gets a fresh history. Results are {"index", "response", "pending_action"}
+    or {"index", "error"} when the question failed; one failure doesn't stop the others.
+
+    The turns run through Runnable.abatch_as_completed, which doesn't bound the concurrency itself, so the
+    turns wait for a semaphore of `max_concurrency` slots, at most BATCH_MAX_CONCURRENCY.
+    """
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, BATCH_MAX_CONCURRENCY)))
+
+    async def turn(item: Dict[str, Any]) -> Dict:
+        async with semaphore:
+            # Every item runs in its own task, so the context binding doesn't leak to the other questions
+            context: Optional[ExecutionContext] = item.get("context")
+            if context is None:
+                return await arun_turn(item["query"], new_history())
+            with execution_context(context):
+                return await arun_turn(item["query"], new_history())
+
+    async for index, result in RunnableLambda(turn, name="batch_ask").abatch_as_completed(queries,
+                                                                                          return_exceptions=True):
+        if isinstance(result, Exception):
+            yield {"index": index, "error": str(result) or type(result).__name__}
+            continue
+        pending = result["pending_action"]
+        yield {"index": index, "response": result["output"],
+               "pending_action": pending.aws_cli_command if pending is not None else None}
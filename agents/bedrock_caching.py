@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Bedrock models that accept cache_control breakpoints, as comma-separated model id parts. Requests to other
+# models that carry them are rejected with a ValidationException.
+PROMPT_CACHING_MODELS = tuple(model.strip() for model in (
+    os.environ.get("BEDROCK_PROMPT_CACHING_MODELS")
+    or "anthropic.claude-3-5-haiku-20241022,anthropic.claude-3-7-sonnet-20250219,anthropic.claude-sonnet-4,"
+       "anthropic.claude-opus-4").split(",") if model.strip())
+
+
+def supports_prompt_caching(model_id: str) -> bool:
+    # Cross-region inference profiles prefix the model id, e.g. us.anthropic.claude-3-7-sonnet-...
+    return any(model in model_id for model in PROMPT_CACHING_MODELS)
+
+
+class PromptCacheStats:
+    """
+    Cached versus uncached input tokens and latency of Bedrock Claude calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.output_tokens = 0
+        self.first_token_seconds = 0.0
+        self.last_call: Dict[str, Any] = {}
+
+    def record(self, usage: Dict[str, Any], first_token_seconds: float):
+        call = {
+            "input_tokens": usage.get("input_tokens", 0),
+            "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+            "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "first_token_seconds": round(first_token_seconds, 4),
+        }
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += call["input_tokens"]
+            self.cache_read_input_tokens += call["cache_read_input_tokens"]
+            self.cache_creation_input_tokens += call["cache_creation_input_tokens"]
+            self.output_tokens += call["output_tokens"]
+            self.first_token_seconds += first_token_seconds
+            self.last_call = call
+
+    def as_dict(self) -> Dict[str, Any]:
+        prompt_tokens = self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+        return {
+            "calls": self.calls,
+            "uncached_input_tokens": self.input_tokens,
+            "cache_read_input_tokens": self.cache_read_input_tokens,
+            "cache_creation_input_tokens": self.cache_creation_input_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_ratio": self.cache_read_input_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "avg_first_token_seconds": self.first_token_seconds / self.calls if self.calls else 0.0,
+            "last_call": self.last_call,
+        }
+
+
+def add_cache_points(body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Marks the tool definitions and the system prompt of an Anthropic messages request as cacheable.
+    Anthropic caches the prefix up to each breakpoint, in the order tools, system, messages.
+    """
+    if body.get("tools"):
+        body["tools"] = [*body["tools"][:-1], {**body["tools"][-1], "cache_control": CACHE_CONTROL}]
+    system = body.get("system")
+    if isinstance(system, str) and system:
+        body["system"] = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+    return body
+
+
+class PromptCachingBedrockClient:
+    """
+    Wraps a bedrock-runtime client. Adds prompt cache breakpoints to Anthropic messages requests and records
+    the cached and uncached token counts that come back. Everything else is delegated to the wrapped client.
+    """
+
+    def __init__(self, client: Any, stats: PromptCacheStats):
+        self._client = client
+        self.stats = stats
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def invoke_model(self, **kwargs: Any) -> Dict[str, Any]:
+        kwargs["body"] = _with_cache_points(kwargs["body"])
+        start = time.perf_counter()
+        response = self._client.invoke_model(**kwargs)
+        payload = response["body"].read()
+        elapsed = time.perf_counter() - start
+        try:
+            self.stats.record(json.loads(payload).get("usage", {}), elapsed)
+        except ValueError:
+            pass
+        # The body stream was consumed, hand the caller an equivalent one
+        response["body"] = io.BytesIO(payload)
+        return response
+
+    def invoke_model_with_response_stream(self, **kwargs: Any) -> Dict[str, Any]:
+        kwargs["body"] = _with_cache_points(kwargs["body"])
+        start = time.perf_counter()
+        response = self._client.invoke_model_with_response_stream(**kwargs)
+        response["body"] = self._record_stream(response["body"], start)
+        return response
+
+    def _record_stream(self, events: Any, start: float) -> Iterator[Dict]:
+        usage: Dict[str, Any] = {}
+        first_token_seconds = None
+        for event in events:
+            chunk = json.loads(event.get("chunk", {}).get("bytes", b"{}") or b"{}")
+            if chunk.get("type") == "message_start":
+                usage.update(chunk.get("message", {}).get("usage", {}))
+            elif chunk.get("type") == "content_block_delta" and first_token_seconds is None:
+                first_token_seconds = time.perf_counter() - start
+            elif chunk.get("type") == "message_delta":
+                usage.update(chunk.get("usage", {}))
+            yield event
+        if first_token_seconds is None:
+            first_token_seconds = time.perf_counter() - start
+        self.stats.record(usage, first_token_seconds)
+
+
+def _with_cache_points(body: str) -> str:
+    request = json.loads(body)
+    if "anthropic_version" not in request:
+        return body
+    return json.dumps(add_cache_points(request))
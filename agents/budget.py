@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Sequence, Text, Tuple
+
+from langchain_core.agents import AgentAction
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from agents.streaming import _chunk_text
+from tools import deadline
+
+# Caps of agent turns that don't run under a request's latency budget, e.g. cli.py, Chainlit or batch items
+AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_MAX_ITERATIONS") or 8)
+AGENT_MAX_EXECUTION_TIME = float(os.environ.get("AGENT_MAX_EXECUTION_TIME") or 0) or None
+# Seconds of every budget kept back for the partial answer when the agent runs out of iterations or time
+LATENCY_BUDGET_RESERVE = float(os.environ.get("LATENCY_BUDGET_RESERVE") or 3)
+# Partial answers aren't asked from the model with less time than this left
+MIN_PARTIAL_ANSWER_SECONDS = 0.5
+# Characters of each tool output shown to the model for the partial answer
+PARTIAL_ANSWER_OUTPUT_CHARS = 2000
+
+OUT_OF_TIME_ANSWER = ("I couldn't finish looking into this in time. Please ask again, or narrow the question down "
+                      "to a service, region or resource.")
+
+PARTIAL_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are an AWS Assistant bot. You ran out of time before you could finish the user's request. Answer in a "
+     "few sentences with what the results gathered so far already show, and say what is still missing so the "
+     "user can ask for it again. If a command waits for confirmation, ask the user to confirm it. Do not show "
+     "commands, and do not reveal keys or credentials."),
+    ("human", "Question: {question}\nResults so far:\n{results}"),
+])
+
+
+class TurnBudget:
+    """
+    Time and agent iterations one request may spend. The agent loop stops `reserve` seconds early, that time
+    is left for the partial answer. Which limit stopped the agent is kept in `exhausted`.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, max_iterations: Optional[int] = None,
+                 reserve: float = LATENCY_BUDGET_RESERVE):
+        self.seconds = seconds
+        self.max_iterations = max_iterations or AGENT_MAX_ITERATIONS
+        self.reserve = min(reserve, seconds / 2) if seconds is not None else 0.0
+        self.start = time.monotonic()
+        self.exhausted: Optional[str] = None
+
+    def remaining(self) -> Optional[float]:
+        """
+        Seconds left of the whole budget, None without a time limit.
+        """
+        return None if self.seconds is None else self.start + self.seconds - time.monotonic()
+
+    def loop_remaining(self) -> Optional[float]:
+        """
+        Seconds left for the agent loop and its tool calls.
+        """
+        remaining = self.remaining()
+        return None if remaining is None else remaining - self.reserve
+
+
+_current_budget: ContextVar[Optional[TurnBudget]] = ContextVar("turn_budget", default=None)
+
+
+def current_budget() -> Optional[TurnBudget]:
+    return _current_budget.get()
+
+
+@contextmanager
+def turn_budget(budget: TurnBudget) -> Iterator[TurnBudget]:
+    """
+    Runs the agent turns of the block under `budget`. Tool calls started inside get its deadline.
+    """
+    token = _current_budget.set(budget)
+    try:
+        with deadline(budget.loop_remaining()):
+            yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+@contextmanager
+def active_budget() -> Iterator[TurnBudget]:
+    """
+    The budget of the current request, or the default caps for entry points that don't set one.
+    """
+    budget = current_budget()
+    if budget is not None:
+        yield budget
+        return
+    with turn_budget(TurnBudget(AGENT_MAX_EXECUTION_TIME)) as budget:
+        yield budget
+
+
+def _results(steps: Sequence[Tuple[AgentAction, object]]) -> Text:
+    lines = []
+    for action, output in steps:
+        tool_input = action.tool_input
+        command = tool_input.get("aws_cli_command") if isinstance(tool_input, dict) else None
+        lines.append(json.dumps({"tool": action.tool, "command": command or tool_input,
+                                 "result": json.dumps(output, default=str)[:PARTIAL_ANSWER_OUTPUT_CHARS]},
+                                default=str))
+    return "\n".join(lines) or "(none)"
+
+
+def partial_answer(llm: BaseChatModel, query: Text, steps: Sequence[Tuple[AgentAction, object]],
+                   budget: TurnBudget, callbacks: Optional[List] = None) -> Text:
+    """
+    Answers from the tool results gathered before the budget ran out, in a single model call without tools.
+    """
+    remaining = budget.remaining()
+    if remaining is not None and remaining < MIN_PARTIAL_ANSWER_SECONDS:
+        return OUT_OF_TIME_ANSWER
+    try:
+        message = (PARTIAL_PROMPT | llm).invoke({"question": query, "results": _results(steps)},
+                                                config={"callbacks": callbacks})
+    except Exception:
+        return OUT_OF_TIME_ANSWER
+    return _chunk_text(message) or OUT_OF_TIME_ANSWER
+
+
+async def apartial_answer(llm: BaseChatModel, query: Text, steps: Sequence[Tuple[AgentAction, object]],
+                          budget: TurnBudget, callbacks: Optional[List] = None) -> Text:
+    remaining = budget.remaining()
+    if remaining is not None and remaining < MIN_PARTIAL_ANSWER_SECONDS:
+        return OUT_OF_TIME_ANSWER
+    try:
+        message = await asyncio.wait_for(
+            (PARTIAL_PROMPT | llm).ainvoke({"question": query, "results": _results(steps)},
+                                           config={"callbacks": callbacks}),
+            remaining)
+    except Exception:
+        return OUT_OF_TIME_ANSWER
+    return _chunk_text(message) or OUT_OF_TIME_ANSWER
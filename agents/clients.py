@@ -0,0 +1,141 @@
+import importlib.util
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Text, Tuple
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    import httpx
+
+load_dotenv()
+
+# Connections kept per model backend. Agent turns of all users share them.
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS") or 100)
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS") or 50)
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY") or 60)
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT") or 10)
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT") or 120)
+# Retries with exponential backoff on throttling, 5xx and connection errors
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES") or 3)
+# HTTP/2 multiplexes concurrent OpenAI calls over few connections, used when the h2 package is installed
+LLM_HTTP2 = os.environ.get("LLM_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+# "adaptive" also rate limits the client when Bedrock throttles
+BEDROCK_RETRY_MODE = os.environ.get("BEDROCK_RETRY_MODE") or "adaptive"
+BEDROCK_ENDPOINT_URL = os.environ.get("BEDROCK_ENDPOINT_URL") or None
+
+
+class ClientRegistry:
+    """
+    Builds the HTTP clients of the model backends once per process, so every agent, session and summarizer
+    shares their connection pools instead of opening connections of its own.
+
+    OpenAI calls go through one httpx client per sync/async use with keep-alive and, when available,
+    HTTP/2. Bedrock calls go through one bedrock-runtime client per region, its pool sized for the
+    expected concurrency instead of botocore's default of 10.
+    """
+
+    def __init__(self, max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT, max_retries: int = LLM_MAX_RETRIES,
+                 http2: bool = LLM_HTTP2, bedrock_retry_mode: str = BEDROCK_RETRY_MODE,
+                 bedrock_endpoint_url: Optional[Text] = BEDROCK_ENDPOINT_URL):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.http2 = http2
+        self.bedrock_retry_mode = bedrock_retry_mode
+        self.bedrock_endpoint_url = bedrock_endpoint_url
+        self._lock = threading.Lock()
+        self._http_client: Optional["httpx.Client"] = None
+        self._http_async_client: Optional["httpx.AsyncClient"] = None
+        self._bedrock: Dict[Optional[Text], Any] = {}
+
+    def _limits(self) -> Tuple["httpx.Limits", "httpx.Timeout"]:
+        # Imported here so the server doesn't pay for httpx before the first agent is built
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.max_keepalive_connections,
+                              keepalive_expiry=self.keepalive_expiry)
+        timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        return limits, timeout
+
+    def http_client(self) -> "httpx.Client":
+        import httpx
+
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    limits, timeout = self._limits()
+                    self._http_client = httpx.Client(limits=limits, timeout=timeout, http2=self.http2)
+        return self._http_client
+
+    def http_async_client(self) -> "httpx.AsyncClient":
+        import httpx
+
+        if self._http_async_client is None:
+            with self._lock:
+                if self._http_async_client is None:
+                    limits, timeout = self._limits()
+                    self._http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout, http2=self.http2)
+        return self._http_async_client
+
+    def openai_chat(self, model: Text, **kwargs: Any):
+        """
+        Returns a ChatOpenAI that uses the shared connection pools and retry policy.
+        """
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=model, http_client=self.http_client(), http_async_client=self.http_async_client(),
+                          max_retries=self.max_retries, timeout=self.read_timeout, **kwargs)
+
+    def bedrock(self, region: Optional[Text] = None):
+        """
+        Returns the shared bedrock-runtime client of the region, AWS_REGION by default.
+        """
+        region = region or os.getenv("AWS_REGION")
+        client = self._bedrock.get(region)
+        if client is None:
+            with self._lock:
+                client = self._bedrock.get(region)
+                if client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    config = Config(max_pool_connections=self.max_connections, tcp_keepalive=True,
+                                    connect_timeout=self.connect_timeout, read_timeout=self.read_timeout,
+                                    retries={"total_max_attempts": self.max_retries + 1,
+                                             "mode": self.bedrock_retry_mode})
+                    client = self._bedrock[region] = boto3.client(service_name="bedrock-runtime",
+                                                                  region_name=region,
+                                                                  endpoint_url=self.bedrock_endpoint_url,
+                                                                  config=config)
+        return client
+
+    async def aclose(self):
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+            self._http_async_client = None
+        if self._http_client is not None:
+            self._http_client.close()
+            self._http_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "max_retries": self.max_retries,
+            "http2": self.http2,
+            "bedrock_retry_mode": self.bedrock_retry_mode,
+            "openai_clients": sum(client is not None for client in (self._http_client, self._http_async_client)),
+            "bedrock_regions": [region for region in self._bedrock],
+        }
+
+
+clients = ClientRegistry()
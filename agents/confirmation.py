@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import BaseTool
+
+from agents.streaming import _chunk_text
+from tools import PendingAction
+
+CONFIRM = re.compile(r"^\s*(y|yes|yeah|yep|sure|ok|okay|confirm(ed)?|proceed|go ahead|do it)\b[\s.!]*$",
+                     re.IGNORECASE)
+DECLINE = re.compile(r"^\s*(n|no|nope|cancel|abort|stop|don'?t)\b[\s.!]*$", re.IGNORECASE)
+
+CANCELLED_ANSWER = "Okay, I cancelled it. Nothing was changed in your account."
+EXPIRED_ANSWER = "That request expired before it could run. Nothing was changed in your account, please ask again."
+
+RESULT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are an AWS Assistant bot. The user confirmed an action and it was executed. Tell the user the outcome "
+     "in a few sentences: what was done, the names and IDs of created or changed resources, and for errors "
+     "the likely cause and how to fix it. Do not show commands, and do not reveal keys or credentials."),
+    ("human", "Executed: {command}\nResult:\n{result}"),
+])
+
+
+def is_confirmation(query: str) -> bool:
+    return bool(CONFIRM.match(query))
+
+
+def is_decline(query: str) -> bool:
+    return bool(DECLINE.match(query))
+
+
+def declined_turn() -> Dict:
+    return {"output": CANCELLED_ANSWER, "tool_outputs": [], "cached": False, "pending_action": None}
+
+
+def expired_turn() -> Dict:
+    return {"output": EXPIRED_ANSWER, "tool_outputs": [], "cached": False, "pending_action": None}
+
+
+def _tool(tools: Sequence[BaseTool], pending: PendingAction) -> Optional[BaseTool]:
+    # Pending actions are shared by replicas and survive restarts, so the tool that held the command may not
+    # be in this agent's tool set. Any AWS CLI tool runs it the same way.
+    runners = [tool for tool in tools if hasattr(tool, "run_command")]
+    return next((tool for tool in runners if tool.name == pending.tool), runners[0] if runners else None)
+
+
+def _turn(pending: PendingAction, result: dict, message) -> Dict:
+    return {
+        "output": _chunk_text(message),
+        "tool_outputs": [(pending.tool, {"aws_cli_command": pending.aws_cli_command}, result)],
+        "cached": False,
+        "pending_action": None,
+    }
+
+
+def run_pending(llm: BaseChatModel, tools: Sequence[BaseTool], pending: PendingAction,
+                callbacks: Optional[List] = None) -> Dict:
+    """
+    Runs the confirmed command through its tool and has the model summarize the result in a single call.
+    """
+    tool = _tool(tools, pending)
+    if tool is None:
+        return expired_turn()
+    result = tool.run_command(pending.aws_cli_command)
+    message = (RESULT_PROMPT | llm).invoke(
+        {"command": pending.aws_cli_command, "result": json.dumps(result, default=str)},
+        config={"callbacks": callbacks},
+    )
+    return _turn(pending, result, message)
+
+
+async def arun_pending(llm: BaseChatModel, tools: Sequence[BaseTool], pending: PendingAction,
+                       callbacks: Optional[List] = None) -> Dict:
+    tool = _tool(tools, pending)
+    if tool is None:
+        return expired_turn()
+    result = await tool.arun_command(pending.aws_cli_command)
+    message = await (RESULT_PROMPT | llm).ainvoke(
+        {"command": pending.aws_cli_command, "result": json.dumps(result, default=str)},
+        config={"callbacks": callbacks},
+    )
+    return _turn(pending, result, message)
@@ -0,0 +1,199 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
+from contextvars import ContextVar, copy_context
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.tools import BaseTool
+
+from agents.budget import TurnBudget, current_budget
+
+# Read-only tool calls of one agent step that may run at the same time
+MAX_PARALLEL_TOOLS = int(os.environ.get("AGENT_MAX_PARALLEL_TOOLS") or 4)
+
+# AgentExecutor's step by step printing to stdout. Requests are traced instead, see agents/tracing.py.
+AGENT_VERBOSE = os.environ.get("AGENT_VERBOSE", "false").lower() == "true"
+
+# Runs the read-only tool calls of synchronous agent steps
+tool_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("AGENT_TOOL_THREAD_POOL_SIZE") or 16),
+                                   thread_name_prefix="agent-tool")
+
+# Ids of the actions of the current step that AgentExecutor must not run itself
+_deferred_actions: ContextVar[Optional[Set[int]]] = ContextVar("deferred_agent_actions", default=None)
+# Observation of the placeholder steps returned for those actions
+_DEFERRED = object()
+# Output of AgentExecutor's forced stop once max_iterations or max_execution_time is reached
+STOPPED_OUTPUT = "Agent stopped due to max iterations."
+
+
+class ParallelToolAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the read-only tool calls of one step concurrently, at most `max_parallel_tools` at
+    a time. Mutating tools run alone, after the calls before them and before the calls after them, and the
+    observations are returned in the order the model asked for them.
+
+    AgentExecutor plans and then runs each action itself. Here its runs are replaced by placeholders while it
+    plans, and the collected actions are executed afterwards in groups.
+    """
+
+    max_parallel_tools: int = MAX_PARALLEL_TOOLS
+
+    def within(self, budget: TurnBudget) -> "ParallelToolAgentExecutor":
+        """
+        A copy of the executor that stops after the iterations and before the time left in `budget`. Which
+        limit stopped it is recorded on the budget of the running turn.
+        """
+        # BaseModel.copy() would drop the fields excluded from serialization, like callbacks
+        executor = copy(self)
+        executor.max_iterations = budget.max_iterations
+        max_execution_time = budget.loop_remaining()
+        executor.max_execution_time = None if max_execution_time is None else max(max_execution_time, 0.0)
+        return executor
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if super()._should_continue(iterations, time_elapsed):
+            return True
+        budget = current_budget()
+        if budget is not None:
+            out_of_iterations = self.max_iterations is not None and iterations >= self.max_iterations
+            budget.exhausted = "iterations" if out_of_iterations else "time"
+        return False
+
+    async def _areturn(self, output: AgentFinish, intermediate_steps: list,
+                       run_manager: Optional[AsyncCallbackManagerForChainRun] = None) -> Dict:
+        # The async loop runs under a timeout and stops without asking _should_continue when it expires
+        budget = current_budget()
+        if budget is not None and budget.exhausted is None and _is_stopped(output):
+            budget.exhausted = "time"
+        return await super()._areturn(output, intermediate_steps, run_manager)
+
+    def _iter_next_step(
+            self,
+            name_to_tool_map: Dict[str, BaseTool],
+            color_mapping: Dict[str, str],
+            inputs: Dict[str, str],
+            intermediate_steps: List[Tuple[AgentAction, str]],
+            run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        deferred: Set[int] = set()
+        actions: List[AgentAction] = []
+        token = _deferred_actions.set(deferred)
+        try:
+            for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                                                run_manager):
+                if isinstance(item, AgentStep) and item.observation is _DEFERRED:
+                    continue
+                if isinstance(item, AgentAction):
+                    deferred.add(id(item))
+                    actions.append(item)
+                yield item
+        finally:
+            _deferred_actions.reset(token)
+        for group in self._groups(name_to_tool_map, actions):
+            if len(group) == 1:
+                yield self._perform_agent_action(name_to_tool_map, color_mapping, group[0], run_manager)
+                continue
+            # A sliding window of at most max_parallel_tools calls, collected in order. Every call gets its own
+            # copy of the context so tools see the request's execution context.
+            remaining = iter(group)
+            running = deque(self._submit(name_to_tool_map, color_mapping, action, run_manager)
+                            for action in islice(remaining, self.max_parallel_tools))
+            while running:
+                step = running.popleft().result()
+                action = next(remaining, None)
+                if action is not None:
+                    running.append(self._submit(name_to_tool_map, color_mapping, action, run_manager))
+                yield step
+
+    def _submit(self, name_to_tool_map: Dict[str, BaseTool], color_mapping: Dict[str, str], action: AgentAction,
+                run_manager: Optional[CallbackManagerForChainRun]) -> Future:
+        return tool_executor.submit(copy_context().run, self._perform_agent_action, name_to_tool_map,
+                                    color_mapping, action, run_manager)
+
+    async def _aiter_next_step(
+            self,
+            name_to_tool_map: Dict[str, BaseTool],
+            color_mapping: Dict[str, str],
+            inputs: Dict[str, str],
+            intermediate_steps: List[Tuple[AgentAction, str]],
+            run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AsyncIterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        deferred: Set[int] = set()
+        actions: List[AgentAction] = []
+        token = _deferred_actions.set(deferred)
+        try:
+            async for item in super()._aiter_next_step(name_to_tool_map, color_mapping, inputs,
+                                                       intermediate_steps, run_manager):
+                if isinstance(item, AgentStep) and item.observation is _DEFERRED:
+                    continue
+                if isinstance(item, AgentAction):
+                    deferred.add(id(item))
+                    actions.append(item)
+                yield item
+        finally:
+            _deferred_actions.reset(token)
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        async def perform(action: AgentAction) -> AgentStep:
+            async with semaphore:
+                return await self._aperform_agent_action(name_to_tool_map, color_mapping, action, run_manager)
+
+        for group in self._groups(name_to_tool_map, actions):
+            for step in await asyncio.gather(*(perform(action) for action in group)):
+                yield step
+
+    def _perform_agent_action(self, name_to_tool_map: Dict[str, BaseTool], color_mapping: Dict[str, str],
+                              agent_action: AgentAction,
+                              run_manager: Optional[CallbackManagerForChainRun] = None) -> AgentStep:
+        if _is_deferred(agent_action):
+            return AgentStep(action=agent_action, observation=_DEFERRED)
+        return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    async def _aperform_agent_action(self, name_to_tool_map: Dict[str, BaseTool], color_mapping: Dict[str, str],
+                                     agent_action: AgentAction,
+                                     run_manager: Optional[AsyncCallbackManagerForChainRun] = None) -> AgentStep:
+        if _is_deferred(agent_action):
+            return AgentStep(action=agent_action, observation=_DEFERRED)
+        return await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    def _groups(self, name_to_tool_map: Dict[str, BaseTool], actions: List[AgentAction]) -> List[List[AgentAction]]:
+        """
+        Splits the actions into runs of consecutive read-only calls. Mutating and unknown tools get a group of
+        their own.
+        """
+        groups: List[List[AgentAction]] = []
+        extendable = False
+        for action in actions:
+            tool = name_to_tool_map.get(action.tool)
+            parallel = tool is not None and not _is_mutating(tool, action)
+            if parallel and extendable:
+                groups[-1].append(action)
+            else:
+                groups.append([action])
+            extendable = parallel
+        return groups
+
+
+def _is_mutating(tool: BaseTool, action: AgentAction) -> bool:
+    # AWS CLI tools can tell by the command, the single aws_cli_tool runs reads and mutations
+    is_mutating = getattr(tool, "is_mutating", None)
+    if is_mutating is None:
+        return getattr(tool, "mutating", False)
+    tool_input = action.tool_input
+    command = tool_input.get("aws_cli_command", "") if isinstance(tool_input, dict) else str(tool_input)
+    return is_mutating(command)
+
+
+def _is_stopped(output: AgentFinish) -> bool:
+    return not output.log and output.return_values.get("output") == STOPPED_OUTPUT
+
+
+def _is_deferred(agent_action: AgentAction) -> bool:
+    deferred = _deferred_actions.get()
+    return deferred is not None and id(agent_action) in deferred
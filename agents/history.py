@@ -0,0 +1,254 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
+
+import tiktoken
+from langchain_core.language_models import BaseChatModel
+
+from agents.streaming import _chunk_text
+from tools import PendingAction, get_execution_context
+from tools.output_pipeline import output_buffer
+
+# Tokens of history sent with every question, rolling summary included
+HISTORY_MAX_TOKENS = int(os.environ.get("CHAT_HISTORY_MAX_TOKENS") or 2000)
+# Answers longer than this are kept in the output buffer and only referenced from the history
+HISTORY_MAX_MESSAGE_TOKENS = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGE_TOKENS") or 400)
+# Turns that leave the history are folded into a rolling summary by the agent's model
+HISTORY_SUMMARY = os.environ.get("CHAT_HISTORY_SUMMARY", "true").lower() == "true"
+# Attempts to summarize before the turns wait for the next turn to try again
+HISTORY_SUMMARY_ATTEMPTS = int(os.environ.get("CHAT_HISTORY_SUMMARY_ATTEMPTS") or 3)
+TOKEN_ENCODING = "cl100k_base"
+
+SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between a user and an AWS assistant.\n"
+    "Update the summary with the new messages. Keep resource names and IDs, regions, settings the user chose "
+    "and any action still waiting for confirmation. Drop greetings and explanations. Answer with the summary "
+    "only, in at most {max_tokens} tokens.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New messages:\n{transcript}\n"
+)
+
+# Summaries are generated here, off the request path
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:
+        # The encoding is downloaded on first use; without network access token counts are estimated
+        return None
+
+
+def count_tokens(text: Text) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: Text, max_tokens: int) -> Text:
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _transcript(messages: Sequence[Dict]) -> Text:
+    prefixes = {"user": "Human", "assistant": "AI"}
+    return "\n".join(f"{prefixes[message['role']]}: {message['content']}" for message in messages)
+
+
+class LLMSummarizer:
+    """
+    Folds messages that left the history into the running summary with a chat model.
+    """
+
+    def __init__(self, llm: BaseChatModel, max_tokens: int = 300):
+        self.llm = llm
+        self.max_tokens = max_tokens
+
+    def __call__(self, summary: Text, messages: Sequence[Dict]) -> Text:
+        prompt = SUMMARY_PROMPT.format(max_tokens=self.max_tokens, summary=summary or "(empty)",
+                                       transcript=_transcript(messages))
+        return truncate_tokens(_chunk_text(self.llm.invoke(prompt)).strip(), self.max_tokens)
+
+
+class ChatHistory:
+    """
+    Per-session conversation history, kept under `max_tokens` tokens and at most `k` question/answer turns.
+
+    Turns that no longer fit are dropped from the front and, when a summarizer is set, folded into a rolling
+    summary on a background thread. When the summarizer fails they stay queued for the next turn. Long answers
+    and tool outputs are stored in the output buffer and the history keeps their output_id, which the model can
+    read back with `aws_cli_output_tool`.
+    """
+
+    def __init__(self, k: int = 5, max_tokens: int = HISTORY_MAX_TOKENS,
+                 max_message_tokens: int = HISTORY_MAX_MESSAGE_TOKENS,
+                 summarizer: Optional[Callable[[Text, Sequence[Dict]], Text]] = None):
+        self.k = k
+        self.max_tokens = max_tokens
+        self.max_message_tokens = max_message_tokens
+        self.summarizer = summarizer
+        self.messages: List[Dict[Text, Any]] = []
+        self.summary = ""
+        self._summary_tokens = 0
+        self._pending: List[Dict[Text, Any]] = []
+        self._summarizing = False
+        self._lock = threading.Lock()
+        # Model that answered the last turn, so the router keeps confirmations on the model that asked for them
+        self.last_model: Optional[Text] = None
+        # Mutating command the assistant asked the user to confirm, run directly when they answer "yes"
+        self.pending_action: Optional[PendingAction] = None
+        # Incremented by every change. Stores shared by several replicas keep the copy with the highest version.
+        self.version = 0
+        # Called after every change, e.g. by SessionStore to write the history to its state backend
+        self.on_change: Optional[Callable[["ChatHistory"], None]] = None
+
+    def add_turn(self, query: Text, answer: Text, tool_outputs: Sequence[Tuple[str, Any, Any]] = (),
+                 pending_action: Optional[PendingAction] = None):
+        """
+        Adds a turn. `tool_outputs` are the (tool, input, output) steps that produced the answer and
+        `pending_action` the command the answer asks the user to confirm, if any.
+        """
+        answer = self._by_reference(answer, tool_outputs)
+        with self._lock:
+            self.pending_action = pending_action
+            for role, content in (("user", query), ("assistant", answer)):
+                self.messages.append({"role": role, "content": content, "tokens": count_tokens(content)})
+            self._trim()
+            summarize = bool(self._pending) and not self._summarizing
+            self._summarizing = self._summarizing or summarize
+            self.version += 1
+        self._changed()
+        if summarize:
+            _summary_executor.submit(self._summarize)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not self.messages and not self.summary and self.pending_action is None
+
+    def recent(self) -> List[Dict[Text, Text]]:
+        with self._lock:
+            messages = [{"role": message["role"], "content": message["content"]} for message in self.messages]
+            summary = self.summary
+        if summary and messages:
+            messages[0]["content"] = f"Summary of the earlier conversation: {summary}\n\n{messages[0]['content']}"
+        return messages
+
+    def as_text(self) -> Text:
+        with self._lock:
+            summary = self.summary
+            messages = list(self.messages)
+        text = _transcript(messages)
+        return f"Summary of the earlier conversation: {summary}\n{text}" if summary else text
+
+    def tokens(self) -> int:
+        return self._summary_tokens + sum(message["tokens"] for message in self.messages)
+
+    def clear(self):
+        with self._lock:
+            self.messages.clear()
+            self._pending.clear()
+            self.pending_action = None
+            self.summary = ""
+            self._summary_tokens = 0
+            self.version += 1
+        self._changed()
+
+    def as_dict(self) -> Dict[Text, Any]:
+        """
+        JSON-serializable state of the history. Messages waiting to be summarized are left out.
+        """
+        with self._lock:
+            return {
+                "version": self.version,
+                "messages": [dict(message) for message in self.messages],
+                "summary": self.summary,
+                "last_model": self.last_model,
+                "pending_action": list(self.pending_action) if self.pending_action is not None else None,
+            }
+
+    def restore(self, state: Dict[Text, Any]):
+        """
+        Replaces the history with a state returned by `as_dict`, e.g. one written by another replica.
+        """
+        with self._lock:
+            self.version = state["version"]
+            self.messages = [dict(message) for message in state["messages"]]
+            self.summary = state["summary"]
+            self._summary_tokens = count_tokens(self.summary) if self.summary else 0
+            self._pending = []
+            self.last_model = state.get("last_model")
+            pending_action = state.get("pending_action")
+            self.pending_action = PendingAction(*pending_action) if pending_action else None
+
+    def _changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self)
+            except Exception:
+                traceback.print_exc()
+
+    def _trim(self):
+        # Whole turns leave from the front; the latest turn always stays
+        while len(self.messages) > 2 and (len(self.messages) > 2 * self.k or self.tokens() > self.max_tokens):
+            if self.summarizer is not None:
+                self._pending.extend(self.messages[:2])
+            del self.messages[:2]
+
+    def _summarize(self):
+        failures = 0
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                summary = self.summary
+                if not pending:
+                    self._summarizing = False
+                    return
+            try:
+                summary = self.summarizer(summary, pending)
+            except Exception:
+                traceback.print_exc()
+                failures += 1
+                with self._lock:
+                    # Back in front of the turns that left since, so none is lost and the order is kept
+                    self._pending[:0] = pending
+                    if failures >= HISTORY_SUMMARY_ATTEMPTS:
+                        # The next turn tries again
+                        self._summarizing = False
+                        return
+                continue
+            with self._lock:
+                self.summary = summary
+                self._summary_tokens = count_tokens(summary)
+                self._trim()
+                self.version += 1
+            self._changed()
+
+    def _by_reference(self, answer: Text, tool_outputs: Sequence[Tuple[str, Any, Any]]) -> Text:
+        if count_tokens(answer) <= self.max_message_tokens and not tool_outputs:
+            return answer
+        profile = get_execution_context().profile
+        if count_tokens(answer) > self.max_message_tokens:
+            output_id = output_buffer.put(profile, answer)
+            answer = (f"{truncate_tokens(answer, self.max_message_tokens)}...\n"
+                      f"[Answer shortened in the history, full text in output_id='{output_id}']")
+        references = []
+        for tool, tool_input, output in tool_outputs:
+            if isinstance(output, dict):
+                output_id = output.get("output_id") or (output_buffer.put(profile, output["message"])
+                                                        if output.get("message") else None)
+            else:
+                output_id = output_buffer.put(profile, str(output)) if output else None
+            if output_id is not None:
+                arguments = " ".join(map(str, tool_input.values())) if isinstance(tool_input, dict) else tool_input
+                references.append(f"- {tool} {arguments}: output_id='{output_id}'")
+        if references:
+            answer += "\n[Tool outputs, readable with aws_cli_output_tool:\n" + "\n".join(references) + "]"
+        return answer
@@ -0,0 +1,43 @@
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict
+
+if TYPE_CHECKING:
+    # langchain.agents is slow to import and only needed once an agent is built
+    from langchain.agents import AgentExecutor
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    # Anthropic models stream a list of content blocks
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+async def stream_agent_events(agent_executor: "AgentExecutor", inputs: Dict) -> AsyncIterator[Dict]:
+    """
+    Runs the agent with `astream_events` and yields simplified events:
+
+    - {"event": "token", "data": <text>} for every streamed model token
+    - {"event": "tool_start", "tool": <name>, "run_id": <id>, "input": <tool input>}
+    - {"event": "tool_end", "tool": <name>, "run_id": <id>, "status": "success" | "error"}
+    - {"event": "end", "output": <final answer>, "intermediate_steps": <(action, output) steps>} once, at the end
+
+    Tool calls of one step run concurrently, so a tool_end belongs to the tool_start with the same run_id.
+    """
+    async for event in agent_executor.astream_events(inputs, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            text = _chunk_text(event["data"].get("chunk"))
+            if text:
+                yield {"event": "token", "data": text}
+        elif kind == "on_tool_start":
+            yield {"event": "tool_start", "tool": event["name"], "run_id": event["run_id"],
+                   "input": event["data"].get("input")}
+        elif kind == "on_tool_end":
+            output = event["data"].get("output")
+            status = output.get("status", "success") if isinstance(output, dict) else "success"
+            yield {"event": "tool_end", "tool": event["name"], "run_id": event["run_id"], "status": status}
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            output = event["data"]["output"]
+            yield {"event": "end", "output": output["output"],
+                   "intermediate_steps": output.get("intermediate_steps", [])}
@@ -0,0 +1,18 @@
+import os
+from typing import List
+
+from langchain_core.tools import BaseTool
+
+from tools import AWSCLICommandTool, AWSCLICreateTool, AWSCLIDeleteTool, AWSCLIDescribeTool, AWSCLIGetTool, \
+    AWSCLIOutputTool, AWSCLIUpdateTool, AWSInventoryTool
+
+# Gives the agents the single aws_cli_tool instead of the create, update, delete, describe and get tools. Every
+# model call then carries one small tool schema, reads and mutations are told apart by the operation index.
+CONSOLIDATED_AWS_TOOL = os.environ.get("CONSOLIDATED_AWS_TOOL", "false").lower() == "true"
+
+
+def agent_tools(consolidated: bool = CONSOLIDATED_AWS_TOOL) -> List[BaseTool]:
+    if consolidated:
+        return [AWSCLICommandTool(), AWSCLIOutputTool(), AWSInventoryTool()]
+    return [AWSCLIUpdateTool(), AWSCLIDescribeTool(), AWSCLICreateTool(), AWSCLIDeleteTool(), AWSCLIGetTool(),
+            AWSCLIOutputTool(), AWSInventoryTool()]
@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+from tools.telemetry import Span, current_span, metrics, set_current_span, start_span
+
+AGENT_RUN_SECONDS = metrics.histogram("aws_assistant_agent_run_seconds", "Time of one agent executor run")
+AGENT_ITERATIONS = metrics.histogram("aws_assistant_agent_iterations", "Model steps of one agent executor run",
+                                     buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15))
+LLM_SECONDS = metrics.histogram("aws_assistant_llm_seconds", "Time of one model call", ["model"])
+LLM_TOKENS = metrics.counter("aws_assistant_llm_tokens_total", "Tokens sent to and generated by the models",
+                             ["model", "direction"])
+TOOL_SECONDS = metrics.histogram("aws_assistant_tool_seconds", "Time of one tool call", ["tool", "status"])
+
+
+def token_usage(response: LLMResult) -> Tuple[int, int]:
+    """
+    Returns the input and output tokens of a model call, from the message usage metadata or the provider's
+    llm_output.
+    """
+    input_tokens = output_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                found = True
+    if not found and response.llm_output:
+        usage = response.llm_output.get("token_usage") or response.llm_output.get("usage") or {}
+        input_tokens += usage.get("prompt_tokens", usage.get("input_tokens", 0))
+        output_tokens += usage.get("completion_tokens", usage.get("output_tokens", 0))
+    return input_tokens, output_tokens
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records agent runs, agent iterations, model calls and tool calls as spans of the current trace and in the
+    latency histograms.
+
+    Top-level chains become "agent.run" spans and the chains they start directly (one per planning step of
+    AgentExecutor) "agent.iteration" spans. Nested chains are not recorded, their model calls and tools are
+    attached to the closest recorded span.
+    """
+    # Called in the run's own context, so tool spans become the parent of the AWS CLI spans
+    run_inline: bool = True
+
+    def __init__(self):
+        # run id -> (span, span to restore when it ends) for the runs that have a span
+        self._spans: Dict[UUID, Tuple[Span, Optional[Span]]] = {}
+        # run id -> closest recorded span, the parent of spans started by its children
+        self._parents: Dict[UUID, Optional[Span]] = {}
+        self._iterations: Dict[UUID, int] = {}
+
+    def _parent(self, parent_run_id: Optional[UUID]) -> Optional[Span]:
+        if parent_run_id is None:
+            return None
+        return self._parents.get(parent_run_id)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, **attributes: Any) -> Span:
+        parent = self._parent(parent_run_id)
+        span = start_span(name, parent=parent, **attributes)
+        self._spans[run_id] = (span, current_span())
+        self._parents[run_id] = span
+        return span
+
+    def _end(self, run_id: UUID, **attributes: Any) -> Optional[Span]:
+        self._parents.pop(run_id, None)
+        entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return None
+        span, _ = entry
+        span.set(**attributes)
+        span.end()
+        return span
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        if parent_run_id is None:
+            self._iterations[run_id] = 0
+            self._start(run_id, None, "agent.run", chain=name)
+        elif parent_run_id in self._iterations:
+            self._iterations[parent_run_id] += 1
+            self._start(run_id, parent_run_id, "agent.iteration", iteration=self._iterations[parent_run_id])
+        else:
+            self._parents[run_id] = self._parent(parent_run_id)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self._end_chain(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end_chain(run_id, error=type(error).__name__)
+
+    def _end_chain(self, run_id: UUID, **attributes: Any):
+        iterations = self._iterations.pop(run_id, None)
+        if iterations is not None:
+            attributes["iterations"] = iterations
+        span = self._end(run_id, **attributes)
+        if span is not None and iterations is not None:
+            AGENT_RUN_SECONDS.observe(span.seconds)
+            AGENT_ITERATIONS.observe(iterations)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None,
+                            **kwargs: Any):
+        self._start_llm(run_id, parent_run_id, serialized, metadata)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        self._start_llm(run_id, parent_run_id, serialized, metadata)
+
+    def _start_llm(self, run_id: UUID, parent_run_id: Optional[UUID], serialized: Optional[Dict[str, Any]],
+                   metadata: Optional[Dict[str, Any]]):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, parent_run_id, "llm", model=model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        input_tokens, output_tokens = token_usage(response)
+        span = self._end(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+        if span is not None:
+            model = span.attributes["model"]
+            LLM_SECONDS.observe(span.seconds, model=model)
+            LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+            LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        span = self._end(run_id, error=type(error).__name__)
+        if span is not None:
+            LLM_SECONDS.observe(span.seconds, model=span.attributes["model"])
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        span = self._start(run_id, parent_run_id, "tool", tool=kwargs.get("name") or serialized.get("name"))
+        set_current_span(span)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._end_tool(run_id, output=output)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end_tool(run_id, error=error)
+
+    def _end_tool(self, run_id: UUID, output: Any = None, error: Optional[BaseException] = None):
+        entry = self._spans.get(run_id)
+        if entry is None:
+            return
+        set_current_span(entry[1])
+        status = "error" if error is not None or (isinstance(output, dict) and output.get("status") == "error") \
+            else "success"
+        attributes = {"status": status, "output_bytes": len(str(output)) if output is not None else 0}
+        if error is not None:
+            attributes["error"] = type(error).__name__
+        span = self._end(run_id, **attributes)
+        TOOL_SECONDS.observe(span.seconds, tool=span.attributes["tool"], status=status)
+
+
+tracing_handler = TracingCallbackHandler()
+
+# LangChain adds the handler to every run started while the variable is set
+_tracing_callback: ContextVar[Optional[TracingCallbackHandler]] = ContextVar("tracing_callback", default=None)
+register_configure_hook(_tracing_callback, inheritable=True)
+
+
+@contextmanager
+def tracing_callbacks(handler: TracingCallbackHandler = tracing_handler) -> Iterator[TracingCallbackHandler]:
+    """
+    Traces the LangChain runs started inside the block without passing callbacks to each of them.
+    """
+    token = _tracing_callback.set(handler)
+    try:
+        yield handler
+    finally:
+        _tracing_callback.reset(token)
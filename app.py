@@ -8,13 +8,28 @@ aws_agent = AWSCLIHelperAgent()
 @cl.on_chat_start
 async def on_chat_start():
     cl.user_session.set("aws_agent", aws_agent)
+    cl.user_session.set("history", aws_agent.new_history())
     await cl.Message(content="Agent Initialized").send()
 
 
 @cl.on_message
 async def main(message: cl.Message):
     agent = cl.user_session.get("aws_agent")
-    response = agent.ask_question(message.content)
-    await cl.Message(
-        content=response,
-    ).send()
+    response = cl.Message(content="")
+    steps = {}
+    async for event in agent.astream(message.content, cl.user_session.get("history")):
+        if event["event"] == "token":
+            await response.stream_token(event["data"])
+        elif event["event"] == "tool_start":
+            # Tool calls of one step run concurrently, so they are told apart by their run
+            step = steps[event["run_id"]] = cl.Step(name=event["tool"], type="tool")
+            step.input = event["input"]
+            await step.send()
+        elif event["event"] == "tool_end" and event["run_id"] in steps:
+            step = steps.pop(event["run_id"])
+            step.output = event["status"]
+            await step.update()
+        elif event["event"] == "end":
+            # Tokens streamed before a tool call are intermediate, show the final answer only
+            response.content = event["output"]
+    await response.send()
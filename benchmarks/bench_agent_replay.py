@@ -0,0 +1,176 @@
+"""
+Replays recorded conversations through both agents offline and reports per-turn latency percentiles, model
+calls, tool calls and tokens per turn, and the peak RSS of the process, as JSON that can be diffed between
+releases.
+
+Each transcript in benchmarks/transcripts holds the user turns, the model responses to replay for each turn
+and the AWS responses by command. The model is a ScriptedChatModel and the AWS CLI tools answer from the
+transcript, so nothing leaves the machine. Every agent runs in its own process to keep the RSS comparable.
+
+    python -m benchmarks.bench_agent_replay --rounds 5 --llm-latency 0.2 --output replay.json
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+TRANSCRIPTS = os.path.join(os.path.dirname(__file__), "transcripts", "*.json")
+AGENTS = ("gpt-4o", "claude-sonnet")
+
+
+class TurnCounter(BaseCallbackHandler):
+    """
+    Counts the model calls, tool calls and tokens of one turn.
+    """
+
+    def __init__(self):
+        self.iterations = 0
+        self.tool_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs: Any):
+        self.iterations += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(generation.message, "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+    def on_tool_start(self, serialized, input_str, **kwargs: Any):
+        self.tool_calls += 1
+
+
+def build_agent(name: str, llm):
+    if name == "gpt-4o":
+        from agents.aws_agent import AWSCLIHelperAgent
+        return AWSCLIHelperAgent(llm=llm)
+    from agents.aws_claude_agent import AWSCLIHelperAgent
+    return AWSCLIHelperAgent(model_id=name, llm=llm)
+
+
+async def replay(agent, llm, transcript: Dict, use_async: bool) -> List[Dict]:
+    from tools import ExecutionContext, execution_context, response_cache
+
+    # Every replay has to reach the (stubbed) AWS backend
+    response_cache.clear()
+    history = agent.new_history()
+    # Background summaries would take responses from the script
+    history.summarizer = None
+    turns = []
+    with execution_context(ExecutionContext(profile="bench", region="us-east-1", credentials=None)):
+        for turn in transcript["turns"]:
+            llm.load(turn["model"])
+            counter = TurnCounter()
+            start = time.perf_counter()
+            if use_async:
+                result = await agent.arun_turn(turn["user"], history, callbacks=[counter])
+            else:
+                result = agent.run_turn(turn["user"], history, callbacks=[counter])
+            seconds = time.perf_counter() - start
+            history.add_turn(turn["user"], result["output"], result["tool_outputs"], result["pending_action"])
+            # Confirmed commands run without the agent loop, so their tool run has no callback
+            tool_calls = max(counter.tool_calls, len(result["tool_outputs"]))
+            turns.append({"transcript": transcript["name"], "seconds": seconds, "iterations": counter.iterations,
+                          "tool_calls": tool_calls, "input_tokens": counter.input_tokens,
+                          "output_tokens": counter.output_tokens})
+    return turns
+
+
+def summarize(values: List[float], digits: int = 1) -> Dict[str, float]:
+    ordered = sorted(values)
+
+    def percentile(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], digits)
+
+    return {"p50": percentile(0.5), "p90": percentile(0.9), "p95": percentile(0.95), "p99": percentile(0.99),
+            "mean": round(statistics.fmean(ordered), digits), "max": round(ordered[-1], digits)}
+
+
+def run_agent(name: str, transcripts: List[Dict], args: Dict) -> Dict:
+    """
+    Runs all transcripts `rounds` times through one agent after `warmup` unmeasured rounds. Called in a fresh
+    process.
+    """
+    from benchmarks.fakes import ScriptedChatModel, install_stub_aws_backend
+
+    responses = {command: response for transcript in transcripts for command, response in transcript["aws"].items()}
+    install_stub_aws_backend(responses, args["aws_latency"])
+    llm = ScriptedChatModel(latency=args["llm_latency"])
+    # The executors are verbose, keep their output out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = build_agent(name, llm)
+        turns = []
+        for measured in [False] * args["warmup"] + [True] * args["rounds"]:
+            for transcript in transcripts:
+                replayed = asyncio.run(replay(agent, llm, transcript, args["use_async"]))
+                if measured:
+                    turns += replayed
+
+    def per_turn(key: str) -> Dict[str, float]:
+        return summarize([turn[key] for turn in turns])
+
+    by_transcript = {}
+    for transcript in transcripts:
+        seconds = [turn["seconds"] * 1000 for turn in turns if turn["transcript"] == transcript["name"]]
+        by_transcript[transcript["name"]] = summarize(seconds)
+    return {
+        "turns": len(turns),
+        "latency_ms": summarize([turn["seconds"] * 1000 for turn in turns]),
+        "latency_ms_by_transcript": by_transcript,
+        "iterations_per_turn": per_turn("iterations"),
+        "tool_calls_per_turn": per_turn("tool_calls"),
+        "input_tokens_per_turn": per_turn("input_tokens"),
+        "output_tokens_per_turn": per_turn("output_tokens"),
+        "total_tokens": sum(turn["input_tokens"] + turn["output_tokens"] for turn in turns),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=AGENTS)
+    parser.add_argument("--transcripts", default=TRANSCRIPTS, help="glob of transcript files")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured rounds before the measured ones")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per model call")
+    parser.add_argument("--aws-latency", type=float, default=0.02, help="seconds per AWS call")
+    parser.add_argument("--sync", action="store_true", help="use run_turn instead of arun_turn")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    transcripts = []
+    for path in sorted(glob.glob(args.transcripts)):
+        with open(path) as f:
+            transcripts.append(json.load(f))
+    settings = {"rounds": args.rounds, "warmup": args.warmup, "llm_latency": args.llm_latency,
+                "aws_latency": args.aws_latency, "use_async": not args.sync}
+    report = {"settings": {**settings, "transcripts": [transcript["name"] for transcript in transcripts]},
+              "agents": {}}
+    # A process per agent so the imports and RSS of one agent don't show up in the other's numbers
+    context = multiprocessing.get_context("spawn")
+    for name in args.agents:
+        with context.Pool(1) as pool:
+            report["agents"][name] = pool.apply(run_agent, (name, transcripts, settings))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
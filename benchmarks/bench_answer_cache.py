@@ -0,0 +1,101 @@
+"""
+Measures the semantic answer cache: lookup latency against a full cache, and hits for rephrased questions.
+It also checks that answers stay with the AWS profile that stored them: a question stored under one profile
+has to hit for rephrasings under that profile and miss under every other one. Questions asking for the
+opposite operation ("create" and "terminate", "enable" and "disable", a negation) have to miss, although
+their embeddings score above the threshold. The run fails otherwise.
+
+    python -m benchmarks.bench_answer_cache --entries 2048 --lookups 2000
+"""
+import argparse
+import statistics
+import time
+
+from agents.answer_cache import AnswerCache
+from tools import ExecutionContext, execution_context
+
+QUESTIONS = [
+    ("What is the difference between an EC2 security group and a network ACL?",
+     "what is the difference between an ec2 security group and a network acl"),
+    ("How do I choose between S3 Standard and S3 Intelligent-Tiering storage classes?",
+     "How do I choose between S3 Standard and S3 Intelligent-Tiering storage classes, please?"),
+    ("Which regions support the t4g instance family for EC2?",
+     "Which regions support the t4g instance family for EC2 today?"),
+]
+
+# Close enough for the embedding alone to hit, but asking for opposite things
+OPPOSITES = [
+    ("What is the recommended way to create an EC2 instance in the default VPC of the eu-west-1 region with an "
+     "existing key pair and a gp3 root volume?",
+     "What is the recommended way to terminate an EC2 instance in the default VPC of the eu-west-1 region with an "
+     "existing key pair and a gp3 root volume?"),
+    ("What are the steps to enable public access on an S3 bucket that hosts the static website of my company in "
+     "us-east-1 and serves it through CloudFront?",
+     "What are the steps to disable public access on an S3 bucket that hosts the static website of my company in "
+     "us-east-1 and serves it through CloudFront?"),
+    ("Is it a good idea to make the RDS snapshot of our production PostgreSQL database public so the analytics "
+     "team in another account can restore it?",
+     "Is it a good idea to not make the RDS snapshot of our production PostgreSQL database public so the "
+     "analytics team in another account can restore it?"),
+    ("What happens to the data when I attach an EBS gp3 volume of the production database server in us-east-1a "
+     "while the instance keeps serving traffic?",
+     "What happens to the data when I detach an EBS gp3 volume of the production database server in us-east-1a "
+     "while the instance keeps serving traffic?"),
+]
+
+
+def check_opposites(cache: AnswerCache) -> bool:
+    ok = True
+    with execution_context(ExecutionContext(profile="alice@example.com")):
+        for index, (question, opposite) in enumerate(OPPOSITES):
+            cache.store("claude-haiku", question, f"answer {index}", 1.0)
+            score = float(cache._embed(question) @ cache._embed(opposite))
+            missed = cache.lookup("claude-haiku", opposite) is None
+            print(f"opposite {index}: cosine {score:.3f}  {'miss' if missed else 'HIT'}")
+            ok &= missed and cache.lookup("claude-haiku", question) == f"answer {index}"
+    return ok
+
+
+def check_profiles(cache: AnswerCache) -> bool:
+    ok = True
+    for index, (question, rephrased) in enumerate(QUESTIONS):
+        with execution_context(ExecutionContext(profile="alice@example.com")):
+            cache.store("claude-haiku", question, f"answer {index} for alice", 1.0)
+            ok &= cache.lookup("claude-haiku", rephrased) == f"answer {index} for alice"
+        with execution_context(ExecutionContext(profile="bob@example.com")):
+            ok &= cache.lookup("claude-haiku", rephrased) is None
+        ok &= cache.lookup("claude-haiku", rephrased) is None
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=2048)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    isolated = check_profiles(AnswerCache())
+    print(f"profiles isolated: {isolated}")
+    opposites = check_opposites(AnswerCache())
+    print(f"opposites told apart: {opposites}")
+
+    cache = AnswerCache(max_entries=args.entries)
+    with execution_context(ExecutionContext(profile="bench")):
+        for index in range(args.entries):
+            cache.store("gpt-4o", f"question number {index} about service {index % 97} in region {index % 13}",
+                        f"answer {index}", 1.0)
+        timings = []
+        for index in range(args.lookups):
+            start = time.perf_counter()
+            cache.lookup("gpt-4o", f"question number {index} about service {index % 97} in region {index % 13}?")
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    stats = cache.stats()
+    print(f"entries {stats['entries']}  lookups {args.lookups}  hit_ratio {stats['hit_ratio']:.2f}  "
+          f"p50 {statistics.median(timings) * 1000:.3f} ms  p95 {timings[int(0.95 * (len(timings) - 1))] * 1000:.3f} ms")
+    if not isolated or not opposites:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
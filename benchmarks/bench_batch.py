@@ -0,0 +1,83 @@
+"""
+Compares answering N questions one /get-response call at a time with one /get-response/batch call, through the
+FastAPI app with a fake LLM, a stubbed AWS backend and fake credentials for --profiles users.
+
+Every question costs two LLM round-trips and one AWS call, so a sequential run takes about N times that and a
+batch about N / --max-concurrency times that.
+
+    python -m benchmarks.bench_batch --questions 64 --max-concurrency 8 16 64
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeToolCallingChatModel, install_stub_aws_backend
+
+
+async def sequential(client: httpx.AsyncClient, questions: list) -> float:
+    start = time.perf_counter()
+    for question in questions:
+        response = await client.post("/get-response", json=question)
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def batch(client: httpx.AsyncClient, questions: list, max_concurrency: int) -> float:
+    start = time.perf_counter()
+    response = await client.post("/get-response/batch", json={"queries": questions,
+                                                               "max_concurrency": max_concurrency})
+    response.raise_for_status()
+    results = [json.loads(line) for line in response.text.splitlines()]
+    errors = [result for result in results if "error" in result]
+    if len(results) != len(questions) or errors:
+        raise RuntimeError(f"{len(results)} results, errors: {errors[:3]}")
+    return time.perf_counter() - start
+
+
+async def run(app, questions: list, concurrencies: list, llm_latency: float, aws_latency: float):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        expected = len(questions) * (2 * llm_latency + aws_latency)
+        elapsed = await sequential(client, questions)
+        print(f"sequential               wall {elapsed:6.2f}s  ({expected:.2f}s of latency)")
+        for max_concurrency in concurrencies:
+            elapsed = await batch(client, questions, max_concurrency)
+            print(f"batch concurrency {max_concurrency:<5}  wall {elapsed:6.2f}s  "
+                  f"throughput {len(questions) / elapsed:6.1f} questions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--profiles", type=int, default=4)
+    parser.add_argument("--max-concurrency", type=int, nargs="+", default=[8, 16, 64])
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--aws-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    install_stub_aws_backend({}, latency=args.aws_latency)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import serve
+        from agents.aws_agent import AWSCLIHelperAgent
+
+    llm = FakeToolCallingChatModel(latency=args.llm_latency)
+    serve.agents.register("gpt-4o", lambda: AWSCLIHelperAgent(llm=llm))
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    serve.broker.fetch = lambda id, owner: {"AccessKeyId": "ASIA", "SecretAccessKey": "secret",
+                                            "SessionToken": "token", "Expiration": expiration}
+    emails = [f"user-{i}@example.com" for i in range(args.profiles)]
+    for email in emails:
+        serve.broker.configure(email, "owner@example.com")
+    questions = [{"query": f"list my instances #{i}", "email": emails[i % len(emails)]}
+                 for i in range(args.questions)]
+    asyncio.run(run(serve.app, questions, args.max_concurrency, args.llm_latency, args.aws_latency))
+
+
+if __name__ == "__main__":
+    main()
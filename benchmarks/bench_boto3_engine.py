@@ -0,0 +1,102 @@
+"""
+Compares the in-process boto3 engine against spawning a fresh process per call.
+
+Both paths answer `aws ec2 describe-instances` from a local botocore Stubber, so no AWS account is needed.
+The subprocess path starts a new interpreter that loads botocore and builds a client, which is the cold
+start every CLI call pays.
+
+It also builds an ec2 client for each of --profiles users, twice to stand in for a credential rotation, and
+reports the memory and time every user costs. The run fails when the engine keeps more than --max-clients.
+
+    python -m benchmarks.bench_boto3_engine --calls 20 --profiles 30 --max-clients 16
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from botocore.stub import Stubber
+
+from tools.boto3_engine import Boto3Engine
+from tools.execution_context import ExecutionContext
+
+COMMAND = "aws ec2 describe-instances --instance-ids i-0123456789abcdef0 --region us-east-1"
+RESPONSE = {"Reservations": [{"ReservationId": "r-1", "Instances": [{"InstanceId": "i-0123456789abcdef0"}]}]}
+
+SUBPROCESS_SCRIPT = f"""
+import boto3
+from botocore.stub import Stubber
+client = boto3.Session(aws_access_key_id="x", aws_secret_access_key="x").client("ec2", region_name="us-east-1")
+with Stubber(client) as stubber:
+    stubber.add_response("describe_instances", {RESPONSE!r})
+    print(client.describe_instances(InstanceIds=["i-0123456789abcdef0"]))
+"""
+
+
+def bench_in_process(calls: int) -> list:
+    engine = Boto3Engine()
+    context = ExecutionContext(region="us-east-1", credentials={"AccessKeyId": "x", "SecretAccessKey": "x"})
+    client = engine.get_client(context, None, "ec2")
+    timings = []
+    with Stubber(client) as stubber:
+        for _ in range(calls):
+            stubber.add_response("describe_instances", RESPONSE)
+            start = time.perf_counter()
+            result = engine.execute(COMMAND, context)
+            timings.append(time.perf_counter() - start)
+            assert result["status"] == "success", result
+    return timings
+
+
+def bench_subprocess(calls: int) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", SUBPROCESS_SCRIPT], check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_profiles(profiles: int, max_clients: int) -> bool:
+    engine = Boto3Engine(max_clients=max_clients)
+    # The first client loads the shared service models
+    engine.get_client(ExecutionContext(region="us-east-1", credentials={"AccessKeyId": "x", "SecretAccessKey": "x"}),
+                      None, "ec2")
+    before, start = _rss_mb(), time.perf_counter()
+    for rotation in range(2):
+        for index in range(profiles):
+            credentials = {"AccessKeyId": f"AKIA{rotation}{index}", "SecretAccessKey": "x", "SessionToken": "x"}
+            engine.get_client(ExecutionContext(profile=f"user{index}@example.com", region="us-east-1",
+                                               credentials=credentials), None, "ec2")
+    elapsed, grown = time.perf_counter() - start, _rss_mb() - before
+    stats = engine.stats()
+    print(f"profiles     {profiles} x 2 rotations  rss +{grown:.0f} MB ({grown / profiles:.2f} MB/user)  "
+          f"{elapsed / (2 * profiles) * 1000:.1f} ms/client  clients {stats['clients']}  "
+          f"evictions {stats['evictions']}")
+    return stats["clients"] <= max_clients
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<12} mean={statistics.mean(timings) * 1000:8.2f}ms  "
+          f"p50={statistics.median(timings) * 1000:8.2f}ms  p95={p95 * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--profiles", type=int, default=30)
+    parser.add_argument("--max-clients", type=int, default=16)
+    args = parser.parse_args()
+    report("in-process", bench_in_process(args.calls))
+    report("subprocess", bench_subprocess(args.calls))
+    if not bench_profiles(args.profiles, args.max_clients):
+        raise SystemExit(1)
@@ -0,0 +1,53 @@
+"""
+Load test for the async agent entry point with a fake LLM and a stubbed `aws` CLI.
+
+Every question costs two LLM round-trips and one CLI call, so a single request takes roughly
+2 * llm_latency + cli_latency. With a non-blocking agent, throughput should grow with concurrency.
+
+    python -m benchmarks.bench_concurrency --requests 32 --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import time
+
+from agents.aws_agent import AWSCLIHelperAgent
+from benchmarks.fakes import FakeToolCallingChatModel, install_fake_aws_cli
+from tools.base_aws_cli_tool import AWSCLITool
+
+
+async def run(agent: AWSCLIHelperAgent, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await agent.ask_question_async(f"list my instances #{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--cli-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    install_fake_aws_cli(args.cli_latency)
+    agent = AWSCLIHelperAgent(llm=FakeToolCallingChatModel(latency=args.llm_latency))
+    for tool in agent.tools:
+        # The output and inventory tools don't run commands
+        if isinstance(tool, AWSCLITool):
+            tool.execution_mode = "subprocess"
+    agent.agent_executor.verbose = False
+
+    for concurrency in args.concurrency:
+        elapsed = asyncio.run(run(agent, args.requests, concurrency))
+        print(f"concurrency={concurrency:<4} requests={args.requests:<5} "
+              f"wall={elapsed:6.2f}s throughput={args.requests / elapsed:6.2f} req/s")
+
+
+if __name__ == "__main__":
+    main()
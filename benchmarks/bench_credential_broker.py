@@ -0,0 +1,74 @@
+"""
+Measures /configure-cli latency of the credential broker under N concurrent logins.
+
+DynamoDB and STS are answered by local botocore Stubbers with an artificial network latency. Every login
+is repeated, so the second round shows the cached path that used to cost five `aws configure` processes.
+
+    python -m benchmarks.bench_credential_broker --users 50 --latency 0.05
+"""
+import argparse
+import datetime
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.stub import ANY, Stubber
+
+from services import CredentialBroker
+
+
+def build_broker(users: int, latency: float) -> CredentialBroker:
+    session = boto3.Session(aws_access_key_id="x", aws_secret_access_key="x", region_name="us-east-1")
+    dynamodb = session.resource("dynamodb")
+    sts_client = session.client("sts")
+    for client in (dynamodb.meta.client, sts_client):
+        client.meta.events.register("before-call.*.*", lambda **kwargs: time.sleep(latency))
+
+    dynamodb_stubber = Stubber(dynamodb.meta.client)
+    sts_stubber = Stubber(sts_client)
+    expiration = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    for i in range(users):
+        dynamodb_stubber.add_response(
+            "get_item",
+            {"Item": {"role_arn": {"S": f"arn:aws:iam::123456789012:role/user-{i}"}}},
+            {"TableName": "account-factory-test", "Key": ANY},
+        )
+        sts_stubber.add_response("assume_role", {"Credentials": {
+            "AccessKeyId": f"ASIA{i:016d}",
+            "SecretAccessKey": "secret",
+            "SessionToken": "token",
+            "Expiration": expiration,
+        }})
+    dynamodb_stubber.activate()
+    sts_stubber.activate()
+    return CredentialBroker(session=session, dynamodb=dynamodb, sts_client=sts_client)
+
+
+def login_round(broker: CredentialBroker, users: int) -> list:
+    def login(i: int) -> float:
+        start = time.perf_counter()
+        broker.configure(f"user-{i}@example.com", "owner@example.com")
+        broker.execution_context(f"user-{i}@example.com")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        return list(pool.map(login, range(users)))
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<8} p50={statistics.median(timings) * 1000:8.2f}ms  p95={p95 * 1000:8.2f}ms  "
+          f"max={timings[-1] * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    broker = build_broker(args.users, args.latency)
+    report("cold", login_round(broker, args.users))
+    report("cached", login_round(broker, args.users))
+    print(broker.stats())
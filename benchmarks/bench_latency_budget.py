@@ -0,0 +1,84 @@
+"""
+Compares agent turns under AgentExecutor's stock caps (15 iterations, no time limit) with turns under a latency
+budget: turn latency, SLO compliance against the budget and how many turns ended with a partial answer.
+
+Most turns look up --steps things before answering, --runaway of them keep looking for --runaway-steps. The
+model is a fake that sleeps --llm-latency per call and the `aws` CLI is a script that sleeps --cli-latency,
+so without a budget a runaway turn costs runaway_steps * (llm_latency + cli_latency). --concurrency turns
+run at a time, each with a fresh history.
+
+    python -m benchmarks.bench_latency_budget --turns 40 --runaway 0.2 --budget 6 --reserve 1
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Optional
+
+from agents.aws_agent import AWSCLIHelperAgent
+from agents.budget import TurnBudget, turn_budget
+from benchmarks.fakes import ExploringChatModel, install_fake_aws_cli
+from services import LatencyBudget, SLOTracker
+from tools.base_aws_cli_tool import AWSCLITool
+
+
+def build_agent(steps: int, llm_latency: float) -> AWSCLIHelperAgent:
+    agent = AWSCLIHelperAgent(llm=ExploringChatModel(latency=llm_latency, steps=steps))
+    for tool in agent.tools:
+        if isinstance(tool, AWSCLITool):
+            tool.execution_mode = "subprocess"
+    return agent
+
+
+async def run(args, budget: Optional[float], tracker: SLOTracker, route: str):
+    normal = build_agent(args.steps, args.llm_latency)
+    runaway = build_agent(args.runaway_steps, args.llm_latency)
+    every = max(1, round(1 / args.runaway)) if args.runaway else 0
+    # The turns share one profile, whose queue of AWS commands the scheduler bounds
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def turn(index: int):
+        async with semaphore:
+            await timed_turn(runaway if every and index % every == 0 else normal)
+
+    async def timed_turn(agent: AWSCLIHelperAgent):
+        start = time.perf_counter()
+        # Stock AgentExecutor: 15 iterations and no time limit
+        with turn_budget(TurnBudget(budget, 15 if budget is None else args.max_iterations, args.reserve)) as spent:
+            await agent.arun_turn("What is running in my account?", agent.new_history())
+        tracker.record(route, time.perf_counter() - start, spent.exhausted, False)
+
+    await asyncio.gather(*(turn(index) for index in range(args.turns)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=2, help="tool calls of a normal turn")
+    parser.add_argument("--runaway", type=float, default=0.2, help="share of turns that keep looking things up")
+    parser.add_argument("--runaway-steps", type=int, default=12, help="tool calls of a runaway turn")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds per model call")
+    parser.add_argument("--cli-latency", type=float, default=0.4, help="seconds per AWS CLI call")
+    parser.add_argument("--budget", type=float, default=6, help="latency budget of a turn in seconds")
+    parser.add_argument("--max-iterations", type=int, default=6, help="agent iterations of a budgeted turn")
+    parser.add_argument("--reserve", type=float, default=1, help="seconds kept for the partial answer")
+    args = parser.parse_args()
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ[name] = "bench"
+    install_fake_aws_cli(args.cli_latency)
+    # Compliance is reported against the same budget for both
+    tracker = SLOTracker({"stock": LatencyBudget(args.budget), "budgeted": LatencyBudget(args.budget,
+                                                                                         args.max_iterations)})
+    asyncio.run(run(args, None, tracker, "stock"))
+    asyncio.run(run(args, args.budget, tracker, "budgeted"))
+    for route, stats in tracker.stats().items():
+        latencies = stats["latency_p50"], stats["latency_p95"]
+        print(f"{route:<9} p50 {latencies[0]:6.2f} s  p95 {latencies[1]:6.2f} s  "
+              f"compliance {stats['compliance']:.0%}  met {stats['met']:3}  partial {stats['partial']:3}  "
+              f"missed {stats['missed']:3}  exhausted {stats['budget_exhausted']}")
+
+
+if __name__ == "__main__":
+    main()
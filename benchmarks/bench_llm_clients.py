@@ -0,0 +1,221 @@
+"""
+Compares model backend clients under concurrent calls against a local mock server that answers the OpenAI
+chat completions and Bedrock invoke-model APIs.
+
+The server sleeps --latency seconds per call and --connect-delay seconds per new connection, standing in for
+the TLS handshake, and counts the connections it accepted. Scenarios:
+
+  openai  new client per call    a ChatOpenAI built for every call, so every call opens its connection
+  openai  own ChatOpenAI         ChatOpenAI with its default connection pool
+  openai  shared registry        ClientRegistry.openai_chat
+  bedrock default pool           boto3 bedrock-runtime client with botocore's 10 connections
+  bedrock shared registry        ClientRegistry.bedrock
+
+The openai package spends about 10ms of CPU per call building the request, so the OpenAI scenarios are bound
+by the event loop well below the concurrency, the difference between them is the connections opened.
+
+    python -m benchmarks.bench_llm_clients --concurrency 32 --calls 256 --latency 0.05 --connect-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import socket
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+import boto3
+
+from agents.clients import ClientRegistry
+
+OPENAI_RESPONSE = {
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}
+OPENAI_STREAM_CHUNK = {
+    "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop", "delta": {"role": "assistant", "content": "ok"}}],
+}
+BEDROCK_RESPONSE = {
+    "id": "msg_bench", "type": "message", "role": "assistant", "model": "claude",
+    "content": [{"type": "text", "text": "ok"}], "stop_reason": "end_turn",
+    "usage": {"input_tokens": 10, "output_tokens": 1},
+}
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops bursts of connects into 1s SYN retransmits
+    request_queue_size = 1024
+
+    def __init__(self, latency: float, connect_delay: float, connections: "multiprocessing.Value",
+                 prefill: float = 0.0):
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.connections = connections
+        # Seconds per 1000 prompt tokens, estimated as 4 bytes of request body each
+        self.prefill = prefill
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    # Keeps connections open between requests
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately, without this delayed ACKs add 40ms to every call
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.connections.get_lock():
+            self.server.connections.value += 1
+        time.sleep(self.server.connect_delay)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.server.latency + self.server.prefill * len(body) / 4000)
+        content_type = "application/json"
+        if re.match(r"^/model/.+/invoke$", self.path):
+            body = json.dumps(BEDROCK_RESPONSE).encode()
+        elif json.loads(body or b"{}").get("stream"):
+            # Agents stream their model calls
+            content_type = "text/event-stream"
+            body = f"data: {json.dumps(OPENAI_STREAM_CHUNK)}\n\ndata: [DONE]\n\n".encode()
+        else:
+            body = json.dumps(OPENAI_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(latency: float, connect_delay: float, connections: "multiprocessing.Value", ports: multiprocessing.Queue,
+          prefill: float = 0.0):
+    server = MockServer(latency, connect_delay, connections, prefill)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockServerProcess:
+    """
+    Runs the mock server in a process of its own, so it doesn't compete with the clients for the GIL.
+    """
+
+    def __init__(self, latency: float, connect_delay: float, prefill: float = 0.0):
+        self._connections = multiprocessing.Value("i", 0)
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=serve, args=(latency, connect_delay, self._connections, ports,
+                                                                    prefill), daemon=True)
+        self._process.start()
+        self.url = f"http://127.0.0.1:{ports.get()}"
+
+    @property
+    def connections(self) -> int:
+        return self._connections.value
+
+    @connections.setter
+    def connections(self, value: int):
+        self._connections.value = value
+
+    def stop(self):
+        self._process.terminate()
+
+
+def report(name: str, server: MockServerProcess, timings: List[float], elapsed: float):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(0.95 * len(timings)))]
+    print(f"{name:<32} {len(timings) / elapsed:8.1f} calls/s  p50 {statistics.median(timings) * 1000:7.1f} ms  "
+          f"p95 {p95 * 1000:7.1f} ms  connections {server.connections}")
+
+
+async def bench_openai(server: MockServerProcess, invoke: Callable, calls: int, concurrency: int) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def call():
+        async with semaphore:
+            start = time.perf_counter()
+            await invoke()
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(calls)))
+    return timings, time.perf_counter() - start
+
+
+async def run_openai(server: MockServerProcess, registry: ClientRegistry, calls: int, concurrency: int):
+    # All scenarios run in one event loop, the async connection pools are bound to it
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    openai = {"base_url": f"{server.url}/v1", "api_key": "bench", "max_retries": 0}
+    own = ChatOpenAI(model="gpt-4o", **openai)
+
+    async def new_client():
+        async with httpx.AsyncClient() as http_async_client:
+            await ChatOpenAI(model="gpt-4o", http_async_client=http_async_client, **openai).ainvoke("hello")
+
+    scenarios = {
+        "openai  new client per call": new_client,
+        "openai  own ChatOpenAI": lambda: own.ainvoke("hello"),
+        "openai  shared registry": lambda: registry.openai_chat("gpt-4o", base_url=openai["base_url"],
+                                                                api_key="bench").ainvoke("hello"),
+    }
+    for name, invoke in scenarios.items():
+        await bench_openai(server, invoke, concurrency, concurrency)
+        server.connections = 0
+        timings, elapsed = await bench_openai(server, invoke, calls, concurrency)
+        report(name, server, timings, elapsed)
+    await registry.aclose()
+
+
+def bench_bedrock(client, calls: int, concurrency: int) -> tuple:
+    body = json.dumps({"anthropic_version": "bedrock-2023-05-31", "max_tokens": 10,
+                       "messages": [{"role": "user", "content": "hello"}]})
+
+    def call() -> float:
+        start = time.perf_counter()
+        client.invoke_model(modelId="anthropic.claude-3-haiku-20240307-v1:0", body=body)["body"].read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(lambda _: call(), range(calls)))
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="seconds per new connection")
+    args = parser.parse_args()
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ[name] = "bench"
+    server = MockServerProcess(args.latency, args.connect_delay)
+    registry = ClientRegistry(bedrock_endpoint_url=server.url)
+    asyncio.run(run_openai(server, registry, args.calls, args.concurrency))
+
+    default = boto3.client("bedrock-runtime", region_name="us-east-1", endpoint_url=server.url)
+    for name, client in (("bedrock default pool", default),
+                         ("bedrock shared registry", registry.bedrock("us-east-1"))):
+        bench_bedrock(client, args.concurrency, args.concurrency)
+        server.connections = 0
+        timings, elapsed = bench_bedrock(client, args.calls, args.concurrency)
+        report(name, server, timings, elapsed)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
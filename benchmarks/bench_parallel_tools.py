@@ -0,0 +1,87 @@
+"""
+Compares one agent turn in which the model asks for several read-only tool calls at once (the lookups behind an
+EC2 auto-fill) on the stock AgentExecutor and on ParallelToolAgentExecutor.
+
+The model is a fake that emits all tool calls in one step and the `aws` CLI is a script that sleeps, so a
+turn costs 2 * llm_latency plus the tool time. --mutating adds a create call in the middle, which still runs
+on its own.
+
+    python -m benchmarks.bench_parallel_tools --cli-latency 0.3 --max-parallel 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from agents.executor import ParallelToolAgentExecutor
+from benchmarks.fakes import FakeToolCallingChatModel, install_fake_aws_cli
+from tools import AWSCLICreateTool, AWSCLIDescribeTool, AWSCLIGetTool, response_cache
+
+LOOKUPS = [
+    ("aws_cli_describe_tool", "ec2 describe-vpcs"),
+    ("aws_cli_describe_tool", "ec2 describe-subnets"),
+    ("aws_cli_describe_tool", "ec2 describe-security-groups"),
+    ("aws_cli_describe_tool", "ec2 describe-key-pairs"),
+    ("aws_cli_describe_tool", "ec2 describe-images --owners amazon"),
+    ("aws_cli_get_tool", "ec2 describe-instance-types"),
+]
+
+
+def build(executor_class, tool_calls, llm_latency: float, max_parallel: int):
+    tools = [AWSCLIDescribeTool(), AWSCLIGetTool(), AWSCLICreateTool()]
+    for tool in tools:
+        tool.execution_mode = "subprocess"
+    llm = FakeToolCallingChatModel(latency=llm_latency, tool_calls=tool_calls)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an AWS assistant."),
+        ("human", "{user_input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+    agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=prompt)
+    extra = {"max_parallel_tools": max_parallel} if executor_class is ParallelToolAgentExecutor else {}
+    return executor_class(agent=agent, tools=tools, return_intermediate_steps=True, **extra)
+
+
+def measure(executor, rounds: int, use_async: bool):
+    timings = []
+    for _ in range(rounds):
+        # Every round has to reach the CLI
+        response_cache.clear()
+        start = time.perf_counter()
+        if use_async:
+            result = asyncio.run(executor.ainvoke({"user_input": "auto fill an EC2 launch"}))
+        else:
+            result = executor.invoke({"user_input": "auto fill an EC2 launch"})
+        timings.append(time.perf_counter() - start)
+    order = [action.tool_input["aws_cli_command"] for action, _ in result["intermediate_steps"]]
+    return statistics.median(timings), order
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--cli-latency", type=float, default=0.3)
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument("--mutating", action="store_true", help="add a create call between the lookups")
+    args = parser.parse_args()
+
+    install_fake_aws_cli(args.cli_latency)
+    tool_calls = list(LOOKUPS)
+    if args.mutating:
+        tool_calls.insert(3, ("aws_cli_create_tool", "ec2 create-key-pair --key-name bench"))
+    expected = [command for _, command in tool_calls]
+
+    for use_async in (False, True):
+        for executor_class in (AgentExecutor, ParallelToolAgentExecutor):
+            executor = build(executor_class, tool_calls, args.llm_latency, args.max_parallel)
+            seconds, order = measure(executor, args.rounds, use_async)
+            print(f"{'ainvoke' if use_async else 'invoke':<8} {executor_class.__name__:<26} "
+                  f"{len(tool_calls)} calls  {seconds:6.2f}s  order kept: {order == expected}")
+
+
+if __name__ == "__main__":
+    main()
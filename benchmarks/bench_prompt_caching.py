@@ -0,0 +1,100 @@
+"""
+Checks which Bedrock requests of the Claude agent carry prompt cache breakpoints, and what they cost in
+tokens. The agents are built like serve.py builds them, on the shared bedrock-runtime client of
+agents.clients, which is stubbed with botocore's Stubber so nothing leaves the machine.
+
+Models on the prompt caching allowlist must get a PromptCachingBedrockClient and send cache_control on the
+last tool and on the system prompt. All other models must get the plain client and send neither, since
+Bedrock rejects them with a ValidationException. The run fails when a client or a payload doesn't match.
+
+    python -m benchmarks.bench_prompt_caching --turns 3
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+from typing import Dict, List, Tuple
+
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from agents.bedrock_caching import PromptCachingBedrockClient, supports_prompt_caching
+from agents.clients import clients
+from agents.history import count_tokens
+
+MODELS = (
+    "anthropic.claude-3-5-sonnet-20240620-v1:0",
+    "anthropic.claude-3-haiku-20240307-v1:0",
+    "anthropic.claude-3-5-haiku-20241022-v1:0",
+    "anthropic.claude-3-7-sonnet-20250219-v1:0",
+)
+
+
+def answer(input_tokens: int) -> Dict:
+    payload = json.dumps({
+        "id": "msg_bench", "type": "message", "role": "assistant", "model": "claude",
+        "content": [{"type": "text", "text": "You have no running instances."}],
+        "stop_reason": "end_turn", "usage": {"input_tokens": input_tokens, "output_tokens": 8},
+    }).encode()
+    return {"body": StreamingBody(io.BytesIO(payload), len(payload)), "contentType": "application/json"}
+
+
+def cache_points(body: Dict) -> Dict[str, bool]:
+    system = body.get("system")
+    return {
+        "tools": bool(body.get("tools")) and "cache_control" in body["tools"][-1],
+        "system": isinstance(system, list) and any("cache_control" in block for block in system),
+    }
+
+
+def run(model_id: str, turns: int) -> Tuple[bool, List[Dict]]:
+    from agents.aws_claude_agent import AWSCLIHelperAgent
+
+    bodies: List[Dict] = []
+    client = clients.bedrock()
+
+    def record(params: Dict, **kwargs):
+        # Sees the request after PromptCachingBedrockClient changed it
+        bodies.append(json.loads(params["body"]))
+
+    client.meta.events.register("before-parameter-build.bedrock-runtime.InvokeModel", record)
+    stubber = Stubber(client)
+    for _ in range(turns):
+        stubber.add_response("invoke_model", answer(2000))
+    agent = AWSCLIHelperAgent(model_id=model_id)
+    wrapped = isinstance(agent.llm.client, PromptCachingBedrockClient)
+    try:
+        with stubber:
+            for _ in range(turns):
+                asyncio.run(agent.arun_turn("Which EC2 instances are running?", agent.new_history()))
+    finally:
+        client.meta.events.unregister("before-parameter-build.bedrock-runtime.InvokeModel", record)
+    return wrapped, bodies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=3)
+    args = parser.parse_args()
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    failed = False
+    for model_id in MODELS:
+        expected = supports_prompt_caching(model_id)
+        wrapped, bodies = run(model_id, args.turns)
+        points = [cache_points(body) for body in bodies]
+        ok = wrapped == expected and len(bodies) == args.turns and \
+            all(point == {"tools": expected, "system": expected} for point in points)
+        failed |= not ok
+        print(f"{model_id:<46} allowlisted {str(expected):<5} caching client {str(wrapped):<5} "
+              f"requests {len(bodies)}  cache points {points[-1]}  request_tokens {count_tokens(json.dumps(bodies[-1])):5}  "
+              f"{'ok' if ok else 'MISMATCH'}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Measures how many AWS calls identical reads of many sessions of one profile cost when they arrive together.
+
+Every session asks the same read at the same moment, spelled the way a model might: with or without the
+leading "aws", options in another order, `--option=value`, extra spaces or an explicit `--output json`.
+The response cache is cleared before each round, so only reads in flight at the same time can be shared.
+AWS calls are stubbed and take --latency seconds.
+
+    python -m benchmarks.bench_single_flight --sessions 50 --rounds 5 --latency 0.2
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fakes import install_stub_aws_backend
+from tools import AWSCLIGetTool, ExecutionContext, execution_context, response_cache, single_flight
+from tools.base_aws_cli_tool import AWSCLITool
+
+SPELLINGS = [
+    "aws ec2 describe-instances --region us-east-1 --filters Name=instance-state-name,Values=running",
+    "ec2 describe-instances --filters Name=instance-state-name,Values=running --region us-east-1",
+    "aws  ec2 describe-instances --region=us-east-1 --filters 'Name=instance-state-name,Values=running'",
+    "aws ec2 describe-instances --output json --filters Name=instance-state-name,Values=running "
+    "--region us-east-1",
+]
+
+
+async def run(sessions: int, rounds: int) -> float:
+    tool = AWSCLIGetTool()
+    context = ExecutionContext(profile="bench")
+
+    async def session(i: int):
+        with execution_context(context):
+            await tool.ainvoke({"aws_cli_command": SPELLINGS[i % len(SPELLINGS)]})
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response_cache.clear()
+        await asyncio.gather(*(session(i) for i in range(sessions)))
+    return time.perf_counter() - start
+
+
+def count_aws_calls() -> list:
+    """
+    Counts the stubbed AWS calls. Returns a one-element list holding the count.
+    """
+    calls = [0]
+    aexecute = AWSCLITool._aexecute
+
+    async def counted(self, aws_cli_command, context):
+        calls[0] += 1
+        return await aexecute(self, aws_cli_command, context)
+
+    AWSCLITool._aexecute = counted
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per AWS call")
+    args = parser.parse_args()
+
+    install_stub_aws_backend({}, latency=args.latency)
+    calls = count_aws_calls()
+    reads = args.sessions * args.rounds
+    for enabled in (False, True):
+        single_flight.enabled = enabled
+        calls[0] = 0
+        elapsed = asyncio.run(run(args.sessions, args.rounds))
+        print(f"single_flight={str(enabled):<5} reads={reads:<5} aws_calls={calls[0]:<5} "
+              f"calls/read={calls[0] / reads:.3f} wall={elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Measures the cold start of serve.py: how long `import serve` takes and how long it takes from launching
+uvicorn until /health first answers 200.
+
+Every round runs in a fresh interpreter. With --ref the same measurements are taken on a git revision of the
+tree exported to a temporary directory, e.g. the commit before agents were built lazily:
+
+    python -m benchmarks.bench_startup --rounds 5 --ref HEAD~1
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import serve; print(time.perf_counter() - start)"
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    # Building an agent only needs these to be set, nothing is called
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.setdefault("AWS_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    env.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def import_seconds(tree: str) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=tree, env=environment(),
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def healthy_seconds(tree: str, timeout: float = 120) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "serve:app", "--port", str(port),
+                                "--log-level", "warning"],
+                               cwd=tree, env=environment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("/health did not answer in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def export_tree(ref: str, directory: str) -> str:
+    archive = os.path.join(directory, "tree.tar")
+    subprocess.run(["git", "archive", "--format=tar", "-o", archive, ref], cwd=ROOT, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(os.path.join(directory, "tree"))
+    return os.path.join(directory, "tree")
+
+
+def measure(label: str, tree: str, rounds: int):
+    imports = [import_seconds(tree) for _ in range(rounds)]
+    healthy = [healthy_seconds(tree) for _ in range(rounds)]
+    print(f"{label:>12}: import {statistics.median(imports) * 1000:8.1f}ms   "
+          f"first healthy response {statistics.median(healthy) * 1000:8.1f}ms   (median of {rounds})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--ref", help="git revision to compare against")
+    args = parser.parse_args()
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as directory:
+            measure(args.ref, export_tree(args.ref, directory), args.rounds)
+    measure("working tree", ROOT, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
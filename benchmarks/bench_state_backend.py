@@ -0,0 +1,82 @@
+"""
+Measures the cost of sharing chat histories between replicas through a state backend.
+
+Two SessionStores stand in for two replicas behind a load balancer without sticky sessions. Every user's turns
+alternate between them, so every turn has to see the previous one, which was written by the other replica.
+Reports the time a turn waits for the store, the read round-trips it costs on the request path, the write
+round-trips made in the background per turn and checks that no turn was lost.
+
+The Redis backend talks to a local fake server that sleeps --redis-latency seconds per round-trip.
+
+    python -m benchmarks.bench_state_backend --users 50 --turns 20 --redis-latency 0.0005
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from agents.history import ChatHistory
+from benchmarks.fakes import FakeRedisServer
+from services import RedisStateBackend, SessionStore, SQLiteStateBackend, StateBackend
+
+
+def run(backend: Optional[StateBackend], users: int, turns: int) -> dict:
+    replicas = [SessionStore(lambda key: ChatHistory(k=turns), backend=backend) for _ in range(2)]
+    timings = []
+
+    def user(i: int):
+        for turn in range(turns):
+            start = time.perf_counter()
+            history = replicas[turn % 2].get((f"user-{i}@example.com", "gpt-4o"))
+            timings.append(time.perf_counter() - start)
+            history.add_turn(f"question {turn}", f"answer {turn}")
+            if backend is not None:
+                # The next request of the user arrives after the answer went back to them
+                backend.flush()
+
+    before = (backend.read_round_trips, backend.write_round_trips) if backend is not None else (0, 0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(user, range(users)))
+    elapsed = time.perf_counter() - start
+    after = (backend.read_round_trips, backend.write_round_trips) if backend is not None else (0, 0)
+    lost = sum(len(replicas[turns % 2].get((f"user-{i}@example.com", "gpt-4o")).messages) != 2 * turns
+               for i in range(users)) if backend is not None else 0
+    timings.sort()
+    return {
+        "turns/s": round(users * turns / elapsed),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(timings[int(0.99 * (len(timings) - 1))] * 1000, 3),
+        "reads/turn": round((after[0] - before[0]) / (users * turns), 2),
+        "writes/turn": round((after[1] - before[1]) / (users * turns), 2),
+        "lost_histories": lost,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--redis-latency", type=float, default=0.0005, help="seconds per round-trip")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="state-backend-")
+    server = FakeRedisServer(latency=args.redis_latency)
+    backends = {
+        "memory (one replica)": lambda: None,
+        "sqlite wal": lambda: SQLiteStateBackend(os.path.join(directory, "state.db")),
+        "redis": lambda: RedisStateBackend.from_url(server.url),
+    }
+    for name, build in backends.items():
+        backend = build()
+        result = run(backend, args.users, args.turns)
+        print(f"{name:<22} " + "  ".join(f"{key} {value}" for key, value in result.items()))
+        if backend is not None:
+            backend.close()
+
+
+if __name__ == "__main__":
+    main()
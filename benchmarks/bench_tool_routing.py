@@ -0,0 +1,87 @@
+"""
+Compares what every model call of an agent costs with the five per-verb AWS CLI tools and with the single
+aws_cli_tool: system prompt, tool schema and request tokens, and the latency of one agent iteration.
+
+Both agents run against the local mock model server of bench_llm_clients with their real ChatOpenAI and
+ChatBedrock clients, so the request bodies are the ones the providers would get. Tokens are counted on those
+bodies. The mock answers without calling a tool after sleeping --latency seconds plus --prefill seconds per
+1000 prompt tokens, standing in for the time the model takes to read the prompt.
+
+    python -m benchmarks.bench_tool_routing --iterations 50 --latency 0.3 --prefill 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import boto3
+import httpx
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agents.history import count_tokens
+from benchmarks.bench_llm_clients import MockServerProcess
+
+AGENTS = ("gpt-4o", "claude-sonnet")
+
+
+def build_agent(name: str, server: MockServerProcess, consolidated_tool: bool, record: Callable[[bytes], None]):
+    if name == "gpt-4o":
+        from langchain_openai import ChatOpenAI
+
+        from agents.aws_agent import AWSCLIHelperAgent
+
+        async def on_request(request: httpx.Request):
+            record(request.content)
+
+        llm = ChatOpenAI(model="gpt-4o", base_url=f"{server.url}/v1", api_key="bench", max_retries=0,
+                         http_async_client=httpx.AsyncClient(event_hooks={"request": [on_request]}))
+        return AWSCLIHelperAgent(llm=llm, consolidated_tool=consolidated_tool)
+    from langchain_aws import ChatBedrock
+
+    from agents.aws_claude_agent import AWSCLIHelperAgent
+    client = boto3.client("bedrock-runtime", region_name="us-east-1", endpoint_url=server.url)
+    client.meta.events.register("before-send.bedrock-runtime.InvokeModel",
+                                lambda request, **kwargs: record(request.body))
+    llm = ChatBedrock(model_id="anthropic.claude-3-5-sonnet-20240620-v1:0", client=client)
+    return AWSCLIHelperAgent(model_id=name, llm=llm, consolidated_tool=consolidated_tool)
+
+
+async def run(agent, iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await agent.arun_turn("Which EC2 instances are running in us-east-1?", agent.new_history())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per model call")
+    parser.add_argument("--prefill", type=float, default=0.05, help="seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ[name] = "bench"
+    server = MockServerProcess(args.latency, 0, args.prefill)
+    for name in AGENTS:
+        for consolidated_tool in (False, True):
+            bodies: List[bytes] = []
+            agent = build_agent(name, server, consolidated_tool, bodies.append)
+            timings = sorted(asyncio.run(run(agent, args.iterations)))
+            schemas = json.dumps([convert_to_openai_tool(tool) for tool in agent.tools])
+            print(f"{name:<14} {'aws_cli_tool' if consolidated_tool else 'per-verb tools':<15} "
+                  f"tools {len(agent.tools)}  system_tokens {count_tokens(agent.system_prompt):5}  "
+                  f"tool_schema_tokens {count_tokens(schemas):5}  "
+                  f"request_tokens {count_tokens(bodies[-1].decode()):5}  "
+                  f"p50 {statistics.median(timings) * 1000:6.1f} ms  "
+                  f"p95 {timings[int(0.95 * (len(timings) - 1))] * 1000:6.1f} ms")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures the overhead of request tracing: a bare span, an agent turn with and without the tracing callback
+handler, and a request through FastAPI with and without TracingMiddleware.
+
+The agent turn uses the scripted model and the stubbed AWS backend with no latency, so the difference is all
+tracing. --show-trace prints the trace of one traced request.
+
+    python -m benchmarks.bench_tracing --turns 200 --requests 2000 --repeat 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from benchmarks.fakes import ScriptedChatModel, install_stub_aws_backend
+from services import TracingMiddleware
+from tools import ExecutionContext, execution_context, response_cache
+from tools.telemetry import metrics, span, trace
+
+SCRIPT = [
+    {"tool_calls": [{"name": "aws_cli_describe_tool", "args": {"aws_cli_command": "aws ec2 describe-instances"}},
+                    {"name": "aws_cli_get_tool", "args": {"aws_cli_command": "aws ec2 describe-vpcs"}}]},
+    {"content": "You have no instances."},
+]
+
+
+def bench_span(rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with span("bench"):
+            pass
+    return (time.perf_counter() - start) / rounds
+
+
+async def bench_turns(agent, llm, turns: int, traced: bool) -> float:
+    from agents.tracing import tracing_callbacks
+
+    timings = []
+    with execution_context(ExecutionContext(profile="bench", region="us-east-1", credentials=None)):
+        for _ in range(turns):
+            response_cache.clear()
+            history = agent.new_history()
+            llm.load(SCRIPT)
+            start = time.perf_counter()
+            if traced:
+                with trace("bench"), tracing_callbacks():
+                    await agent.arun_turn("Which instances do I have?", history)
+            else:
+                await agent.arun_turn("Which instances do I have?", history)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def build_app(traced: bool) -> FastAPI:
+    app = FastAPI()
+    if traced:
+        app.add_middleware(TracingMiddleware)
+
+    @app.post("/get-response")
+    async def get_response():
+        return JSONResponse({"response": "ok"})
+
+    return app
+
+
+async def bench_requests(app: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):
+            await client.post("/get-response")
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.post("/get-response")
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--show-trace", action="store_true")
+    args = parser.parse_args()
+
+    print(f"span enter/exit        {bench_span(args.spans) * 1e6:8.2f} us")
+
+    install_stub_aws_backend({}, latency=0)
+    llm = ScriptedChatModel(latency=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from agents.aws_agent import AWSCLIHelperAgent
+        agent = AWSCLIHelperAgent(llm=llm)
+    asyncio.run(bench_turns(agent, llm, 10, True))
+    # Alternating repetitions, best of each, to keep machine noise out of the difference
+    timings = {False: [], True: []}
+    for _ in range(args.repeat):
+        for traced in (False, True):
+            timings[traced].append(asyncio.run(bench_turns(agent, llm, args.turns, traced)))
+    plain, traced = min(timings[False]), min(timings[True])
+    print(f"agent turn untraced    {plain * 1000:8.3f} ms")
+    print(f"agent turn traced      {traced * 1000:8.3f} ms  (+{(traced - plain) * 1000:.3f} ms)")
+
+    apps = {False: build_app(False), True: build_app(True)}
+    timings = {False: [], True: []}
+    for _ in range(args.repeat):
+        for traced in (False, True):
+            timings[traced].append(asyncio.run(bench_requests(apps[traced], args.requests)))
+    plain, traced = min(timings[False]), min(timings[True])
+    print(f"request untraced       {plain * 1e6:8.1f} us")
+    print(f"request traced         {traced * 1e6:8.1f} us  (+{(traced - plain) * 1e6:.1f} us)")
+
+    if args.show_trace:
+        from agents.tracing import tracing_callbacks
+
+        with execution_context(ExecutionContext(profile="bench", region="us-east-1", credentials=None)):
+            response_cache.clear()
+            llm.load(SCRIPT)
+            with trace("http.request") as root, tracing_callbacks():
+                asyncio.run(agent.arun_turn("Which instances do I have?", agent.new_history()))
+        print(json.dumps(root.trace.as_dict(), indent=2))
+        print(metrics.render())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Offline stand-ins for the chat models, the AWS CLI and Redis used by the benchmarks.
+"""
+import asyncio
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from copy import copy
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agents.history import count_tokens
+
+
+class FakeToolCallingChatModel(BaseChatModel):
+    """
+    Calls `tool_name` once per user turn, then answers with the tool output. Each call sleeps `latency` seconds.
+    With `tool_calls`, (tool name, command) pairs, it asks for all of them in a single step instead.
+    """
+    latency: float = 0.1
+    tool_name: str = "aws_cli_describe_tool"
+    tool_command: str = "aws ec2 describe-instances"
+    tool_calls: List[Tuple[str, str]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-calling"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content=f"Done: {messages[-1].content[:80]}")
+        else:
+            message = AIMessage(content="", tool_calls=[{
+                "name": name,
+                "args": {"aws_cli_command": command},
+                "id": f"call_{uuid.uuid4().hex[:8]}",
+            } for name, command in self.tool_calls or [(self.tool_name, self.tool_command)]])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+
+class ExploringChatModel(FakeToolCallingChatModel):
+    """
+    Looks one more thing up per step, `steps` tool calls in total, before it answers. Without bound tools, as
+    for the partial answer, it answers right away. Each call sleeps `latency` seconds.
+    """
+    steps: int = 3
+    tools_bound: bool = False
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        bound = copy(self)
+        bound.tools_bound = True
+        return bound
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        done = sum(isinstance(message, ToolMessage) for message in messages)
+        if not self.tools_bound or done >= self.steps:
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"Answer after {done} calls"))])
+        message = AIMessage(content="", tool_calls=[{
+            "name": self.tool_name,
+            "args": {"aws_cli_command": f"{self.tool_command} --starting-token {uuid.uuid4().hex[:8]}"},
+            "id": f"call_{uuid.uuid4().hex[:8]}",
+        }])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Replays recorded model responses in order, one per call: {"tool_calls": [{"name": ..., "args": {...}}]} or
+    {"content": "..."}. `load` queues the responses of the next user turn. When the queue is empty it answers
+    "OK" so extra calls don't fail the run. Token usage is estimated from the prompt and the response.
+    """
+    latency: float = 0.1
+    queue: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self
+
+    def load(self, responses: List[Dict]):
+        self.queue = deque(responses)
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        queue: Optional[Deque[Dict]] = self.queue
+        response = queue.popleft() if queue else {"content": "OK"}
+        tool_calls = [{"name": call["name"], "args": call["args"], "id": f"call_{uuid.uuid4().hex[:8]}"}
+                      for call in response.get("tool_calls", [])]
+        content = response.get("content", "")
+        prompt = "".join(message.content if isinstance(message.content, str) else json.dumps(message.content)
+                         for message in messages)
+        input_tokens = count_tokens(prompt)
+        output_tokens = count_tokens(content + json.dumps(response.get("tool_calls", [])))
+        message = AIMessage(content=content, tool_calls=tool_calls, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+
+def install_stub_aws_backend(responses: Dict[str, Any], latency: float = 0.05):
+    """
+    Makes every AWS CLI tool answer from `responses`, keyed by the command without the leading "aws ", after
+    sleeping `latency` seconds. Unknown commands return an empty JSON object. Caching, confirmation and output
+    shaping still run as usual.
+    """
+    from tools.base_aws_cli_tool import AWSCLITool
+    from tools.output_pipeline import shape_output
+
+    def result(aws_cli_command: str, context) -> dict:
+        command = aws_cli_command[4:] if aws_cli_command.startswith("aws ") else aws_cli_command
+        response = responses.get(command, {})
+        if isinstance(response, dict) and response.get("status") == "error":
+            return response
+        return shape_output({"status": "success", "message": json.dumps(response)}, context.profile)
+
+    def execute(self, aws_cli_command: str, context) -> dict:
+        time.sleep(latency)
+        return result(aws_cli_command, context)
+
+    async def aexecute(self, aws_cli_command: str, context) -> dict:
+        await asyncio.sleep(latency)
+        return result(aws_cli_command, context)
+
+    AWSCLITool._execute = execute
+    AWSCLITool._aexecute = aexecute
+
+
+def install_fake_aws_cli(latency: float = 0.2) -> str:
+    """
+    Puts an `aws` script that sleeps and prints an empty reservation list first on PATH. Returns its directory.
+    """
+    directory = tempfile.mkdtemp(prefix="fake-aws-cli-")
+    path = os.path.join(directory, "aws")
+    with open(path, "w") as f:
+        f.write(f"#!/bin/sh\nsleep {latency}\necho '{{\"Reservations\": []}}'\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    os.environ["PATH"] = directory + os.pathsep + os.environ.get("PATH", "")
+    return directory
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    In-memory server for the subset of the Redis protocol used by RedisStateBackend: PING, AUTH, SELECT,
+    GET, MGET, SET with EX/PX, DEL and FLUSHDB. Sleeps `latency` seconds per network read to stand in for
+    the round-trip to a remote Redis, so pipelined commands pay it once. Counts the round-trips it served.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _FakeRedisHandler)
+        self.latency = latency
+        self.data: Dict[bytes, Tuple[bytes, float]] = {}
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True, name="fake-redis").start()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def execute(self, command: List[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        now = time.time()
+        with self._lock:
+            if name in (b"PING", b"AUTH", b"SELECT", b"FLUSHDB"):
+                if name == b"FLUSHDB":
+                    self.data.clear()
+                return b"+OK\r\n" if name != b"PING" else b"+PONG\r\n"
+            if name in (b"GET", b"MGET"):
+                values = [self.data.get(key) for key in args]
+                values = [value[0] if value is not None and value[1] > now else None for value in values]
+                encoded = [b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+                           for value in values]
+                return encoded[0] if name == b"GET" else b"*%d\r\n" % len(values) + b"".join(encoded)
+            if name == b"SET":
+                expires_at = float("inf")
+                if len(args) >= 4 and args[2].upper() in (b"EX", b"PX"):
+                    expires_at = now + int(args[3]) / (1000 if args[2].upper() == b"PX" else 1)
+                self.data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+class _FakeRedisHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buffer = b""
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            commands, buffer = _parse_commands(buffer + data)
+            if not commands:
+                continue
+            # Everything that arrived in one read was sent in one pipeline
+            replies = b"".join(self.server.execute(command) for command in commands)
+            self.server.round_trips += 1
+            time.sleep(self.server.latency)
+            self.request.sendall(replies)
+
+
+def _parse_commands(buffer: bytes) -> Tuple[List[List[bytes]], bytes]:
+    """
+    Splits the complete RESP commands off the front of `buffer`. Returns them and the incomplete rest.
+    """
+    commands = []
+    position = 0
+    while True:
+        end = buffer.find(b"\r\n", position)
+        if end < 0:
+            break
+        cursor, command = end + 2, []
+        for _ in range(int(buffer[position + 1:end])):
+            end = buffer.find(b"\r\n", cursor)
+            if end < 0:
+                break
+            length = int(buffer[cursor + 1:end])
+            if len(buffer) < end + 2 + length + 2:
+                break
+            command.append(buffer[end + 2:end + 2 + length])
+            cursor = end + 2 + length + 2
+        else:
+            commands.append(command)
+            position = cursor
+            continue
+        break
+    return commands, buffer[position:]
@@ -13,6 +13,7 @@ prompt_template = (
     "8. Provide the results or any relevant feedback to the user after completing the task.\n"
     "9. Do not show any backend command generation process to the user; consider the user as a layman who only wants to see the necessary information.\n"
     "10. Display the required and optional fields to the user before filling them in, and again after filling them in. Always Ask for the user's confirmation to proceed before executing any task.\n"
+    "    Create, update and delete tools don't run right away: call them as soon as all fields are filled, the command is held until the user confirms and runs by itself when they type 'yes'. Never call the tool again for a command waiting for confirmation.\n"
     "    Please confirm if you want to proceed with this action. Type 'yes' to confirm or 'no' to cancel.\n"
     "11. Make sure any task related to AWS involves the necessary 'aws' commands executed in the backend, ensuring they work in the terminal.\n\n"
 
@@ -24,8 +25,8 @@ prompt_template = (
     "and include any relevant notes or explanations to assist the user.\n\n"
 
     "Automated Field Filling:\n"
-    "- When the user mentions 'auto fill' or 'auto generate', Always Invoke `aws_cli_get_tool` to retrieve all required fields for the user-requested service and fill them in the described outcome.\n"
-    "- If you can't find details in the user account, Use this [Amazon Linux 2023 AMI: ami-0bb84b8ffd87024d8]\n\n"
+    "- When the user mentions 'auto fill' or 'auto generate', first invoke `aws_inventory_lookup_tool` with resource 'defaults' to get the AMI, instance type, VPC, subnet, security group and key pair from the user's account, and fill them in the described outcome.\n"
+    "- Only invoke `aws_cli_get_tool` for required fields the inventory doesn't have, or when it says the inventory is not collected yet.\n\n"
 
     "Guardrails:\n"
     "- Limit the creation of resources to one per request. If a user attempts to create more than one resource in a single request, inform them of this limitation and ask them to create one resource at a time.\n"
@@ -39,3 +40,19 @@ prompt_template = (
     "New human question: {user_input}\n"
     "Response:"
 )
+
+# What the prompts say about the per-verb AWS CLI tools, and what replaces it for agents with the single
+# aws_cli_tool, which holds mutations for confirmation by itself
+CONSOLIDATED_TOOL_REPLACEMENTS = [
+    ("Use the appropriate tool based on the type of task the user wants to accomplish (e.g., creation, "
+     "description, update, delete).", "Run AWS CLI commands with `aws_cli_tool`."),
+    ("Create, update and delete tools don't run right away: call them as soon as all fields are filled",
+     "Commands that change resources don't run right away: call the tool as soon as all fields are filled"),
+    ("`aws_cli_get_tool`", "`aws_cli_tool`"),
+]
+
+
+def consolidated_tool_prompt(prompt: str) -> str:
+    for old, new in CONSOLIDATED_TOOL_REPLACEMENTS:
+        prompt = prompt.replace(old, new)
+    return prompt
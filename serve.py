@@ -1,29 +1,96 @@
+import json
+import logging
 import os
-import subprocess
-import time
-import boto3
 from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import traceback
 
-from agents.aws_agent import AWSCLIHelperAgent
-from agents.aws_claude_agent import AWSCLIHelperAgent as AWSCLIHelperAgentClaude
+from agents.clients import clients
+from services import (AgentRegistry, CredentialBroker, LatencyBudgetMiddleware, ModelRouter, SessionStore, SLOTracker,
+                      TracingMiddleware, open_state_backend, parse_budgets)
+from tools import SchedulerOverloaded, execution_context, inventory, response_cache, scheduler, single_flight
+from tools.telemetry import metrics, span
 
 STS_TOKEN_TIME_LIMIT = int(os.environ.get("STS_TOKEN_TIME_LIMIT") or 3600)
 print(f"STS_TOKEN_TIME_LIMIT: {STS_TOKEN_TIME_LIMIT}")
-
-aws_agent = AWSCLIHelperAgent()
-aws_claude_sonnet_agent = AWSCLIHelperAgentClaude(
-    model_id="anthropic.claude-3-5-sonnet-20240620-v1:0"
+SESSION_MAX_COUNT = int(os.environ.get("SESSION_MAX_COUNT") or 1000)
+SESSION_IDLE_TTL = int(os.environ.get("SESSION_IDLE_TTL") or 3600)
+# Credentials are refreshed in the background this many seconds before they expire
+STS_REFRESH_MARGIN = int(os.environ.get("STS_REFRESH_MARGIN") or 300)
+# Agents are built in the background this many seconds after startup. Set AGENT_WARMUP=false to build on first use.
+AGENT_WARMUP = os.environ.get("AGENT_WARMUP", "true").lower() == "true"
+AGENT_WARMUP_DELAY = float(os.environ.get("AGENT_WARMUP_DELAY") or 1)
+# Answers to questions that needed no tool call are reused for similar questions when enabled
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "false").lower() == "true"
+# Models used by /get-response/auto for simple turns and for turns that need a stronger model
+ROUTER_SIMPLE_MODEL = os.environ.get("ROUTER_SIMPLE_MODEL") or "claude-haiku"
+ROUTER_ESCALATION_MODEL = os.environ.get("ROUTER_ESCALATION_MODEL") or "claude-sonnet"
+# Requests are traced and timed for /metrics. TRACE_LOG=true also logs every trace as a JSON line to stderr.
+TRACING = os.environ.get("TRACING", "true").lower() == "true"
+TRACE_LOG = os.environ.get("TRACE_LOG", "false").lower() == "true"
+# Chat histories and who is configured are shared by every replica using the same backend:
+# sqlite:////path/state.db for replicas on one host or redis://[:password@]host:6379/0. Unset keeps them in memory.
+STATE_BACKEND_URL = os.environ.get("STATE_BACKEND_URL") or None
+# Largest number of questions accepted by /get-response/batch
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES") or 500)
+# Latency budget of every endpoint as "path=seconds[:max agent iterations],...". The agent stops early enough to
+# answer from the results it has within the budget, and the outcomes are reported by /slo/stats.
+LATENCY_BUDGETS = parse_budgets(os.environ.get("LATENCY_BUDGETS") or (
+    "/get-response=30:6,/get-response/claude-sonnet=30:6,/get-response/claude-haiku=15:4,"
+    "/get-response/auto=30:6,/get-response/stream=45:6"))
+
+
+def shared_answer_cache():
+    # Imported on first use like the agents, NumPy isn't needed to start the server
+    from agents.answer_cache import answer_cache
+
+    return answer_cache
+
+
+def build_gpt_agent():
+    from agents.aws_agent import AWSCLIHelperAgent
+
+    return AWSCLIHelperAgent(answer_cache=shared_answer_cache() if ANSWER_CACHE else None)
+
+
+def build_claude_agent(model_id: str):
+    from agents.aws_claude_agent import AWSCLIHelperAgent as AWSCLIHelperAgentClaude
+
+    return AWSCLIHelperAgentClaude(model_id=model_id, answer_cache=shared_answer_cache() if ANSWER_CACHE else None)
+
+
+# The agents are shared by every user; only the chat histories are kept per (email, model) session.
+# They are built on first use, so importing this module doesn't load the model backends.
+agents = AgentRegistry()
+agents.register("gpt-4o", build_gpt_agent)
+agents.register("claude-sonnet", lambda: build_claude_agent("anthropic.claude-3-5-sonnet-20240620-v1:0"))
+agents.register("claude-haiku", lambda: build_claude_agent("anthropic.claude-3-haiku-20240307-v1:0"))
+
+state_backend = open_state_backend(STATE_BACKEND_URL) if STATE_BACKEND_URL else None
+
+slo = SLOTracker(LATENCY_BUDGETS)
+
+router = ModelRouter(agents, simple_model=ROUTER_SIMPLE_MODEL, escalation_model=ROUTER_ESCALATION_MODEL)
+
+sessions = SessionStore(
+    lambda key: router.new_history() if key[1] == "auto" else agents.get(key[1]).new_history(),
+    max_sessions=SESSION_MAX_COUNT,
+    ttl=SESSION_IDLE_TTL,
+    backend=state_backend,
 )
-aws_claude_haiku_agent = AWSCLIHelperAgentClaude(
-    model_id="anthropic.claude-3-haiku-20240307-v1:0"
+
+broker = CredentialBroker(
+    duration=STS_TOKEN_TIME_LIMIT,
+    refresh_margin=STS_REFRESH_MARGIN,
+    idle_ttl=SESSION_IDLE_TTL,
+    region="us-east-1",
+    backend=state_backend,
 )
-app = FastAPI()
 
-credentials = {}
+app = FastAPI()
 
 origins = ["http://localhost:5173", "https://hiaido.com"]
 
@@ -35,91 +102,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(LatencyBudgetMiddleware, budgets=LATENCY_BUDGETS, tracker=slo)
 
-def get_credentials_from_db(id: str, owner: str):
-    """
-    Retrieves credentials associated with the provided email from DynamoDB.
-    """
-    # id is just unique identifier for the user
-    # can be email for member accounts or uuid for connected accounts
-    session = boto3.Session(
-        aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.environ.get("AWS_REGION"),
-    )
-    dynamodb = session.resource("dynamodb")
-    if len(id) == 36:
-        table = dynamodb.Table("connected-aws-accounts")
-        response = table.get_item(Key={"externalId": id, "owner": owner})
-        if "Item" in response:
-            sts_client = boto3.client("sts")
-            assumed_role = sts_client.assume_role(
-                RoleArn=response["Item"]["role_arn"],
-                RoleSessionName="AssumeroleSession",
-                DurationSeconds=STS_TOKEN_TIME_LIMIT,
-                ExternalId=id,
-            )
-            assumed_role["Credentials"]["timestamp"] = time.time()
-            return assumed_role["Credentials"]
-    else:
-        table = dynamodb.Table("account-factory-test")
-        response = table.get_item(Key={"email": id, "owner": owner})
-        if "Item" in response:
-            sts_client = boto3.client("sts")
-            assumed_role = sts_client.assume_role(
-                RoleArn=response["Item"]["role_arn"],
-                RoleSessionName="AssumeroleSession",
-                DurationSeconds=STS_TOKEN_TIME_LIMIT,
-            )
-            assumed_role["Credentials"]["timestamp"] = time.time()
-            return assumed_role["Credentials"]
-    return None
-
-
-def configure_aws_cli(
-    aws_access_key_id, aws_secret_access_key, session_token, region, profile
-):
-    subprocess.run(
-        [
-            "aws",
-            "configure",
-            "set",
-            "aws_access_key_id",
-            aws_access_key_id,
-            "--profile",
-            profile,
-        ],
-        check=True,
-    )
-    subprocess.run(
-        [
-            "aws",
-            "configure",
-            "set",
-            "aws_secret_access_key",
-            aws_secret_access_key,
-            "--profile",
-            profile,
-        ],
-        check=True,
-    )
-    subprocess.run(
-        [
-            "aws",
-            "configure",
-            "set",
-            "aws_session_token",
-            session_token,
-            "--profile",
-            profile,
-        ],
-        check=True,
-    )
-    subprocess.run(
-        ["aws", "configure", "set", "region", region, "--profile", profile], check=True
-    )
-
-    subprocess.run(["aws", "configure", "list", "--profile", profile], check=True)
+if TRACING:
+    app.add_middleware(TracingMiddleware)
+if TRACE_LOG:
+    logging.getLogger("aws_assistant.trace").setLevel(logging.INFO)
+    logging.getLogger("aws_assistant.trace").addHandler(logging.StreamHandler())
 
 
 class Query(BaseModel):
@@ -148,26 +137,183 @@ async def health(request: Request):
     return JSONResponse({"healthy": True})
 
 
-def credentials_expired(email):
-    if not credentials.get(email):
-        return True
-    else:
-        current_timestamp = time.time()
-        # print(
-        #     "HERE: ",
-        #     current_timestamp
-        #     < credentials.get(email)["timestamp"] + STS_TOKEN_TIME_LIMIT - 800,
-        # )
-        # print(
-        #     f"Time left: {credentials.get(email)['timestamp'] + STS_TOKEN_TIME_LIMIT -800- time.time()}"
-        # )
-        if (
-            current_timestamp
-            < credentials.get(email)["timestamp"] + STS_TOKEN_TIME_LIMIT - 180
-        ):
-            return False
-        else:
-            return True
+@app.get(
+    "/metrics",
+    summary="Prometheus metrics",
+    description="Returns request, agent, model, tool and AWS CLI latency histograms in the Prometheus text format.",
+)
+async def prometheus_metrics(request: Request):
+    """
+    Returns request, agent, model, tool and AWS CLI latency histograms in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(
+    "/sessions/stats",
+    summary="Session store statistics",
+    description="Returns size, hit, miss and eviction counters of the per-user session store.",
+)
+async def session_stats(request: Request):
+    """
+    Returns size, hit, miss and eviction counters of the per-user session store.
+    """
+    return JSONResponse(sessions.stats())
+
+
+@app.get(
+    "/state/stats",
+    summary="State backend statistics",
+    description="Returns reads, writes, round-trips and queued writes of the shared state backend.",
+)
+async def state_stats(request: Request):
+    """
+    Returns reads, writes, round-trips and queued writes of the shared state backend.
+    """
+    return JSONResponse(state_backend.stats() if state_backend is not None else {"backend": None})
+
+
+@app.get(
+    "/cache/stats",
+    summary="AWS response cache statistics",
+    description="Returns hit rate, saved AWS calls and saved seconds of the read-only tool response cache, and how "
+                "many identical reads in flight at the same time were coalesced.",
+)
+async def cache_stats(request: Request):
+    """
+    Returns hit rate, saved AWS calls and saved seconds of the read-only tool response cache, and how many
+    identical reads in flight at the same time were coalesced.
+    """
+    return JSONResponse({**response_cache.stats(), **single_flight.stats()})
+
+
+@app.get(
+    "/answers/cache/stats",
+    summary="Semantic answer cache statistics",
+    description="Returns hit ratio and saved seconds of the cache of answers that needed no tool call.",
+)
+async def answer_cache_stats(request: Request):
+    """
+    Returns hit ratio and saved seconds of the cache of answers that needed no tool call.
+    """
+    return JSONResponse({"enabled": ANSWER_CACHE, **shared_answer_cache().stats()})
+
+
+@app.get(
+    "/scheduler/stats",
+    summary="AWS command scheduler statistics",
+    description="Returns running and queued commands, rejections, queue wait and execution times.",
+)
+async def scheduler_stats(request: Request):
+    """
+    Returns running and queued commands, rejections, queue wait and execution times.
+    """
+    return JSONResponse(scheduler.stats())
+
+
+@app.get(
+    "/bedrock/cache/stats",
+    summary="Bedrock prompt cache statistics",
+    description="Returns cached and uncached input tokens and time to first token of the Claude agents.",
+)
+async def bedrock_cache_stats(request: Request):
+    """
+    Returns cached and uncached input tokens and time to first token of the Claude agents.
+    """
+    stats = {}
+    for model in ("claude-sonnet", "claude-haiku"):
+        agent = agents.peek(model)
+        stats[model] = agent.cache_stats.as_dict() if agent is not None else None
+    return JSONResponse(stats)
+
+
+@app.get(
+    "/router/stats",
+    summary="Model router statistics",
+    description="Returns turns, escalations, latency percentiles, tokens and cost per model and per route.",
+)
+async def router_stats(request: Request):
+    """
+    Returns turns, escalations, latency percentiles, tokens and cost per model and per route.
+    """
+    return JSONResponse(router.stats())
+
+
+@app.get(
+    "/slo/stats",
+    summary="Latency SLO statistics",
+    description="Returns the latency budget, SLO compliance, partial answers and latency percentiles per endpoint.",
+)
+async def slo_stats(request: Request):
+    """
+    Returns the latency budget, SLO compliance, partial answers and latency percentiles per endpoint.
+    """
+    return JSONResponse(slo.stats())
+
+
+@app.get(
+    "/agents/stats",
+    summary="Agent registry statistics",
+    description="Returns which agents are built and how long each build took.",
+)
+async def agent_stats(request: Request):
+    """
+    Returns which agents are built and how long each build took.
+    """
+    return JSONResponse(agents.stats())
+
+
+@app.get(
+    "/inventory/stats",
+    summary="Inventory statistics",
+    description="Returns how many profiles have a prefetched inventory and how long collecting it takes.",
+)
+async def inventory_stats(request: Request):
+    """
+    Returns how many profiles have a prefetched inventory and how long collecting it takes.
+    """
+    return JSONResponse(inventory.stats())
+
+
+@app.get(
+    "/clients/stats",
+    summary="Model backend client statistics",
+    description="Returns the connection pool, retry and HTTP/2 settings of the shared OpenAI and Bedrock clients.",
+)
+async def client_stats(request: Request):
+    """
+    Returns the connection pool, retry and HTTP/2 settings of the shared OpenAI and Bedrock clients.
+    """
+    return JSONResponse(clients.stats())
+
+
+@app.on_event("startup")
+async def start_credential_refresh():
+    broker.start()
+
+
+@app.on_event("startup")
+async def start_inventory_refresh():
+    inventory.start()
+
+
+@app.on_event("startup")
+async def start_agent_warmup():
+    # Runs on a thread after the delay, so uvicorn starts answering /health without waiting for the agents
+    if AGENT_WARMUP:
+        agents.start_warmup(delay=AGENT_WARMUP_DELAY)
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    await clients.aclose()
+
+
+@app.on_event("shutdown")
+async def close_state_backend():
+    # Writes the histories of the last turns before the process exits
+    if state_backend is not None:
+        await run_in_threadpool(state_backend.close)
 
 
 # TODO authenticate user
@@ -185,30 +331,18 @@ async def configure_cli(request: Request):
         email = data.get("email")
         owner = data.get("owner")
 
-        global credentials
-        # print(credentials)
-
         if not email:
             raise HTTPException(status_code=400, detail="email parameter is required")
         if not owner:
             raise HTTPException(status_code=400, detail="owner parameter is required")
-        if credentials.get(email) and not credentials_expired(email):
+        if not await run_in_threadpool(broker.configure, email, owner):
+            inventory.track(email, lambda: broker.execution_context(email))
             return JSONResponse({"status": "CLI_ALREADY_CONFIGURED"})
-        credentials[email] = get_credentials_from_db(email, owner)
-        if credentials[email] is None:
+        if not await run_in_threadpool(broker.is_configured, email):
             raise HTTPException(status_code=400, detail="Failed to generate session.")
-        if credentials.get(email):
-            access_key_id = credentials[email]["AccessKeyId"]
-            secret_access_key = credentials[email]["SecretAccessKey"]
-            session_token = credentials[email]["SessionToken"]
-            configure_aws_cli(
-                access_key_id,
-                secret_access_key,
-                session_token,
-                "us-east-1",
-                email,
-            )
-            return JSONResponse({"status": "CLI configured successfully"})
+        # Collects the user's VPCs, subnets, key pairs, ... in the background for auto-fill
+        inventory.track(email, lambda: broker.execution_context(email))
+        return JSONResponse({"status": "CLI configured successfully"})
     except Exception as e:
         print(traceback.print_exc())
         raise HTTPException(status_code=500, detail=str(e))
@@ -218,25 +352,24 @@ async def check_cli_configured(request: Request):
     """
     Checks if CLI is configured before accessing certain endpoints.
     """
-    data = await request.json()
+    with span("request.parse"):
+        data = await request.json()
     email = data.get("email")
     if not email:
         raise HTTPException(status_code=400, detail="User email required.")
-    if not credentials.get(email):
-        raise HTTPException(
-            status_code=400,
-            detail="CLI not configured. Please configure the CLI before accessing this endpoint.",
-        )
-    expired = credentials_expired(email)
-    if expired:
-        print("CREDENTIALS EXPIRED")
-        raise HTTPException(
-            status_code=400,
-            detail="Session expired. CLI not configured. Please configure the CLI before accessing this endpoint.",
-        )
-    # print(
-    #     f"Time left: {credentials.get(email)['timestamp'] + STS_TOKEN_TIME_LIMIT -800- time.time()}"
-    # )
+    with span("credentials.check"):
+        if not await run_in_threadpool(broker.is_configured, email):
+            raise HTTPException(
+                status_code=400,
+                detail="CLI not configured. Please configure the CLI before accessing this endpoint.",
+            )
+        # Refreshes inline if the background refresh fell behind instead of rejecting the request
+        if await run_in_threadpool(broker.get, email) is None:
+            print("CREDENTIALS EXPIRED")
+            raise HTTPException(
+                status_code=400,
+                detail="Session expired. CLI not configured. Please configure the CLI before accessing this endpoint.",
+            )
     return True
 
 
@@ -260,11 +393,15 @@ async def get_sonnet_response(request: Request):
         if not user_email:
             raise HTTPException(status_code=400, detail="User email is required")
 
-        # TODO IMPORTANT!!!: use some other method to set current profile
-        os.environ["CURRENT_PROFILE"] = user_email
-        response = aws_claude_sonnet_agent.ask_question(user_question)
+        agent = await agents.aget("claude-sonnet")
+        history = await sessions.aget((user_email, "claude-sonnet"))
+        context = await run_in_threadpool(broker.execution_context, user_email)
+        with execution_context(context):
+            response = await agent.ask_question_async(user_question, history)
         return JSONResponse({"response": response})
 
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -289,11 +426,15 @@ async def get_sonnet_response(request: Request):
         if not user_email:
             raise HTTPException(status_code=400, detail="User email is required")
 
-        # TODO IMPORTANT!!!: use some other method to set current profile
-        os.environ["CURRENT_PROFILE"] = user_email
-        response = aws_claude_haiku_agent.ask_question(user_question)
+        agent = await agents.aget("claude-haiku")
+        history = await sessions.aget((user_email, "claude-haiku"))
+        context = await run_in_threadpool(broker.execution_context, user_email)
+        with execution_context(context):
+            response = await agent.ask_question_async(user_question, history)
         return JSONResponse({"response": response})
 
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -318,14 +459,154 @@ async def get_response(request: Request):
         if not user_email:
             raise HTTPException(status_code=400, detail="User email is required")
 
-        # TODO IMPORTANT!!!: use some other method to set current profile
-        os.environ["CURRENT_PROFILE"] = user_email
-        response = aws_agent.ask_question(user_question)
+        agent = await agents.aget("gpt-4o")
+        history = await sessions.aget((user_email, "gpt-4o"))
+        context = await run_in_threadpool(broker.execution_context, user_email)
+        with execution_context(context):
+            response = await agent.ask_question_async(user_question, history)
         return JSONResponse({"response": response})
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/get-response/auto",
+    summary="Get response from the routed model",
+    description="Processes a user query with the model the router picks for it and returns the response.",
+    dependencies=[Depends(check_cli_configured)],
+)
+async def get_auto_response(request: Request):
+    """
+    Processes a user query with the model the router picks for it. Simple lookups and confirmations go to the
+    small model, mutations and open-ended questions, tool errors and unsure answers to the stronger one.
+    """
+    try:
+        data = await request.json()
+        user_question = data.get("query")
+        user_email = data.get("email")
+        if not user_question:
+            raise HTTPException(status_code=400, detail="Query parameter is required")
+        if not user_email:
+            raise HTTPException(status_code=400, detail="User email is required")
+
+        # Built first so creating the session's history doesn't block the event loop
+        await agents.aget(ROUTER_SIMPLE_MODEL)
+        history = await sessions.aget((user_email, "auto"))
+        context = await run_in_threadpool(broker.execution_context, user_email)
+        with execution_context(context):
+            result = await router.ask(user_question, history)
+        return JSONResponse(result)
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/get-response/batch",
+    summary="Batch of responses",
+    description="Processes many independent queries concurrently and streams their responses as NDJSON.",
+)
+async def batch_response(request: Request):
+    """
+    Processes many independent queries, each with the email of its own configured CLI profile, and streams one
+    JSON line per query as soon as it is answered: {"index", "email", "response", "pending_action"} or
+    {"index", "email", "error"}. The optional `model` field picks the agent (gpt-4o, claude-sonnet or
+    claude-haiku) and `max_concurrency` how many queries run at the same time, at most BATCH_MAX_CONCURRENCY.
+    """
+    data = await request.json()
+    queries = data.get("queries")
+    model = data.get("model") or "gpt-4o"
+    if not queries or not isinstance(queries, list):
+        raise HTTPException(status_code=400, detail="queries parameter is required")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    if model not in agents:
+        raise HTTPException(status_code=400, detail=f"Unknown model. Choose one of {', '.join(agents)}")
+    # Checked before the response starts, the stream can't report a bad request anymore
+    max_concurrency = data.get("max_concurrency")
+    if max_concurrency is not None:
+        try:
+            max_concurrency = int(max_concurrency)
+        except (TypeError, ValueError):
+            max_concurrency = 0
+        if max_concurrency < 1:
+            raise HTTPException(status_code=400, detail="max_concurrency must be a positive integer")
+
+    agent = await agents.aget(model)
+    # Every profile is resolved once; queries of unconfigured or expired profiles fail on their own
+    contexts, errors = {}, {}
+    for email in {item.get("email") for item in queries if isinstance(item, dict)}:
+        if not email or not await run_in_threadpool(broker.is_configured, email):
+            errors[email] = "CLI not configured. Please configure the CLI before accessing this endpoint."
+        elif await run_in_threadpool(broker.get, email) is None:
+            errors[email] = ("Session expired. CLI not configured. "
+                             "Please configure the CLI before accessing this endpoint.")
+        else:
+            contexts[email] = await run_in_threadpool(broker.execution_context, email)
+
+    runnable, failed = [], []
+    for index, item in enumerate(queries):
+        email = item.get("email") if isinstance(item, dict) else None
+        if not isinstance(item, dict) or not item.get("query"):
+            failed.append({"index": index, "email": email, "error": "Query parameter is required"})
+        elif email in errors:
+            failed.append({"index": index, "email": email, "error": errors[email]})
+        else:
+            runnable.append((index, {"query": item["query"], "context": contexts[email]}))
+
+    async def lines():
+        for result in failed:
+            yield json.dumps(result) + "\n"
+        kwargs = {"max_concurrency": max_concurrency} if max_concurrency else {}
+        async for result in agent.batch_ask([item for _, item in runnable], **kwargs):
+            result["index"] = index = runnable[result["index"]][0]
+            yield json.dumps({"index": index, "email": queries[index]["email"], **result}, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post(
+    "/get-response/stream",
+    summary="Stream response",
+    description="Processes a user query and streams tokens and tool progress as Server-Sent Events.",
+    dependencies=[Depends(check_cli_configured)],
+)
+async def stream_response(request: Request):
+    """
+    Processes a user query and streams tokens and tool progress as Server-Sent Events.
+    The optional `model` field picks the agent (gpt-4o, claude-sonnet or claude-haiku).
+    """
+    data = await request.json()
+    user_question = data.get("query")
+    user_email = data.get("email")
+    model = data.get("model") or "gpt-4o"
+    if not user_question:
+        raise HTTPException(status_code=400, detail="Query parameter is required")
+    if not user_email:
+        raise HTTPException(status_code=400, detail="User email is required")
+    if model not in agents:
+        raise HTTPException(status_code=400, detail=f"Unknown model. Choose one of {', '.join(agents)}")
+
+    agent = await agents.aget(model)
+    history = await sessions.aget((user_email, model))
+    context = await run_in_threadpool(broker.execution_context, user_email)
+
+    async def events():
+        # The context is bound inside the generator because the body is sent after the handler returns
+        with execution_context(context):
+            try:
+                async for event in agent.astream(user_question, history):
+                    yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+            except Exception as e:
+                traceback.print_exc()
+                yield f"event: error\ndata: {json.dumps({'event': 'error', 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,11 @@
+from services.agent_registry import AgentRegistry
+from services.credential_broker import CredentialBroker
+from services.latency_budget import LatencyBudget, LatencyBudgetMiddleware, SLOTracker, parse_budgets
+from services.model_router import ModelRouter
+from services.session_store import SessionStore
+from services.state_backend import RedisStateBackend, SQLiteStateBackend, StateBackend, open_state_backend
+from services.tracing import TracingMiddleware
+
+__all__ = ["AgentRegistry", "CredentialBroker", "LatencyBudget", "LatencyBudgetMiddleware", "ModelRouter",
+           "RedisStateBackend", "SessionStore", "SLOTracker", "SQLiteStateBackend", "StateBackend",
+           "TracingMiddleware", "open_state_backend", "parse_budgets"]
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+class AgentRegistry:
+    """
+    Builds agents on first use from registered factories.
+
+    Factories import their model backend themselves, so importing the server doesn't pull in langchain_openai,
+    langchain_aws or create any clients. `start_warmup` builds the remaining agents on a background thread
+    once the server is already answering health checks.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._warmer: Optional[threading.Thread] = None
+        self.build_seconds: Dict[str, float] = {}
+        self.build_failures = 0
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._build_locks[name] = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the agent registered as `name`, building it first if needed. Raises KeyError for unknown names.
+        """
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        factory = self._factories[name]
+        # One lock per agent: concurrent first requests wait for a single build
+        with self._build_locks[name]:
+            agent = self._agents.get(name)
+            if agent is None:
+                start = time.perf_counter()
+                try:
+                    agent = factory()
+                except Exception:
+                    self.build_failures += 1
+                    raise
+                self.build_seconds[name] = round(time.perf_counter() - start, 3)
+                with self._lock:
+                    self._agents[name] = agent
+        return agent
+
+    async def aget(self, name: str) -> Any:
+        """
+        Async variant of get. Builds on a worker thread so a cold agent doesn't block the event loop.
+        """
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+
+    def peek(self, name: str) -> Optional[Any]:
+        """
+        Returns the agent only if it was already built.
+        """
+        return self._agents.get(name)
+
+    def warm(self, names: Optional[Iterable[str]] = None):
+        for name in list(names or self._factories):
+            try:
+                self.get(name)
+            except Exception:
+                traceback.print_exc()
+
+    def start_warmup(self, delay: float = 0, names: Optional[Iterable[str]] = None):
+        """
+        Builds the agents on a daemon thread after `delay` seconds. Requests for an agent that is still
+        being built wait for that build instead of starting another one.
+        """
+        if self._warmer is not None:
+            return
+        names = list(names or self._factories)
+
+        def run():
+            time.sleep(delay)
+            self.warm(names)
+
+        self._warmer = threading.Thread(target=run, daemon=True, name="agent-warmup")
+        self._warmer.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "registered": list(self._factories),
+            "ready": [name for name in self._factories if name in self._agents],
+            "build_seconds": dict(self.build_seconds),
+            "build_failures": self.build_failures,
+        }
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+import boto3
+
+from services.state_backend import StateBackend
+from tools import ExecutionContext
+
+
+class CredentialBroker:
+    """
+    Caches assumed-role credentials per user in memory and refreshes them before they expire.
+
+    Credentials never touch ~/.aws: tools receive them through an ExecutionContext. The DynamoDB tables
+    and the STS client are created once and shared by every lookup.
+
+    With a `backend` the replicas share who is configured with which owner, never the credentials
+    themselves. A replica that gets a request for a user configured on another one assumes the role itself.
+    """
+
+    def __init__(self, duration: int = 3600, refresh_margin: int = 300, idle_ttl: int = 3600,
+                 region: str = "us-east-1", session: Optional[boto3.Session] = None, dynamodb: Any = None,
+                 sts_client: Any = None, clock: Callable[[], float] = time.time,
+                 backend: Optional[StateBackend] = None):
+        self.duration = duration
+        self.refresh_margin = refresh_margin
+        self.idle_ttl = idle_ttl
+        self.region = region
+        self.clock = clock
+        self._session = session
+        self._dynamodb = dynamodb
+        self._sts_client = sts_client
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        # id -> {"owner": ..., "credentials": ..., "expires_at": ..., "last_used": ...}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.assume_role_calls = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    @property
+    def session(self) -> boto3.Session:
+        if self._session is None:
+            self._session = boto3.Session(
+                aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+                region_name=os.environ.get("AWS_REGION"),
+            )
+        return self._session
+
+    @property
+    def dynamodb(self):
+        if self._dynamodb is None:
+            self._dynamodb = self.session.resource("dynamodb")
+        return self._dynamodb
+
+    @property
+    def sts_client(self):
+        if self._sts_client is None:
+            self._sts_client = self.session.client("sts")
+        return self._sts_client
+
+    def fetch(self, id: str, owner: str) -> Optional[Dict]:
+        """
+        Retrieves the role associated with the provided id from DynamoDB and assumes it.
+        """
+        # id is just unique identifier for the user
+        # can be email for member accounts or uuid for connected accounts
+        if len(id) == 36:
+            response = self.dynamodb.Table("connected-aws-accounts").get_item(Key={"externalId": id, "owner": owner})
+            extra = {"ExternalId": id}
+        else:
+            response = self.dynamodb.Table("account-factory-test").get_item(Key={"email": id, "owner": owner})
+            extra = {}
+        if "Item" not in response:
+            return None
+        self.assume_role_calls += 1
+        assumed_role = self.sts_client.assume_role(
+            RoleArn=response["Item"]["role_arn"],
+            RoleSessionName="AssumeroleSession",
+            DurationSeconds=self.duration,
+            **extra,
+        )
+        assumed_role["Credentials"]["timestamp"] = self.clock()
+        return assumed_role["Credentials"]
+
+    def configure(self, id: str, owner: str) -> bool:
+        """
+        Makes sure valid credentials are cached for `id`. Returns False when they were already cached.
+        """
+        with self._key_lock(id):
+            if self._fresh(id):
+                return False
+            self._store(id, owner, self.fetch(id, owner), self.clock())
+            return True
+
+    def is_configured(self, id: str) -> bool:
+        if id in self._entries:
+            return True
+        return self.backend is not None and self.backend.get(self._state_key(id)) is not None
+
+    def get(self, id: str) -> Optional[Dict]:
+        """
+        Returns valid credentials for `id`, refreshing them inline if the background refresh fell behind.
+        """
+        entry = self._entries.get(id)
+        if entry is None and self._adopt(id):
+            entry = self._entries.get(id)
+        if entry is None:
+            return None
+        entry["last_used"] = self.clock()
+        if entry["expires_at"] - self.refresh_margin <= self.clock():
+            try:
+                self.refresh(id)
+            except Exception:
+                traceback.print_exc()
+            entry = self._entries.get(id)
+            if entry is None or entry["expires_at"] <= self.clock():
+                return None
+        return entry["credentials"]
+
+    def refresh(self, id: str):
+        entry = self._entries.get(id)
+        if entry is None:
+            return
+        with self._key_lock(id):
+            if self._fresh(id):
+                return
+            try:
+                credentials = self.fetch(id, entry["owner"])
+            except Exception:
+                self.refresh_failures += 1
+                raise
+            self._store(id, entry["owner"], credentials, entry["last_used"])
+            self.refreshes += 1
+
+    def execution_context(self, id: str) -> ExecutionContext:
+        return ExecutionContext(profile=id, region=self.region, credentials=self.get(id))
+
+    def start(self, interval: float = 30):
+        """
+        Starts the background thread that refreshes credentials `refresh_margin` seconds before expiry.
+        Users idle for longer than `idle_ttl` are not refreshed and are forgotten once their credentials expire.
+        """
+        if self._refresher is not None:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,), daemon=True,
+                                           name="credential-broker")
+        self._refresher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "assume_role_calls": self.assume_role_calls,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+    def _refresh_loop(self, interval: float):
+        while not self._stopped.wait(interval):
+            now = self.clock()
+            for id, entry in list(self._entries.items()):
+                if entry["expires_at"] - self.refresh_margin > now:
+                    continue
+                if now - entry["last_used"] > self.idle_ttl:
+                    if entry["expires_at"] <= now:
+                        self._entries.pop(id, None)
+                else:
+                    try:
+                        self.refresh(id)
+                    except Exception:
+                        traceback.print_exc()
+
+    def _fresh(self, id: str) -> bool:
+        entry = self._entries.get(id)
+        return entry is not None and self.clock() < entry["expires_at"] - self.refresh_margin
+
+    def _store(self, id: str, owner: str, credentials: Optional[Dict], last_used: float):
+        if credentials is None:
+            self._entries.pop(id, None)
+            if self.backend is not None:
+                self.backend.delete(self._state_key(id))
+            return
+        expiration = credentials.get("Expiration")
+        expires_at = expiration.timestamp() if hasattr(expiration, "timestamp") else \
+            credentials["timestamp"] + self.duration
+        self._entries[id] = {"owner": owner, "credentials": credentials, "expires_at": expires_at,
+                             "last_used": last_used}
+        if self.backend is not None:
+            self.backend.put(self._state_key(id), {"owner": owner, "expires_at": expires_at}, self.idle_ttl)
+
+    def _adopt(self, id: str) -> bool:
+        """
+        Configures a user that another replica configured, with the owner it stored. Returns False when no
+        replica did.
+        """
+        if self.backend is None:
+            return False
+        metadata = self.backend.get(self._state_key(id))
+        if metadata is None:
+            return False
+        self.configure(id, metadata["owner"])
+        return id in self._entries
+
+    @staticmethod
+    def _state_key(id: str) -> str:
+        return f"credentials:{id}"
+
+    def _key_lock(self, id: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(id, threading.Lock())
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional
+
+from agents.budget import TurnBudget, turn_budget
+from tools.telemetry import metrics
+
+SLO_REQUESTS = metrics.counter("aws_assistant_slo_requests_total",
+                               "Budgeted requests by route and outcome: met, partial, missed or error",
+                               ["route", "outcome"])
+
+
+class LatencyBudget(NamedTuple):
+    seconds: float
+    max_iterations: Optional[int] = None
+
+
+def parse_budgets(spec: str) -> Dict[str, LatencyBudget]:
+    """
+    Parses "path=seconds[:iterations],..." into the budget of every path, e.g.
+    "/get-response/claude-haiku=15:4,/get-response/claude-sonnet=30".
+    """
+    budgets = {}
+    for item in filter(None, (item.strip() for item in spec.split(","))):
+        path, _, value = item.partition("=")
+        seconds, _, iterations = value.partition(":")
+        budgets[path.strip()] = LatencyBudget(float(seconds), int(iterations) if iterations else None)
+    return budgets
+
+
+class _SLOStats:
+    def __init__(self, budget: LatencyBudget, window: int):
+        self.budget = budget
+        self.outcomes = {"met": 0, "partial": 0, "missed": 0, "error": 0}
+        self.exhausted: Dict[str, int] = {}
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def as_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        requests = sum(self.outcomes.values())
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else 0.0
+
+        return {
+            "budget_seconds": self.budget.seconds,
+            "max_iterations": self.budget.max_iterations,
+            "requests": requests,
+            **self.outcomes,
+            # Partial answers were given in time, they count towards the SLO
+            "compliance": round((self.outcomes["met"] + self.outcomes["partial"]) / requests, 4) if requests else None,
+            "budget_exhausted": dict(self.exhausted),
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
+
+
+class SLOTracker:
+    """
+    Outcome of the budgeted requests of every route, over all requests, and their latency over the last
+    `window`. A request met its SLO when it answered in time: "met" ones without running out of their budget,
+    "partial" ones from the results gathered before the budget ran out. Compliance is the share of both.
+    """
+
+    def __init__(self, budgets: Dict[str, LatencyBudget], window: int = 1000):
+        self._lock = threading.Lock()
+        self._routes = {path: _SLOStats(budget, window) for path, budget in budgets.items()}
+
+    def record(self, path: str, seconds: float, exhausted: Optional[str], failed: bool) -> str:
+        stats = self._routes[path]
+        if failed:
+            outcome = "error"
+        elif seconds > stats.budget.seconds:
+            outcome = "missed"
+        else:
+            outcome = "partial" if exhausted else "met"
+        with self._lock:
+            stats.outcomes[outcome] += 1
+            if exhausted:
+                stats.exhausted[exhausted] = stats.exhausted.get(exhausted, 0) + 1
+            stats.latencies.append(seconds)
+        SLO_REQUESTS.inc(route=path, outcome=outcome)
+        return outcome
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {path: stats.as_dict() for path, stats in self._routes.items()}
+
+
+class LatencyBudgetMiddleware:
+    """
+    ASGI middleware that runs the requests of the budgeted paths under their latency budget: the agent stops
+    early enough to give a partial answer in time and AWS commands are cut off at the budget's deadline. The
+    requests are timed until the last byte of the response and recorded in `tracker`.
+    """
+
+    def __init__(self, app: Callable, budgets: Dict[str, LatencyBudget], tracker: SLOTracker):
+        self.app = app
+        self.budgets = budgets
+        self.tracker = tracker
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        budget = self.budgets.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        status: Optional[int] = None
+
+        async def send_with_status(message: Dict[str, Any]):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        with turn_budget(TurnBudget(budget.seconds, budget.max_iterations)) as turn:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # Rejected requests don't count, except for overload
+                if status is None or status < 400 or status >= 500 or status == 429:
+                    self.tracker.record(scope["path"], time.perf_counter() - start, turn.exhausted,
+                                        status is None or status >= 400)
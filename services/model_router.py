@@ -0,0 +1,205 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from agents.tracing import token_usage
+from services.agent_registry import AgentRegistry
+
+# USD per million input and output tokens
+MODEL_PRICES = {
+    "claude-haiku": (0.25, 1.25),
+    "claude-sonnet": (3.0, 15.0),
+    "gpt-4o": (5.0, 15.0),
+}
+
+CONFIRMATION = re.compile(
+    r"^\s*(y|yes|yeah|yep|sure|ok|okay|confirm(ed)?|proceed|go ahead|do it|n|no|nope|cancel|abort|stop|don'?t)"
+    r"\b[\s.!]*$",
+    re.IGNORECASE,
+)
+MUTATING_WORDS = re.compile(
+    r"\b(create|delete|remove|terminate|update|modify|change|launch|start|stop|reboot|attach|detach|enable|"
+    r"disable|deploy|configure|set up|setup|add|revoke|authorize|resize|restore|rename|put)\b",
+    re.IGNORECASE,
+)
+COMPLEX_WORDS = re.compile(
+    r"\b(why|design|architecture|troubleshoot|debug|compare|migrate|optimi[sz]e|best practices?|secure|"
+    r"explain|step by step|auto ?fill|auto ?generate)\b",
+    re.IGNORECASE,
+)
+LOW_CONFIDENCE = re.compile(
+    r"(i'?m not sure|i am not sure|i don'?t know|i do not know|unable to (determine|find|complete)|"
+    r"agent stopped due to)",
+    re.IGNORECASE,
+)
+
+
+def _is_mutating(tool: Any, tool_input: Any) -> bool:
+    # The single aws_cli_tool tells by the command, the per-verb tools by their kind
+    if tool is None:
+        return False
+    command = tool_input.get("aws_cli_command", "") if isinstance(tool_input, dict) else str(tool_input)
+    is_mutating = getattr(tool, "is_mutating", None)
+    return is_mutating(command) if is_mutating is not None else getattr(tool, "mutating", False)
+
+
+class UsageCallback(BaseCallbackHandler):
+    """
+    Adds up the input and output tokens of every model call of one turn.
+    """
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        input_tokens, output_tokens = token_usage(response)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+
+class _RouteStats:
+    def __init__(self, window: int):
+        self.turns = 0
+        self.escalated = 0
+        self.budget_exhausted = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def as_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else 0.0
+
+        return {
+            "turns": self.turns,
+            "escalated": self.escalated,
+            "budget_exhausted": self.budget_exhausted,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the agent for each turn of the /get-response/auto endpoint.
+
+    Turns are classified with cheap heuristics: confirmations stay on the model that asked for them, lookups go
+    to `simple_model` and mutations, long or open-ended questions go to `escalation_model`. A turn answered by
+    the simple model is run again on the escalation model when one of its tools failed or the answer reads
+    as unsure, unless a mutating tool already succeeded or the turn ran out of its latency budget. Latency,
+    tokens and cost are kept per model and per route so the thresholds can be tuned.
+    """
+
+    def __init__(self, agents: AgentRegistry, simple_model: str = "claude-haiku",
+                 escalation_model: str = "claude-sonnet", max_simple_words: int = 40,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None, window: int = 1000):
+        self.agents = agents
+        self.simple_model = simple_model
+        self.escalation_model = escalation_model
+        self.max_simple_words = max_simple_words
+        self.prices = MODEL_PRICES if prices is None else prices
+        self.window = window
+        self._lock = threading.Lock()
+        self._models: Dict[str, _RouteStats] = {}
+        self._routes: Dict[str, _RouteStats] = {}
+        self.escalation_reasons: Dict[str, int] = {}
+
+    def classify(self, query: str, last_model: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Returns (route, model) for a turn.
+        """
+        if CONFIRMATION.match(query):
+            return "confirmation", last_model or self.simple_model
+        if len(query.split()) > self.max_simple_words or COMPLEX_WORDS.search(query):
+            return "complex", self.escalation_model
+        if MUTATING_WORDS.search(query):
+            return "mutation", self.escalation_model
+        return "simple", self.simple_model
+
+    def escalation_reason(self, turn: Dict) -> Optional[str]:
+        """
+        Why the answer of the simple model should not be trusted, or None.
+        """
+        if turn.get("budget_exhausted"):
+            # The partial answer is the best the request's budget allows, another model would run out too
+            return None
+        agent = self.agents.get(self.simple_model)
+        tools = {tool.name: tool for tool in agent.tools}
+        errors = 0
+        for tool, tool_input, output in turn["tool_outputs"]:
+            failed = isinstance(output, dict) and output.get("status") == "error"
+            if _is_mutating(tools.get(tool), tool_input) and not failed:
+                # The change already happened or waits for confirmation, running the turn again would repeat it
+                return None
+            errors += failed
+        if errors:
+            return "tool_error"
+        if not turn["output"].strip() or LOW_CONFIDENCE.search(turn["output"]):
+            return "low_confidence"
+        return None
+
+    async def ask(self, query: str, history: Any) -> Dict[str, Any]:
+        route, model = self.classify(query, history.last_model)
+        turn, elapsed = await self._run(route, model, query, history)
+        escalated = False
+        if model == self.simple_model and model != self.escalation_model:
+            reason = self.escalation_reason(turn)
+            if reason is not None:
+                with self._lock:
+                    self.escalation_reasons[reason] = self.escalation_reasons.get(reason, 0) + 1
+                    self._models[model].escalated += 1
+                    self._routes[route].escalated += 1
+                model = self.escalation_model
+                turn, more = await self._run(route, model, query, history)
+                elapsed += more
+                escalated = True
+        # Set first so the history is stored with it
+        history.last_model = model
+        history.add_turn(query, turn["output"], turn["tool_outputs"], turn["pending_action"])
+        return {"response": turn["output"], "model": model, "route": route, "escalated": escalated,
+                "seconds": round(elapsed, 3)}
+
+    async def _run(self, route: str, model: str, query: str, history: Any) -> Tuple[Dict, float]:
+        agent = await self.agents.aget(model)
+        usage = UsageCallback()
+        start = time.perf_counter()
+        turn = await agent.arun_turn(query, history, callbacks=[usage])
+        elapsed = time.perf_counter() - start
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        cost = (usage.input_tokens * input_price + usage.output_tokens * output_price) / 1_000_000
+        with self._lock:
+            for stats in (self._models.setdefault(model, _RouteStats(self.window)),
+                          self._routes.setdefault(route, _RouteStats(self.window))):
+                stats.turns += 1
+                stats.budget_exhausted += bool(turn.get("budget_exhausted"))
+                stats.latencies.append(elapsed)
+                stats.input_tokens += usage.input_tokens
+                stats.output_tokens += usage.output_tokens
+                stats.cost += cost
+        return turn, elapsed
+
+    def new_history(self):
+        return self.agents.get(self.simple_model).new_history()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "simple_model": self.simple_model,
+                "escalation_model": self.escalation_model,
+                "models": {name: stats.as_dict() for name, stats in self._models.items()},
+                "routes": {name: stats.as_dict() for name, stats in self._routes.items()},
+                "escalation_reasons": dict(self.escalation_reasons),
+            }
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from services.state_backend import StateBackend
+
+
+class SessionStore:
+    """
+    LRU store of per-session state with an idle TTL.
+
+    Sessions are created on first access by calling `factory` with the session key. The least recently used session is evicted once
+    `max_sessions` is reached, and sessions idle for longer than `ttl` seconds are dropped on access.
+
+    With a `backend` the sessions are shared by every replica using it. Every access reads the stored session
+    in one round-trip and replaces the local copy when the stored one has a higher version, and every change
+    of a session is written back. Sessions then need `version`, `as_dict()`, `restore(state)` and an
+    `on_change` callback attribute, like ChatHistory.
+    """
+
+    def __init__(self, factory: Callable[[Hashable], Any], max_sessions: int = 1000, ttl: float = 3600,
+                 clock: Callable[[], float] = time.monotonic, backend: Optional[StateBackend] = None):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.restores = 0
+
+    def get(self, key: Hashable) -> Any:
+        session = self._get_local(key)
+        if self.backend is not None:
+            state = self.backend.get(self._state_key(key))
+            if state is not None and state["version"] > session.version:
+                session.restore(state)
+                self.restores += 1
+        return session
+
+    async def aget(self, key: Hashable) -> Any:
+        """
+        Async variant of get. Reads the backend on a worker thread so it doesn't block the event loop.
+        """
+        if self.backend is None:
+            return self.get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    def _get_local(self, key: Hashable) -> Any:
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                self._sessions.move_to_end(key)
+                return entry[0]
+            self.misses += 1
+            session = self.factory(key)
+            if self.backend is not None:
+                session.on_change = partial(self._save, key)
+            self._sessions[key] = [session, now]
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return session
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._sessions.get(key)
+            return entry[0] if entry is not None else None
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._sessions.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(self._state_key(key))
+
+    def _save(self, key: Hashable, session: Any):
+        self.backend.put(self._state_key(key), session.as_dict(), self.ttl)
+
+    @staticmethod
+    def _state_key(key: Hashable) -> str:
+        return "session:" + (":".join(map(str, key)) if isinstance(key, tuple) else str(key))
+
+    def _expire(self, now: float):
+        # Entries are ordered by last access, so expired sessions are always at the front
+        while self._sessions:
+            key, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl:
+                break
+            del self._sessions[key]
+            self.expirations += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "restores": self.restores,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,322 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from queue import Empty, LifoQueue
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+
+class StateBackendError(Exception):
+    pass
+
+
+class StateBackend:
+    """
+    Key-value store of JSON documents with a TTL, shared by every replica of the server.
+
+    Reads go to the store, one round-trip for any number of keys. Writes are queued and sent by a background
+    thread, every queued write in one round-trip and only the latest document per key, so a turn only waits
+    for the read of its session. Reads of keys with a queued write are answered from the queue.
+
+    Subclasses implement `_read` and `_write`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # key -> (JSON document or None to delete it, ttl in seconds)
+        self._pending: Dict[str, Tuple[Optional[str], float]] = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+        self.reads = 0
+        self.writes = 0
+        self.read_round_trips = 0
+        self.write_round_trips = 0
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+        self.write_failures = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        with self._lock:
+            queued = {key: self._pending[key][0] for key in keys if key in self._pending}
+        missing = [key for key in keys if key not in queued]
+        values = dict(queued)
+        elapsed = 0.0
+        if missing:
+            start = time.perf_counter()
+            values.update(zip(missing, self._read(missing)))
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.read_seconds += elapsed
+            self.read_round_trips += 1 if missing else 0
+            self.reads += len(keys)
+        return [json.loads(values[key]) if values[key] is not None else None for key in keys]
+
+    def put(self, key: str, value: Dict[str, Any], ttl: float):
+        self._queue(key, json.dumps(value, default=str), ttl)
+
+    def delete(self, key: str):
+        self._queue(key, None, 0)
+
+    def flush(self):
+        """
+        Writes the queued documents now, in one round-trip.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception:
+                self.write_failures += 1
+                # Requeued unless a newer document of the same key was queued meanwhile
+                with self._lock:
+                    for key, item in batch.items():
+                        self._pending.setdefault(key, item)
+                raise
+            self.write_seconds += time.perf_counter() - start
+            self.write_round_trips += 1
+            self.writes += len(batch)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "reads": self.reads,
+            "writes": self.writes,
+            "queued_writes": len(self._pending),
+            "read_round_trips": self.read_round_trips,
+            "write_round_trips": self.write_round_trips,
+            "read_seconds": round(self.read_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "write_failures": self.write_failures,
+        }
+
+    def _queue(self, key: str, value: Optional[str], ttl: float):
+        with self._lock:
+            self._pending[key] = (value, ttl)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True, name="state-writer")
+                self._writer.start()
+        self._wakeup.set()
+
+    def _write_loop(self):
+        # Writes queued while a batch is on its way are coalesced into the next batch
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+                time.sleep(1)
+                self._wakeup.set()
+
+    def _read(self, keys: Sequence[str]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+    def _write(self, items: Dict[str, Tuple[Optional[str], float]]):
+        raise NotImplementedError
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    State in an SQLite database file in WAL mode, for replicas on one host sharing a volume. Readers don't
+    wait for the writer, and writes of a batch commit in one transaction.
+    """
+
+    # Expired rows are deleted every this many written batches
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        self._writer_connection = self._connect()
+        self._batches = 0
+        self._writer_connection.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL) "
+            "WITHOUT ROWID")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable across process crashes, only a power loss can drop the last transactions
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _read(self, keys: Sequence[str]) -> List[Optional[str]]:
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"SELECT key, value FROM state WHERE key IN ({','.join('?' * len(keys))}) AND expires_at > ?",
+                (*keys, time.time())).fetchall()
+        values = dict(rows)
+        return [values.get(key) for key in keys]
+
+    def _write(self, items: Dict[str, Tuple[Optional[str], float]]):
+        now = time.time()
+        connection = self._writer_connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                [(key, value, now + ttl) for key, (value, ttl) in items.items() if value is not None])
+            connection.executemany("DELETE FROM state WHERE key = ?",
+                                   [(key,) for key, (value, _) in items.items() if value is None])
+            self._batches += 1
+            if self._batches % self.PURGE_EVERY == 0:
+                connection.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+class RedisStateBackend(StateBackend):
+    """
+    State in Redis, or any server speaking the Redis protocol. Talks RESP over plain sockets, so no client
+    package is needed. Reads are one MGET and the queued writes one pipeline of SET ... PX and DEL commands.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: Optional[str] = None,
+                 prefix: str = "aws-assistant:", timeout: float = 5, max_connections: int = 16):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._connections: "LifoQueue[_RedisConnection]" = LifoQueue(maxsize=max_connections)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisStateBackend":
+        """
+        redis://[:password@]host[:port][/db]
+        """
+        parsed = urlparse(url)
+        return cls(host=parsed.hostname or "localhost", port=parsed.port or 6379,
+                   db=int(parsed.path.lstrip("/") or 0),
+                   password=unquote(parsed.password) if parsed.password else None, **kwargs)
+
+    def execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Sends `commands` in one pipeline and returns their replies. Error replies are returned, not raised.
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except Empty:
+            connection = _RedisConnection(self.host, self.port, self.timeout)
+            setup = ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.db)] if self.db else [])
+            for reply in connection.execute(setup):
+                if isinstance(reply, StateBackendError):
+                    connection.close()
+                    raise reply
+        try:
+            replies = connection.execute(commands)
+        except Exception:
+            # The connection may be halfway through a reply
+            connection.close()
+            raise
+        try:
+            self._connections.put_nowait(connection)
+        except Exception:
+            connection.close()
+        return replies
+
+    def _read(self, keys: Sequence[str]) -> List[Optional[str]]:
+        reply = self.execute([("MGET", *(self.prefix + key for key in keys))])[0]
+        if isinstance(reply, StateBackendError):
+            raise reply
+        return [value.decode() if value is not None else None for value in reply]
+
+    def _write(self, items: Dict[str, Tuple[Optional[str], float]]):
+        commands = [("SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000))) if value is not None
+                    else ("DEL", self.prefix + key) for key, (value, ttl) in items.items()]
+        for reply in self.execute(commands):
+            if isinstance(reply, StateBackendError):
+                raise reply
+
+    def close(self):
+        super().close()
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except Empty:
+                break
+
+
+class _RedisConnection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile("rb")
+
+    def execute(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        self.socket.sendall(b"".join(_encode(command) for command in commands))
+        return [self._reply() for _ in commands]
+
+    def _reply(self) -> Any:
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the state backend")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return StateBackendError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            return None if length < 0 else self.file.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._reply() for _ in range(length)]
+        raise StateBackendError(f"Unexpected reply {line[:20]!r}")
+
+    def close(self):
+        try:
+            self.file.close()
+            self.socket.close()
+        except OSError:
+            pass
+
+
+def _encode(command: Sequence[Any]) -> bytes:
+    parts = [b"*%d\r\n" % len(command)]
+    for argument in command:
+        argument = argument if isinstance(argument, bytes) else str(argument).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+
+def open_state_backend(url: str) -> StateBackend:
+    """
+    sqlite:///relative/path.db, sqlite:////absolute/path.db or redis://[:password@]host[:port][/db]
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteStateBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://"):
+        return RedisStateBackend.from_url(url)
+    raise ValueError(f"Unsupported state backend {url!r}, use sqlite:///path or redis://host:port/db")
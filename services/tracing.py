@@ -0,0 +1,67 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from agents.tracing import tracing_callbacks
+from tools.telemetry import metrics, trace
+
+HTTP_REQUEST_SECONDS = metrics.histogram("aws_assistant_http_request_seconds",
+                                         "Time to handle a request until the last byte of the response is sent",
+                                         ["method", "route", "status"])
+
+logger = logging.getLogger("aws_assistant.trace")
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that runs every HTTP request in a trace with LangChain tracing enabled, records its
+    latency by route and status, returns the trace id in the X-Trace-Id header and logs the finished trace as
+    one JSON line on the "aws_assistant.trace" logger.
+
+    Streaming responses are timed until their last chunk, since the app only returns once the body is sent.
+    """
+
+    def __init__(self, app: Callable, exclude: tuple = ("/metrics", "/health")):
+        self.app = app
+        self.exclude = set(exclude)
+        self._routes: Dict[Any, str] = {}
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        status: Optional[int] = None
+
+        with trace("http.request", method=scope["method"], path=scope["path"]) as root:
+            trace_id = root.trace.trace_id.encode()
+
+            async def send_with_trace_id(message: Dict[str, Any]):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace_id)]
+                await send(message)
+
+            try:
+                with tracing_callbacks():
+                    await self.app(scope, receive, send_with_trace_id)
+            finally:
+                route = self._route(scope)
+                root.set(route=route, status=status or 500)
+        HTTP_REQUEST_SECONDS.observe(root.seconds, method=scope["method"], route=route, status=status or 500)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(root.trace.as_dict(), default=str))
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        """
+        The path template of the matched route, so path parameters don't create a series per value.
+        """
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            route = next((route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+                         scope["path"])
+            self._routes[endpoint] = route
+        return route
@@ -3,5 +3,22 @@ from tools.aws_cli_delete_tool import AWSCLIDeleteTool
 from tools.aws_cli_describe_tool import AWSCLIDescribeTool
 from tools.aws_cli_update_tool import AWSCLIUpdateTool
 from tools.aws_cli_get_tool import AWSCLIGetTool
+from tools.aws_cli_output_tool import AWSCLIOutputTool
+from tools.aws_cli_tool import AWSCLICommandTool
+from tools.aws_inventory_tool import AWSInventoryTool
+from tools.command import CanonicalCommand, canonicalize, normalize_command, with_aws_prefix
+from tools.confirmation import ConfirmationGate, PendingAction, confirmation_gate
+from tools.deadline import deadline
+from tools.execution_context import ExecutionContext, execution_context, get_execution_context
+from tools.inventory import InventoryCollector, inventory
+from tools.operation_index import OperationIndex, operation_index
+from tools.response_cache import ResponseCache, response_cache
+from tools.scheduler import ExecutionScheduler, SchedulerOverloaded, scheduler
+from tools.single_flight import SingleFlight, single_flight
 
-__all__ = ["AWSCLIDescribeTool", "AWSCLIUpdateTool", "AWSCLICreateTool", "AWSCLIDeleteTool", "AWSCLIGetTool"]
+__all__ = ["AWSCLIDescribeTool", "AWSCLIUpdateTool", "AWSCLICreateTool", "AWSCLIDeleteTool", "AWSCLIGetTool",
+           "AWSCLIOutputTool", "AWSCLICommandTool", "AWSInventoryTool", "CanonicalCommand", "canonicalize",
+           "normalize_command", "with_aws_prefix", "ConfirmationGate", "PendingAction", "confirmation_gate",
+           "deadline", "ExecutionContext", "execution_context", "get_execution_context", "InventoryCollector",
+           "inventory", "OperationIndex", "operation_index", "ResponseCache", "response_cache",
+           "ExecutionScheduler", "SchedulerOverloaded", "scheduler", "SingleFlight", "single_flight"]
@@ -1,6 +1,6 @@
 from typing import Any, Type, Optional
 
-from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from pydantic import BaseModel, Field
 
 from tools.base_aws_cli_tool import AWSCLITool
@@ -24,8 +24,17 @@ class AWSCLIGetTool(AWSCLITool):
             run_manager: Optional[CallbackManagerForToolRun] = None,
             **kwargs: Any,
     ) -> Any:
-        if not aws_cli_command.startswith("aws "):
-            aws_cli_command = f"aws {aws_cli_command}"
         if additional_args:
             aws_cli_command += f" {additional_args}"
         return super()._run(aws_cli_command, run_manager, **kwargs)
+
+    async def _arun(
+            self,
+            aws_cli_command: str,
+            additional_args: Optional[str] = None,
+            run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+            **kwargs: Any,
+    ) -> Any:
+        if additional_args:
+            aws_cli_command += f" {additional_args}"
+        return await super()._arun(aws_cli_command, run_manager, **kwargs)
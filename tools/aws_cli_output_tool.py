@@ -0,0 +1,35 @@
+from typing import Any, Optional, Type
+
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from tools.execution_context import get_execution_context
+from tools.output_pipeline import MAX_LLM_OUTPUT_CHARS, output_buffer, page_output
+
+
+class AWSCLIOutputToolParams(BaseModel):
+    output_id: str = Field(..., description="The output_id returned with a summarized AWS CLI result")
+    offset: int = Field(0, description="Character offset to start reading from, use next_offset to continue")
+    query: Optional[str] = Field(None, description="Optional JMESPath expression to select fields first, "
+                                                   "e.g. 'Reservations[].Instances[].InstanceId'")
+
+
+class AWSCLIOutputTool(BaseTool):
+    name: str = "aws_cli_output_tool"
+    description: str = ("This tool reads the full output of a previous AWS CLI command that was too large and was "
+                        "summarized. Pass its output_id, page with offset and narrow it down with a JMESPath query.")
+    args_schema: Type[AWSCLIOutputToolParams] = AWSCLIOutputToolParams
+
+    def _run(
+            self,
+            output_id: str,
+            offset: int = 0,
+            query: Optional[str] = None,
+            run_manager: Optional[CallbackManagerForToolRun] = None,
+            **kwargs: Any,
+    ) -> Any:
+        output = output_buffer.get(get_execution_context().profile, output_id)
+        if output is None:
+            return {"status": "error", "message": f"No output with id {output_id}. Run the command again."}
+        return page_output(output, offset, MAX_LLM_OUTPUT_CHARS, query)
@@ -0,0 +1,11 @@
+from tools.base_aws_cli_tool import AWSCLITool
+
+
+class AWSCLICommandTool(AWSCLITool):
+    """
+    One tool for every AWS CLI command instead of a tool per verb. Whether a command is a cacheable read or a
+    mutation that waits for the user's confirmation is decided by the operation index, not by the model.
+    """
+    name: str = "aws_cli_tool"
+    description: str = ("Runs an AWS CLI command, e.g. 'aws ec2 describe-instances'. Commands that change "
+                        "resources are held until the user confirms them.")
@@ -0,0 +1,40 @@
+import json
+from typing import Any, Optional, Type
+
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from tools.execution_context import get_execution_context
+from tools.inventory import RESOURCES, inventory
+
+
+class AWSInventoryToolParams(BaseModel):
+    resource: str = Field("defaults", description="One of: " + ", ".join(RESOURCES) + ". 'defaults' returns the "
+                                                  "AMI, instance type, VPC, subnet, security group and key pair "
+                                                  "to use when the user didn't specify them")
+    name_filter: Optional[str] = Field(None, description="Optional text to match against ids, names and other "
+                                                         "fields of the resources")
+
+
+class AWSInventoryTool(BaseTool):
+    name: str = "aws_inventory_lookup_tool"
+    description: str = ("This tool returns the user's prefetched EC2 inventory without calling AWS: default VPC, "
+                        "subnets, security groups, key pairs and current AMI ids. Use it before the AWS CLI "
+                        "tools to fill in missing fields.")
+    args_schema: Type[AWSInventoryToolParams] = AWSInventoryToolParams
+
+    def _run(
+            self,
+            resource: str = "defaults",
+            name_filter: Optional[str] = None,
+            run_manager: Optional[CallbackManagerForToolRun] = None,
+            **kwargs: Any,
+    ) -> Any:
+        if resource not in RESOURCES:
+            return {"status": "error", "message": f"Unknown resource {resource}, use one of {', '.join(RESOURCES)}."}
+        items = inventory.lookup(get_execution_context().profile, resource, name_filter)
+        if items is None:
+            return {"status": "error", "message": "The inventory is not collected yet. "
+                                                  "Look the resources up with an AWS CLI command."}
+        return {"status": "success", "message": json.dumps(items)}
@@ -1,11 +1,54 @@
+import asyncio
 import os
+import signal
 import subprocess
-from typing import Any, Type, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Optional, Tuple, Type
 
-from langchain_core.callbacks import CallbackManagerForToolRun
+from botocore.config import Config
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from tools.boto3_engine import Boto3Engine
+from tools.command import command_service, with_aws_prefix
+from tools.confirmation import hold
+from tools.deadline import capped
+from tools.execution_context import ExecutionContext, get_execution_context
+from tools.inventory import inventory
+from tools.operation_index import operation_index
+from tools.output_pipeline import DEFAULT_MAX_ITEMS, aread_capped, read_capped, shape_output
+from tools.response_cache import response_cache
+from tools.scheduler import Slot, scheduler
+from tools.single_flight import single_flight
+from tools.telemetry import SIZE_BUCKETS, Span, current_span, metrics, span
+
+# "boto3" runs commands in-process when they can be mapped to an API call, "subprocess" always uses the CLI
+EXECUTION_MODE = os.environ.get("AWS_CLI_EXECUTION_MODE", "boto3")
+
+# Seconds a single command may run before its process is killed
+COMMAND_TIMEOUT = float(os.environ.get("AWS_CLI_COMMAND_TIMEOUT") or 120)
+
+boto3_engine = Boto3Engine(client_config=Config(connect_timeout=10, read_timeout=COMMAND_TIMEOUT,
+                                                retries={"mode": "standard"}),
+                           max_clients=int(os.environ.get("AWS_CLIENT_CACHE_SIZE") or 128),
+                           idle_ttl=float(os.environ.get("AWS_CLIENT_IDLE_TTL") or 3600))
+
+AWS_CLI_SECONDS = metrics.histogram("aws_assistant_aws_cli_seconds", "Time to run an AWS CLI command",
+                                    ["mode", "status"])
+AWS_CLI_QUEUE_SECONDS = metrics.histogram("aws_assistant_aws_cli_queue_seconds",
+                                          "Time an AWS CLI command waited for a scheduler slot")
+AWS_CLI_SPAWN_SECONDS = metrics.histogram("aws_assistant_aws_cli_spawn_seconds",
+                                          "Time to start the AWS CLI process")
+AWS_CLI_OUTPUT_BYTES = metrics.histogram("aws_assistant_aws_cli_output_bytes", "Size of AWS CLI command output",
+                                         ["mode"], buckets=SIZE_BUCKETS)
+
+# Bounded pool for the blocking botocore calls made from async tool runs
+boto3_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("AWS_CLI_THREAD_POOL_SIZE") or 16),
+                                    thread_name_prefix="aws-cli-tool")
+
 
 class AWSCLIToolParams(BaseModel):
     aws_cli_command: str = Field(..., description="AWS CLI command")
@@ -13,6 +56,10 @@ class AWSCLIToolParams(BaseModel):
 
 class AWSCLITool(BaseTool):
     args_schema: Type[AWSCLIToolParams] = AWSCLIToolParams
+    execution_mode: str = EXECUTION_MODE
+    # Commands of mutating tools always wait for confirmation. Commands of the other tools are told apart by
+    # their operation, since the model also sends changes through the read tools.
+    mutating: bool = False
 
     def _run(
             self,
@@ -20,12 +67,271 @@ class AWSCLITool(BaseTool):
             run_manager: Optional[CallbackManagerForToolRun] = None,
             **kwargs: Any,
     ) -> dict:
-        my_process = subprocess.Popen(aws_cli_command + f" --profile {os.environ.get('CURRENT_PROFILE')}", shell=True,
-                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = my_process.communicate()
-        stdout = stdout.decode('utf-8') if stdout else ""
-        stderr = stderr.decode('utf-8') if stderr else ""
-        if my_process.returncode != 0:
-            return {"status": "error", "message": stderr}
-        else:
-            return {"status": "success", "message": stdout}
+        aws_cli_command = with_aws_prefix(aws_cli_command)
+        held = hold(self.name, aws_cli_command) if self.is_mutating(aws_cli_command) else None
+        if held is not None:
+            return held
+        return self.run_command(aws_cli_command)
+
+    async def _arun(
+            self,
+            aws_cli_command: str,
+            run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+            **kwargs: Any,
+    ) -> dict:
+        aws_cli_command = with_aws_prefix(aws_cli_command)
+        held = hold(self.name, aws_cli_command) if self.is_mutating(aws_cli_command) else None
+        if held is not None:
+            return held
+        return await self.arun_command(aws_cli_command)
+
+    def is_mutating(self, aws_cli_command: str) -> bool:
+        return self.mutating or operation_index.is_mutating(aws_cli_command)
+
+    def is_cacheable(self, aws_cli_command: str) -> bool:
+        # Reads are served from the response cache, successful mutations invalidate it
+        return not self.is_mutating(aws_cli_command)
+
+    def run_command(self, aws_cli_command: str) -> dict:
+        """
+        Runs a complete command for the current execution context. Used directly to run a confirmed command.
+        """
+        context = get_execution_context()
+        if not self.is_cacheable(aws_cli_command):
+            return self._run_uncached(aws_cli_command, context)
+        cached = response_cache.get(context, aws_cli_command)
+        if cached is not None:
+            return cached
+        # Sessions of the same profile asking for the same read at the same time share one call
+        return single_flight.do(response_cache.key(context, aws_cli_command),
+                                lambda: self._run_uncached(aws_cli_command, context))
+
+    async def arun_command(self, aws_cli_command: str) -> dict:
+        # Resolved here because executor threads don't inherit the request's context variables
+        context = get_execution_context()
+        if not self.is_cacheable(aws_cli_command):
+            return await self._arun_uncached(aws_cli_command, context)
+        cached = response_cache.get(context, aws_cli_command)
+        if cached is not None:
+            return cached
+        return await single_flight.ado(response_cache.key(context, aws_cli_command),
+                                       lambda: self._arun_uncached(aws_cli_command, context))
+
+    def _run_uncached(self, aws_cli_command: str, context: ExecutionContext) -> dict:
+        start = time.perf_counter()
+        result = self._execute(aws_cli_command, context)
+        self._update_cache(aws_cli_command, context, result, time.perf_counter() - start)
+        return result
+
+    async def _arun_uncached(self, aws_cli_command: str, context: ExecutionContext) -> dict:
+        start = time.perf_counter()
+        result = await self._aexecute(aws_cli_command, context)
+        self._update_cache(aws_cli_command, context, result, time.perf_counter() - start)
+        return result
+
+    def _execute(self, aws_cli_command: str, context: ExecutionContext) -> dict:
+        aws_cli_command = _limit_pagination(aws_cli_command)
+        result = None
+        with span("aws_cli", tool=self.name) as current:
+            with scheduler.slot(context.profile) as slot:
+                _record_queue(current)
+                # Commands get what is left of the request's latency budget at most
+                timeout = capped(COMMAND_TIMEOUT)
+                if timeout <= 0:
+                    result, mode = _out_of_time_result(), "skipped"
+                else:
+                    if self.execution_mode == "boto3":
+                        result = self._run_boto3(aws_cli_command, context, timeout, slot)
+                    mode = "boto3" if result is not None else "subprocess"
+                    if result is None:
+                        result = self._run_subprocess(aws_cli_command, context, timeout)
+            _record_result(current, mode, result)
+        return shape_output(result, context.profile)
+
+    async def _aexecute(self, aws_cli_command: str, context: ExecutionContext) -> dict:
+        aws_cli_command = _limit_pagination(aws_cli_command)
+        result = None
+        with span("aws_cli", tool=self.name) as current:
+            async with scheduler.aslot(context.profile) as slot:
+                _record_queue(current)
+                timeout = capped(COMMAND_TIMEOUT)
+                if timeout <= 0:
+                    result, mode = _out_of_time_result(), "skipped"
+                else:
+                    if self.execution_mode == "boto3":
+                        result = await self._arun_boto3(aws_cli_command, context, timeout, slot)
+                    mode = "boto3" if result is not None else "subprocess"
+                    if result is None:
+                        result = await self._arun_subprocess(aws_cli_command, context, timeout)
+            _record_result(current, mode, result)
+        return shape_output(result, context.profile)
+
+    def _update_cache(self, aws_cli_command: str, context: ExecutionContext, result: dict, elapsed: float):
+        if result["status"] != "success":
+            return
+        if self.is_cacheable(aws_cli_command):
+            response_cache.put(context, aws_cli_command, result, elapsed)
+        if self.is_mutating(aws_cli_command):
+            response_cache.invalidate(context, aws_cli_command)
+            if command_service(aws_cli_command) == "ec2":
+                inventory.mark_stale(context.profile)
+
+    @staticmethod
+    def _run_subprocess(aws_cli_command: str, context: ExecutionContext, timeout: float) -> dict:
+        command, env = _subprocess_command(aws_cli_command, context)
+        start = time.perf_counter()
+        # A new session lets us kill the shell together with the aws process it started
+        my_process = subprocess.Popen(command, shell=True, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      start_new_session=True)
+        _record_spawn(time.perf_counter() - start)
+        timed_out = threading.Event()
+        timer = threading.Timer(timeout, lambda: (timed_out.set(), _kill(my_process)))
+        timer.start()
+        # stderr is drained on a thread so a chatty CLI can't block while stdout is read incrementally
+        stderr = []
+        stderr_reader = threading.Thread(target=lambda: stderr.append(my_process.stderr.read()), daemon=True)
+        stderr_reader.start()
+        stdout, truncated = read_capped(my_process.stdout)
+        if truncated:
+            _kill(my_process)
+        my_process.wait()
+        timer.cancel()
+        stderr_reader.join()
+        if timed_out.is_set():
+            return _timeout_result(timeout)
+        return _process_result(my_process.returncode, stdout, stderr[0] if stderr else b"", truncated)
+
+    @staticmethod
+    def _run_boto3(aws_cli_command: str, context: ExecutionContext, timeout: float, slot: Slot) -> Optional[dict]:
+        call = boto3_executor.submit(boto3_engine.execute, aws_cli_command, context)
+        try:
+            return call.result(timeout)
+        except TimeoutError:
+            # Like in _arun_boto3, the call finishes on its thread with the scheduler slot and its result is dropped
+            slot.hold_until(call)
+            return _timeout_result(timeout)
+
+    @staticmethod
+    async def _arun_boto3(aws_cli_command: str, context: ExecutionContext, timeout: float,
+                          slot: Slot) -> Optional[dict]:
+        call = boto3_executor.submit(boto3_engine.execute, aws_cli_command, context)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(call), timeout)
+        except asyncio.TimeoutError:
+            # The call can't be interrupted. It finishes on its thread and keeps the scheduler slot until then,
+            # so later commands queue in the scheduler, within their deadlines, and not in the thread pool.
+            slot.hold_until(call)
+            return _timeout_result(timeout)
+        except BaseException:
+            # Cancelled, e.g. by the executor's max_execution_time
+            slot.hold_until(call)
+            raise
+
+    @staticmethod
+    async def _arun_subprocess(aws_cli_command: str, context: ExecutionContext, timeout: float) -> dict:
+        command, env = _subprocess_command(aws_cli_command, context)
+        start = time.perf_counter()
+        my_process = await asyncio.create_subprocess_shell(command, env=env, stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE, start_new_session=True)
+        _record_spawn(time.perf_counter() - start)
+        stderr_reader = asyncio.ensure_future(my_process.stderr.read())
+        try:
+            stdout, truncated = await asyncio.wait_for(aread_capped(my_process.stdout), timeout)
+        except asyncio.TimeoutError:
+            _kill(my_process)
+            await my_process.wait()
+            stderr_reader.cancel()
+            return _timeout_result(timeout)
+        except BaseException:
+            # Cancelled, e.g. by the executor's max_execution_time, which can expire together with the timeout.
+            # The process group must not outlive the tool call.
+            _kill(my_process)
+            stderr_reader.cancel()
+            raise
+        if truncated:
+            _kill(my_process)
+        await my_process.wait()
+        return _process_result(my_process.returncode, stdout, await stderr_reader, truncated)
+
+
+def _subprocess_command(aws_cli_command: str, context: ExecutionContext) -> Tuple[str, Optional[dict]]:
+    """
+    Builds the shell command and environment for the CLI. Explicit credentials are injected through the
+    environment of the child process only, otherwise the named profile is used.
+    """
+    if not context.credentials and not context.region:
+        return aws_cli_command + f" --profile {context.profile}", None
+    env = os.environ.copy()
+    if context.region:
+        env["AWS_DEFAULT_REGION"] = context.region
+    if not context.credentials:
+        return aws_cli_command + f" --profile {context.profile}", env
+    for name in ("AWS_PROFILE", "AWS_DEFAULT_PROFILE"):
+        env.pop(name, None)
+    env["AWS_ACCESS_KEY_ID"] = context.credentials["AccessKeyId"]
+    env["AWS_SECRET_ACCESS_KEY"] = context.credentials["SecretAccessKey"]
+    if context.credentials.get("SessionToken"):
+        env["AWS_SESSION_TOKEN"] = context.credentials["SessionToken"]
+    return aws_cli_command, env
+
+
+def _record_queue(current: Span):
+    queued = time.perf_counter() - current.start
+    current.set(queue_ms=round(queued * 1000, 3))
+    AWS_CLI_QUEUE_SECONDS.observe(queued)
+
+
+def _record_spawn(seconds: float):
+    AWS_CLI_SPAWN_SECONDS.observe(seconds)
+    current = current_span()
+    if current is not None:
+        current.set(spawn_ms=round(seconds * 1000, 3))
+
+
+def _record_result(current: Span, mode: str, result: dict):
+    output_bytes = len(result.get("message") or "")
+    current.set(mode=mode, status=result["status"], output_bytes=output_bytes)
+    AWS_CLI_SECONDS.observe(time.perf_counter() - current.start, mode=mode, status=result["status"])
+    AWS_CLI_OUTPUT_BYTES.observe(output_bytes, mode=mode)
+
+
+def _kill(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _timeout_result(timeout: float) -> dict:
+    return {"status": "error",
+            "message": f"The command did not finish within {round(timeout, 1):g} seconds and was stopped."}
+
+
+def _out_of_time_result() -> dict:
+    return {"status": "error", "message": "Not executed: the request ran out of time before the command could start."}
+
+
+def _limit_pagination(aws_cli_command: str) -> str:
+    """
+    Caps paginated commands at DEFAULT_MAX_ITEMS items unless they set their own limits. The CLI prints a
+    NextToken the model can continue from with --starting-token. Commands with --query are left alone: the
+    query drops the NextToken, so a capped result couldn't be told apart from a complete one. The output
+    pipeline's size cap still applies to them.
+    """
+    if any(token.partition("=")[0] == "--query" for token in aws_cli_command.split()):
+        return aws_cli_command
+    if DEFAULT_MAX_ITEMS > 0 and boto3_engine.parser.can_paginate(aws_cli_command):
+        return f"{aws_cli_command} --max-items {DEFAULT_MAX_ITEMS}"
+    return aws_cli_command
+
+
+def _process_result(returncode: int, stdout: bytes, stderr: bytes, truncated: bool = False) -> dict:
+    stdout = stdout.decode('utf-8', errors='replace') if stdout else ""
+    stderr = stderr.decode('utf-8', errors='replace') if stderr else ""
+    if truncated:
+        # The process was killed after the byte cap, what was read so far is still useful
+        return {"status": "success", "message": stdout, "truncated": True}
+    if returncode != 0:
+        return {"status": "error", "message": stderr}
+    else:
+        return {"status": "success", "message": stdout}
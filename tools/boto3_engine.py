@@ -0,0 +1,330 @@
+import json
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import botocore.session
+from botocore.config import Config
+import jmespath
+from botocore import xform_name
+from botocore.exceptions import BotoCoreError, ClientError
+
+from tools.execution_context import ExecutionContext
+
+# CLI command names that differ from the botocore service name.
+CLI_SERVICE_ALIASES = {
+    "s3api": "s3",
+    "deploy": "codedeploy",
+    "configservice": "config",
+}
+
+# High-level CLI commands implemented as customizations, never mapped to a single API call.
+UNSUPPORTED_SERVICES = {"s3", "configure", "history", "help"}
+UNSUPPORTED_OPERATIONS = {"wait", "help"}
+
+# Global CLI options that take a value and are understood by the engine.
+VALUE_GLOBAL_OPTIONS = {"--region", "--profile", "--output", "--query", "--max-items", "--page-size",
+                        "--starting-token"}
+# Global CLI options without a value that do not change the result.
+FLAG_GLOBAL_OPTIONS = {"--no-cli-pager", "--no-paginate", "--color", "--no-cli-auto-prompt"}
+
+SCALAR_TYPES = {"string", "integer", "long", "float", "double", "boolean", "timestamp"}
+
+
+class ParsedCommand(NamedTuple):
+    service: str
+    operation: str
+    params: Dict[str, Any]
+    region: Optional[str] = None
+    query: Optional[str] = None
+    paginate: bool = True
+    pagination: Dict[str, Any] = {}
+
+
+class UnsupportedCommand(Exception):
+    """Raised when a command can't be mapped to a single botocore call."""
+
+
+class CommandParser:
+    """
+    Parses `aws <service> <operation> --flags` strings into botocore calls.
+
+    Anything that relies on CLI customizations (shorthand syntax, file:// values, s3 high-level commands,
+    waiters, shell pipelines, ...) is rejected so the caller can fall back to the CLI subprocess.
+    """
+
+    def __init__(self):
+        self.session = botocore.session.get_session()
+        self._lock = threading.Lock()
+        self._operations: Dict[str, Dict[str, str]] = {}
+
+    def parse(self, aws_cli_command: str) -> Optional[ParsedCommand]:
+        try:
+            return self._parse(aws_cli_command)
+        except (UnsupportedCommand, ValueError):
+            return None
+
+    def can_paginate(self, aws_cli_command: str) -> bool:
+        """
+        Whether the command is a plain paginated call without its own page limits, even if its arguments
+        need the CLI.
+        """
+        try:
+            tokens = _tokenize(aws_cli_command)
+        except (UnsupportedCommand, ValueError):
+            return False
+        if len(tokens) < 3 or tokens[0] != "aws" or tokens[1] in UNSUPPORTED_SERVICES:
+            return False
+        if {"--max-items", "--no-paginate", "--starting-token"} & {token.partition("=")[0] for token in tokens}:
+            return False
+        service = CLI_SERVICE_ALIASES.get(tokens[1], tokens[1])
+        try:
+            operation = self._operation_names(service).get(tokens[2])
+            return operation is not None and bool(self.session.get_paginator_model(service).get_paginator(operation))
+        except Exception:
+            return False
+
+    def operation_model(self, service: str, operation: str):
+        return self.session.get_service_model(service).operation_model(operation)
+
+    def _operation_names(self, service: str) -> Dict[str, str]:
+        with self._lock:
+            if service not in self._operations:
+                try:
+                    service_model = self.session.get_service_model(service)
+                except Exception:
+                    raise UnsupportedCommand(f"unknown service {service}")
+                self._operations[service] = {xform_name(name, "-"): name for name in service_model.operation_names}
+            return self._operations[service]
+
+    def _parse(self, aws_cli_command: str) -> ParsedCommand:
+        tokens = _tokenize(aws_cli_command)
+        if len(tokens) < 3 or tokens[0] != "aws":
+            raise UnsupportedCommand("not an aws command")
+        cli_service, cli_operation, args = tokens[1], tokens[2], tokens[3:]
+        if cli_service in UNSUPPORTED_SERVICES or cli_operation in UNSUPPORTED_OPERATIONS:
+            raise UnsupportedCommand(f"{cli_service} {cli_operation} is a CLI customization")
+
+        service = CLI_SERVICE_ALIASES.get(cli_service, cli_service)
+        operation = self._operation_names(service).get(cli_operation)
+        if operation is None:
+            raise UnsupportedCommand(f"unknown operation {cli_operation}")
+        operation_model = self.operation_model(service, operation)
+        if operation_model.has_streaming_input or operation_model.has_streaming_output:
+            raise UnsupportedCommand("streaming operations need the CLI")
+
+        members = operation_model.input_shape.members if operation_model.input_shape else {}
+        arguments = {xform_name(name, "-"): (name, shape) for name, shape in members.items()}
+
+        params: Dict[str, Any] = {}
+        region = query = None
+        paginate = True
+        pagination: Dict[str, Any] = {}
+        for option, values in _group_options(args):
+            if option in FLAG_GLOBAL_OPTIONS:
+                if values:
+                    raise UnsupportedCommand(f"{option} takes no value")
+                paginate = paginate and option != "--no-paginate"
+            elif option in VALUE_GLOBAL_OPTIONS:
+                if len(values) != 1:
+                    raise UnsupportedCommand(f"{option} takes exactly one value")
+                value = values[0]
+                if option == "--region":
+                    region = value
+                elif option == "--output" and value != "json":
+                    raise UnsupportedCommand("only json output is supported in-process")
+                elif option == "--query":
+                    query = value
+                elif option == "--max-items":
+                    pagination["MaxItems"] = int(value)
+                elif option == "--page-size":
+                    pagination["PageSize"] = int(value)
+                elif option == "--starting-token":
+                    pagination["StartingToken"] = value
+            elif option.startswith("--no-") and option[5:] in arguments:
+                name, shape = arguments[option[5:]]
+                if shape.type_name != "boolean" or values:
+                    raise UnsupportedCommand(f"unexpected value for {option}")
+                params[name] = False
+            elif option[2:] in arguments:
+                name, shape = arguments[option[2:]]
+                params[name] = _convert(shape, values)
+            else:
+                raise UnsupportedCommand(f"unknown option {option}")
+        return ParsedCommand(service, operation, params, region, query, paginate, pagination)
+
+
+class Boto3Engine:
+    """
+    Executes parsed commands in-process with clients shared per (profile, region, service).
+
+    Every client is built from the parser's botocore session, so the service models are loaded once however many
+    profiles there are. Explicit credentials are passed to each client, named profiles get a botocore session of
+    their own for their credentials that shares the models. Clients and profile sessions are kept in LRUs of at
+    most `max_clients` entries and dropped once unused for `idle_ttl` seconds.
+    """
+
+    def __init__(self, parser: Optional[CommandParser] = None, client_config: Optional[Config] = None,
+                 max_clients: int = 256, idle_ttl: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.parser = parser or CommandParser()
+        self.client_config = client_config
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        # botocore sessions are not thread-safe while creating clients, clients themselves are.
+        self._lock = threading.Lock()
+        # (profile, region, service) -> [access key id of the explicit credentials or None, client, last use]
+        self._clients: "OrderedDict[Tuple[Optional[str], Optional[str], str], list]" = OrderedDict()
+        # profile -> [botocore session, last use], for profiles used without explicit credentials
+        self._profiles: "OrderedDict[Optional[str], list]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_client(self, context: ExecutionContext, region: Optional[str], service: str):
+        key = (context.profile, region or context.region, service)
+        access_key_id = context.credentials["AccessKeyId"] if context.credentials else None
+        now = self.clock()
+        with self._lock:
+            self._expire(self._clients, now)
+            self._expire(self._profiles, now)
+            entry = self._clients.get(key)
+            if entry is None or entry[0] != access_key_id:
+                # Credentials were rotated, drop every client built from the old ones
+                for client_key in [k for k, v in self._clients.items() if k[0] == context.profile and
+                                   v[0] != access_key_id]:
+                    del self._clients[client_key]
+                entry = self._clients[key] = [access_key_id, self._create_client(context, key[1], service, now),
+                                              now]
+                self._evict(self._clients)
+            entry[2] = now
+            self._clients.move_to_end(key)
+            return entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "profile_sessions": len(self._profiles),
+            "max_clients": self.max_clients,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _create_client(self, context: ExecutionContext, region: Optional[str], service: str, now: float):
+        if context.credentials:
+            return self.parser.session.create_client(
+                service, region_name=region, config=self.client_config,
+                aws_access_key_id=context.credentials["AccessKeyId"],
+                aws_secret_access_key=context.credentials["SecretAccessKey"],
+                aws_session_token=context.credentials.get("SessionToken"),
+            )
+        entry = self._profiles.get(context.profile)
+        if entry is None:
+            session = botocore.session.Session(profile=context.profile)
+            session.register_component("data_loader", self.parser.session.get_component("data_loader"))
+            entry = self._profiles[context.profile] = [session, now]
+            self._evict(self._profiles)
+        entry[1] = now
+        self._profiles.move_to_end(context.profile)
+        return entry[0].create_client(service, region_name=region, config=self.client_config)
+
+    def _evict(self, entries: OrderedDict):
+        while len(entries) > self.max_clients:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def _expire(self, entries: OrderedDict, now: float):
+        # Entries are ordered by last use, so idle ones are always at the front
+        while entries and now - next(iter(entries.values()))[-1] > self.idle_ttl:
+            entries.popitem(last=False)
+            self.expirations += 1
+
+    def execute(self, aws_cli_command: str, context: ExecutionContext) -> Optional[dict]:
+        """
+        Runs the command in-process. Returns None when the command needs the CLI subprocess.
+        """
+        parsed = self.parser.parse(aws_cli_command)
+        if parsed is None:
+            return None
+        return self.execute_parsed(parsed, context)
+
+    def execute_parsed(self, parsed: ParsedCommand, context: ExecutionContext) -> dict:
+        try:
+            client = self.get_client(context, parsed.region, parsed.service)
+            method_name = xform_name(parsed.operation)
+            if parsed.paginate and client.can_paginate(method_name):
+                paginator = client.get_paginator(method_name)
+                response = paginator.paginate(**parsed.params, PaginationConfig=parsed.pagination).build_full_result()
+            else:
+                response = getattr(client, method_name)(**parsed.params)
+        except (ClientError, BotoCoreError) as e:
+            return {"status": "error", "message": str(e)}
+        response.pop("ResponseMetadata", None)
+        if parsed.query:
+            response = jmespath.search(parsed.query, response)
+        return {"status": "success", "message": format_output(response)}
+
+
+def format_output(response: Any) -> str:
+    """
+    Formats a response the way `--output json` does.
+    """
+    if response is None or response == {}:
+        return ""
+    return json.dumps(response, indent=4, default=str, ensure_ascii=False) + "\n"
+
+
+def _tokenize(aws_cli_command: str) -> List[str]:
+    lexer = shlex.shlex(aws_cli_command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    tokens = list(lexer)
+    if any(token and all(char in "();<>|&" for char in token) for token in tokens):
+        raise UnsupportedCommand("shell operators need the CLI")
+    if any("$(" in token or "`" in token for token in tokens):
+        raise UnsupportedCommand("shell substitution needs the CLI")
+    return tokens
+
+
+def _group_options(args: List[str]) -> List[Tuple[str, List[str]]]:
+    options: List[Tuple[str, List[str]]] = []
+    for arg in args:
+        if arg.startswith("--"):
+            option, has_value, value = arg.partition("=")
+            options.append((option, [value] if has_value else []))
+        elif options:
+            options[-1][1].append(arg)
+        else:
+            raise UnsupportedCommand(f"positional argument {arg}")
+    return options
+
+
+def _convert(shape, values: List[str]) -> Any:
+    if any(value.startswith(("file://", "fileb://", "http://", "https://")) for value in values):
+        raise UnsupportedCommand("remote or file parameters need the CLI")
+    type_name = shape.type_name
+    if type_name == "boolean":
+        if not values:
+            return True
+        if len(values) == 1 and values[0].lower() in ("true", "false"):
+            return values[0].lower() == "true"
+        raise UnsupportedCommand("invalid boolean value")
+    if not values:
+        raise UnsupportedCommand("missing value")
+    if type_name in SCALAR_TYPES:
+        if len(values) != 1:
+            raise UnsupportedCommand("too many values")
+        return _convert_scalar(type_name, values[0])
+    if len(values) == 1 and values[0].lstrip().startswith(("{", "[")):
+        return json.loads(values[0])
+    if type_name == "list" and shape.member.type_name in SCALAR_TYPES - {"boolean"}:
+        return [_convert_scalar(shape.member.type_name, value) for value in values]
+    raise UnsupportedCommand("shorthand syntax needs the CLI")
+
+
+def _convert_scalar(type_name: str, value: str) -> Any:
+    if type_name in ("integer", "long"):
+        return int(value)
+    if type_name in ("float", "double"):
+        return float(value)
+    return value
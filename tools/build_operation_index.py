@@ -0,0 +1,53 @@
+"""
+Builds the operation index of tools/operation_index.py from the operation names of the installed botocore
+service models, classified by their verb. Run it whenever botocore is upgraded, the Docker image runs it at
+build time:
+
+    python -m tools.build_operation_index [path]
+"""
+import os
+import sys
+from typing import Dict, Iterable, Tuple
+
+import botocore.session
+from botocore import xform_name
+
+from tools.boto3_engine import CLI_SERVICE_ALIASES
+from tools.operation_index import CLASSES, CLI_COMMANDS, HEADER, MAGIC, OFFSET, OPERATION_INDEX_PATH, classify_name
+
+
+def build(path: str = OPERATION_INDEX_PATH) -> int:
+    """
+    Writes the index for the installed botocore service models to `path`. Returns the number of operations.
+    """
+    cli_names = {service: cli_service for cli_service, service in CLI_SERVICE_ALIASES.items()}
+    session = botocore.session.get_session()
+    entries: Dict[str, str] = {f"{service} {operation}": kind for (service, operation), kind in CLI_COMMANDS.items()}
+    for service in session.get_available_services():
+        cli_service = cli_names.get(service, service)
+        for name in session.get_service_model(service).operation_names:
+            operation = xform_name(name, "-")
+            entries[f"{cli_service} {operation}"] = classify_name(operation)
+    _write(path, sorted(entries.items()))
+    return len(entries)
+
+
+def _write(path: str, entries: Iterable[Tuple[str, str]]):
+    entries = [CLASSES[kind] + key.encode() + b"\n" for key, kind in entries]
+    offset = HEADER.size + OFFSET.size * len(entries)
+    offsets = []
+    for entry in entries:
+        offsets.append(OFFSET.pack(offset))
+        offset += len(entry)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Replaced in one step so running processes keep their mapping of the old file
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        f.writelines(offsets)
+        f.writelines(entries)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else OPERATION_INDEX_PATH
+    print(f"Indexed {build(target)} operations in {target}")
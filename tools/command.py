@@ -0,0 +1,92 @@
+import shlex
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+# Options that don't change what a command returns. `--output json` is what the tools ask for anyway.
+NO_OP_OPTIONS = {"--no-cli-pager", "--color", "--no-cli-auto-prompt"}
+DEFAULT_OPTION_VALUES = {"--output": ("json",)}
+
+SHELL_OPERATORS = set("();<>|&")
+
+
+class CanonicalCommand(NamedTuple):
+    """
+    An AWS CLI command reduced to what it does: the same call spelled with other spacing, quoting, option
+    order, `--option=value` or `--output json` has the same canonical form.
+
+    `args` are (option, values) pairs sorted by option, with the values in their original order. Repeated
+    options stay separate pairs in their original order. Arguments before the first option, like the path of
+    `aws s3 ls`, are kept under the option "".
+    """
+    service: str
+    operation: str
+    args: Tuple[Tuple[str, Tuple[str, ...]], ...] = ()
+
+    def __str__(self) -> str:
+        parts = ["aws", self.service, self.operation]
+        for option, values in self.args:
+            if option:
+                parts.append(option)
+            parts.extend(shlex.quote(value) for value in values)
+        return " ".join(parts)
+
+
+def with_aws_prefix(aws_cli_command: str) -> str:
+    """
+    Prefixes a command with "aws " unless it already starts with it. The model sometimes leaves it out.
+    """
+    aws_cli_command = aws_cli_command.strip()
+    if aws_cli_command.split(None, 1)[:1] == ["aws"]:
+        return aws_cli_command
+    return f"aws {aws_cli_command}"
+
+
+@lru_cache(maxsize=4096)
+def canonicalize(aws_cli_command: str) -> Optional[CanonicalCommand]:
+    """
+    Canonical form of a command, or None for what isn't a single `aws <service> <operation>` call, e.g.
+    commands with shell pipelines, substitutions or unbalanced quotes.
+    """
+    try:
+        lexer = shlex.shlex(with_aws_prefix(aws_cli_command), posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return None
+    if any(token and set(token) <= SHELL_OPERATORS or "$(" in token or "`" in token for token in tokens):
+        return None
+    if len(tokens) < 3 or tokens[1].startswith("-") or tokens[2].startswith("-"):
+        return None
+    args = []
+    for token in tokens[3:]:
+        if token.startswith("--"):
+            option, has_value, value = token.partition("=")
+            args.append((option, [value] if has_value else []))
+        elif args:
+            args[-1][1].append(token)
+        else:
+            args.append(("", [token]))
+    # A stable sort, so repeated options keep their order
+    canonical_args = tuple(sorted(((option, tuple(values)) for option, values in args
+                                   if option not in NO_OP_OPTIONS
+                                   and DEFAULT_OPTION_VALUES.get(option) != tuple(values)),
+                                  key=lambda arg: arg[0]))
+    return CanonicalCommand(tokens[1], tokens[2], canonical_args)
+
+
+def normalize_command(aws_cli_command: str) -> str:
+    """
+    Canonical command line for cache keys. Commands that can't be parsed only get their whitespace collapsed.
+    """
+    canonical = canonicalize(aws_cli_command)
+    if canonical is None:
+        return " ".join(with_aws_prefix(aws_cli_command).split())
+    return str(canonical)
+
+
+def command_service(aws_cli_command: str) -> Optional[str]:
+    canonical = canonicalize(aws_cli_command)
+    if canonical is not None:
+        return canonical.service
+    tokens = with_aws_prefix(aws_cli_command).split()
+    return tokens[1] if len(tokens) > 1 else None
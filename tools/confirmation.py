@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, NamedTuple, Optional
+
+
+class PendingAction(NamedTuple):
+    """
+    A mutating command held back until the user confirms it.
+    """
+    tool: str
+    aws_cli_command: str
+
+
+class ConfirmationGate:
+    """
+    Collects the mutating command of an agent turn instead of running it. Only one command can wait at a time.
+    """
+
+    def __init__(self):
+        self.pending: Optional[PendingAction] = None
+
+
+_current_gate: ContextVar[Optional[ConfirmationGate]] = ContextVar("confirmation_gate", default=None)
+
+
+@contextmanager
+def confirmation_gate(gate: ConfirmationGate) -> Iterator[ConfirmationGate]:
+    """
+    Holds back mutating tool runs started inside the block. Outside of it they run right away.
+    """
+    token = _current_gate.set(gate)
+    try:
+        yield gate
+    finally:
+        _current_gate.reset(token)
+
+
+def hold(tool: str, aws_cli_command: str) -> Optional[dict]:
+    """
+    Records the command on the active gate and returns the tool result that tells the model to ask for
+    confirmation. Returns None when no gate is active and the command should run.
+    """
+    gate = _current_gate.get()
+    if gate is None:
+        return None
+    if gate.pending is not None and gate.pending.aws_cli_command != aws_cli_command:
+        return {"status": "error",
+                "message": "Another command is already waiting for the user's confirmation. "
+                           "Ask the user to confirm that one first."}
+    gate.pending = PendingAction(tool, aws_cli_command)
+    return {"status": "confirmation_required",
+            "message": "Not executed yet: this command changes resources and needs the user's confirmation. "
+                       "Show the user what will be done in plain words and ask them to type 'yes' to proceed "
+                       "or 'no' to cancel. It runs as soon as they confirm, do not call the tool again."}
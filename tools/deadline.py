@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# time.monotonic() by which the work of the current request has to be done
+_current_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Work started inside the block has to finish within `seconds`. An earlier deadline of an enclosing block
+    still applies. None sets no deadline of its own.
+    """
+    at = None if seconds is None else time.monotonic() + seconds
+    outer = _current_deadline.get()
+    if outer is not None and (at is None or outer < at):
+        at = outer
+    token = _current_deadline.set(at)
+    try:
+        yield at
+    finally:
+        _current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left until the current deadline, negative once it passed, or None without a deadline.
+    """
+    at = _current_deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def capped(timeout: float) -> float:
+    """
+    `timeout` shortened to the time left until the current deadline.
+    """
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
@@ -0,0 +1,43 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, NamedTuple, Optional
+
+
+class ExecutionContext(NamedTuple):
+    """
+    Who the AWS CLI tools act as for the current request.
+
+    `credentials` uses the STS shape (AccessKeyId, SecretAccessKey, SessionToken). When it is set it takes
+    precedence over `profile`.
+    """
+    profile: Optional[str] = None
+    region: Optional[str] = None
+    credentials: Optional[Dict] = None
+
+
+_current_execution_context: ContextVar[Optional[ExecutionContext]] = ContextVar("aws_execution_context",
+                                                                               default=None)
+
+
+def get_execution_context() -> ExecutionContext:
+    """
+    Returns the context of the current request, or falls back to the CURRENT_PROFILE environment variable
+    for single-user entry points such as cli.py.
+    """
+    context = _current_execution_context.get()
+    if context is None:
+        context = ExecutionContext(profile=os.environ.get("CURRENT_PROFILE"))
+    return context
+
+
+@contextmanager
+def execution_context(context: ExecutionContext) -> Iterator[ExecutionContext]:
+    """
+    Binds `context` to the current thread or asyncio task. Tasks and tool runs started inside inherit it.
+    """
+    token = _current_execution_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_execution_context.reset(token)
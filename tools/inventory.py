@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from tools.execution_context import ExecutionContext
+
+# Public SSM parameters with the latest AMI ids, resolved in one call instead of searching describe-images
+PUBLIC_AMI_PARAMETERS = {
+    "Amazon Linux 2023 (x86_64)": "/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-x86_64",
+    "Amazon Linux 2023 (arm64)": "/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-arm64",
+    "Amazon Linux 2 (x86_64)": "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2",
+    "Ubuntu 22.04 (x86_64)": "/aws/service/canonical/ubuntu/server/22.04/stable/current/amd64/hvm/ebs-gp2/ami-id",
+}
+DEFAULT_AMI = "Amazon Linux 2023 (x86_64)"
+# Free tier instance type used for auto-filled launches
+DEFAULT_INSTANCE_TYPE = "t2.micro"
+
+RESOURCES = ("defaults", "vpcs", "subnets", "security_groups", "key_pairs", "amis")
+
+
+def _name(item: Dict) -> Optional[str]:
+    return next((tag["Value"] for tag in item.get("Tags", []) if tag.get("Key") == "Name"), None)
+
+
+class InventoryCollector:
+    """
+    Keeps a compact in-memory snapshot of the resources auto-fill needs (VPCs, subnets, security groups, key
+    pairs, AMIs) per profile, with defaults picked from them.
+
+    Profiles are collected once when they are tracked and then refreshed every `interval` seconds on a
+    background thread while they are in use. Lookups only read the snapshot, so they never call AWS.
+    """
+
+    def __init__(self, interval: float = 300, idle_ttl: float = 3600, engine: Any = None,
+                 clock: Callable[[], float] = time.time, max_workers: int = 4):
+        self.interval = interval
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inventory")
+        # profile -> {"context": provider, "next_refresh": ..., "last_used": ..., "running": bool}
+        self._tracked: Dict[str, Dict[str, Any]] = {}
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.collections = 0
+        self.failures = 0
+        self.collect_seconds = 0.0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            # Shares the tools' boto3 clients and credential handling
+            from tools.base_aws_cli_tool import boto3_engine
+            self._engine = boto3_engine
+        return self._engine
+
+    def track(self, profile: str, context: Callable[[], ExecutionContext]):
+        """
+        Starts keeping the inventory of `profile`. `context` returns its current execution context, so
+        refreshes pick up rotated credentials.
+        """
+        with self._lock:
+            entry = self._tracked.get(profile)
+            if entry is None:
+                entry = self._tracked[profile] = {"context": context, "next_refresh": 0, "running": False,
+                                                  "last_used": self.clock()}
+            entry["context"] = context
+            entry["last_used"] = self.clock()
+        self._schedule(profile)
+
+    def get(self, profile: Optional[str]) -> Optional[Dict[str, Any]]:
+        entry = self._tracked.get(profile)
+        if entry is not None:
+            entry["last_used"] = self.clock()
+        return self._snapshots.get(profile)
+
+    def lookup(self, profile: Optional[str], resource: str, text: Optional[str] = None) -> Optional[Any]:
+        """
+        Returns one resource list of the snapshot, or the defaults, optionally filtered by a case-insensitive
+        substring of any field. None when the profile has no snapshot yet.
+        """
+        snapshot = self.get(profile)
+        if snapshot is None:
+            return None
+        items = snapshot[resource]
+        if text and isinstance(items, list):
+            text = text.lower()
+            items = [item for item in items if any(text in str(value).lower() for value in item.values())]
+        return items
+
+    def mark_stale(self, profile: Optional[str]):
+        """
+        Refreshes the profile's snapshot soon, e.g. after a command changed EC2 resources.
+        """
+        entry = self._tracked.get(profile)
+        if entry is not None:
+            entry["next_refresh"] = 0
+            self._schedule(profile)
+
+    def collect(self, context: ExecutionContext) -> Dict[str, Any]:
+        ec2 = self.engine.get_client(context, None, "ec2")
+        ssm = self.engine.get_client(context, None, "ssm")
+        snapshot: Dict[str, Any] = {"errors": {}}
+        collectors = {
+            "vpcs": lambda: [
+                {"VpcId": vpc["VpcId"], "CidrBlock": vpc.get("CidrBlock"), "IsDefault": vpc.get("IsDefault", False),
+                 "Name": _name(vpc)}
+                for vpc in ec2.describe_vpcs()["Vpcs"]],
+            "subnets": lambda: [
+                {"SubnetId": subnet["SubnetId"], "VpcId": subnet["VpcId"],
+                 "AvailabilityZone": subnet.get("AvailabilityZone"), "CidrBlock": subnet.get("CidrBlock"),
+                 "DefaultForAz": subnet.get("DefaultForAz", False),
+                 "MapPublicIpOnLaunch": subnet.get("MapPublicIpOnLaunch", False), "Name": _name(subnet)}
+                for subnet in ec2.describe_subnets()["Subnets"]],
+            "security_groups": lambda: [
+                {"GroupId": group["GroupId"], "GroupName": group.get("GroupName"), "VpcId": group.get("VpcId")}
+                for group in ec2.describe_security_groups()["SecurityGroups"]],
+            "key_pairs": lambda: [
+                {"KeyName": key["KeyName"], "KeyPairId": key.get("KeyPairId")}
+                for key in ec2.describe_key_pairs()["KeyPairs"]],
+            "amis": lambda: self._amis(ec2, ssm),
+        }
+        for resource, collect in collectors.items():
+            try:
+                snapshot[resource] = collect()
+            except Exception as e:
+                snapshot[resource] = []
+                snapshot["errors"][resource] = str(e)
+        snapshot["defaults"] = _defaults(snapshot)
+        snapshot["region"] = context.region
+        snapshot["collected_at"] = self.clock()
+        return snapshot
+
+    @staticmethod
+    def _amis(ec2, ssm) -> List[Dict]:
+        names = {path: name for name, path in PUBLIC_AMI_PARAMETERS.items()}
+        amis = [{"ImageId": parameter["Value"], "Name": names[parameter["Name"]], "Owner": "public"}
+                for parameter in ssm.get_parameters(Names=list(names))["Parameters"]]
+        amis.sort(key=lambda ami: list(PUBLIC_AMI_PARAMETERS).index(ami["Name"]))
+        amis += [{"ImageId": image["ImageId"], "Name": image.get("Name"), "Owner": "self"}
+                 for image in ec2.describe_images(Owners=["self"])["Images"]]
+        return amis
+
+    def start(self, tick: float = 5):
+        """
+        Starts the background thread that refreshes tracked profiles every `interval` seconds. Profiles not
+        looked up for `idle_ttl` seconds are forgotten.
+        """
+        if self._refresher is not None:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(tick,), daemon=True, name="inventory")
+        self._refresher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "profiles": len(self._tracked),
+            "snapshots": len(self._snapshots),
+            "collections": self.collections,
+            "failures": self.failures,
+            "avg_collect_seconds": self.collect_seconds / self.collections if self.collections else 0.0,
+        }
+
+    def _refresh_loop(self, tick: float):
+        while not self._stopped.wait(tick):
+            now = self.clock()
+            for profile, entry in list(self._tracked.items()):
+                if now - entry["last_used"] > self.idle_ttl:
+                    with self._lock:
+                        self._tracked.pop(profile, None)
+                        self._snapshots.pop(profile, None)
+                elif entry["next_refresh"] <= now:
+                    self._schedule(profile)
+
+    def _schedule(self, profile: str):
+        with self._lock:
+            entry = self._tracked.get(profile)
+            if entry is None or entry["running"]:
+                return
+            entry["running"] = True
+        self._executor.submit(self._refresh, profile, entry)
+
+    def _refresh(self, profile: str, entry: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            snapshot = self.collect(entry["context"]())
+            self._snapshots[profile] = snapshot
+            self.collections += 1
+            self.collect_seconds += time.perf_counter() - start
+        except Exception:
+            self.failures += 1
+            traceback.print_exc()
+        finally:
+            entry["next_refresh"] = self.clock() + self.interval
+            entry["running"] = False
+
+
+def _defaults(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    vpcs = snapshot["vpcs"]
+    vpc = next((vpc for vpc in vpcs if vpc["IsDefault"]), vpcs[0] if vpcs else None)
+    vpc_id = vpc["VpcId"] if vpc else None
+    subnets = [subnet for subnet in snapshot["subnets"] if subnet["VpcId"] == vpc_id]
+    subnet = next((subnet for subnet in subnets if subnet["DefaultForAz"]), subnets[0] if subnets else None)
+    group = next((group for group in snapshot["security_groups"]
+                  if group["VpcId"] == vpc_id and group["GroupName"] == "default"), None)
+    ami = next((ami for ami in snapshot["amis"] if ami["Name"] == DEFAULT_AMI), None)
+    return {
+        "ImageId": ami["ImageId"] if ami else None,
+        "ImageName": ami["Name"] if ami else None,
+        "InstanceType": DEFAULT_INSTANCE_TYPE,
+        "VpcId": vpc_id,
+        "SubnetId": subnet["SubnetId"] if subnet else None,
+        "AvailabilityZone": subnet["AvailabilityZone"] if subnet else None,
+        "SecurityGroupId": group["GroupId"] if group else None,
+        "KeyName": snapshot["key_pairs"][0]["KeyName"] if snapshot["key_pairs"] else None,
+    }
+
+
+inventory = InventoryCollector(
+    interval=float(os.environ.get("INVENTORY_REFRESH_INTERVAL") or 300),
+    idle_ttl=float(os.environ.get("INVENTORY_IDLE_TTL") or 3600),
+)
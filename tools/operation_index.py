@@ -0,0 +1,128 @@
+"""
+Index of AWS CLI operations and whether they only read or change resources.
+
+The index is built offline from the botocore service models by tools/build_operation_index.py, loading all of
+them takes seconds, and saved as a small binary file that is memory-mapped on first lookup, so every worker
+process shares the same pages.
+
+The botocore models only say which operations exist. Their class comes from the verb of the operation name
+(`classify_name`) or from CLI_COMMANDS, so a known operation gets the same class from the index as from the verb
+alone. What the index adds is that operations it doesn't know, e.g. misspelled or made up by the model, count
+as mutating even when their name starts with a read verb.
+
+Layout, little-endian: the magic, the number of entries, then one uint32 offset per entry sorted by key, then
+the entries. An entry is its class byte followed by the key "<cli service> <cli operation>" and a newline.
+"""
+import mmap
+import os
+import struct
+import threading
+from typing import Optional
+
+from tools.command import canonicalize
+
+READ = "read"
+MUTATE = "mutate"
+
+OPERATION_INDEX_PATH = os.environ.get("AWS_OPERATION_INDEX") or os.path.join(os.path.dirname(__file__), "data",
+                                                                             "operation_index.bin")
+
+MAGIC = b"AWSOPS1\0"
+HEADER = struct.Struct("<8sI")
+OFFSET = struct.Struct("<I")
+CLASSES = {READ: b"r", MUTATE: b"m"}
+
+# First words of operation names that only read. Anything else, e.g. start, test, export or generate, might
+# change something and has to be confirmed.
+READ_VERBS = ("describe", "get", "list", "search", "lookup", "query", "scan", "select", "head", "check",
+              "validate", "estimate", "preview", "simulate", "download", "batch-get")
+
+# CLI subcommands that are customizations of the CLI and not in the service models
+CLI_COMMANDS = {
+    ("s3", "ls"): READ, ("s3", "presign"): READ, ("s3", "cp"): MUTATE, ("s3", "mv"): MUTATE,
+    ("s3", "rm"): MUTATE, ("s3", "sync"): MUTATE, ("s3", "mb"): MUTATE, ("s3", "rb"): MUTATE,
+    ("s3", "website"): MUTATE, ("configure", "list"): READ, ("configure", "get"): READ,
+    ("configure", "list-profiles"): READ, ("ecr", "get-login-password"): READ, ("eks", "get-token"): READ,
+    ("logs", "tail"): READ, ("cloudformation", "package"): MUTATE, ("cloudformation", "deploy"): MUTATE,
+    ("eks", "update-kubeconfig"): MUTATE,
+}
+# Subcommands every service has that only read
+READ_SUBCOMMANDS = {"wait", "help"}
+
+
+def classify_name(operation: str) -> str:
+    """
+    Class of a CLI operation name by its verb.
+    """
+    return READ if any(operation == verb or operation.startswith(verb + "-") for verb in READ_VERBS) else MUTATE
+
+
+class OperationIndex:
+    """
+    Looks operations up in the memory-mapped index. Without an index file operations are classified by their
+    verb alone, and unknown operations can't be told apart from known ones.
+    """
+
+    def __init__(self, path: str = OPERATION_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        self._loaded = False
+
+    def _load(self) -> Optional[mmap.mmap]:
+        if self._loaded:
+            return self._map
+        with self._lock:
+            if not self._loaded:
+                try:
+                    with open(self.path, "rb") as f:
+                        index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    magic, count = HEADER.unpack_from(index)
+                    if magic != MAGIC:
+                        raise ValueError(f"{self.path} is not an operation index")
+                    self._map, self._count = index, count
+                except (OSError, ValueError) as e:
+                    print(f"Operation index not loaded, classifying operations by verb: {e}")
+                self._loaded = True
+        return self._map
+
+    def lookup(self, service: str, operation: str) -> Optional[str]:
+        """
+        Class of the operation, or None when it isn't in the index.
+        """
+        index = self._load()
+        if index is None:
+            return CLI_COMMANDS.get((service, operation)) or classify_name(operation)
+        key = f"{service} {operation}".encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            (offset,) = OFFSET.unpack_from(index, HEADER.size + OFFSET.size * middle)
+            found = index[offset + 1:index.find(b"\n", offset)]
+            if found == key:
+                return READ if index[offset:offset + 1] == b"r" else MUTATE
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def is_mutating(self, aws_cli_command: str) -> bool:
+        """
+        Whether the command may change resources. Everything that isn't a single known read, like unknown
+        operations or shell pipelines, counts as mutating so it has to be confirmed.
+        """
+        canonical = canonicalize(aws_cli_command)
+        if canonical is None:
+            return True
+        if canonical.operation in READ_SUBCOMMANDS:
+            return False
+        return self.lookup(canonical.service, canonical.operation) != READ
+
+    def __len__(self) -> int:
+        self._load()
+        return self._count
+
+
+operation_index = OperationIndex()
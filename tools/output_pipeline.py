@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import jmespath
+
+# Raw output kept in memory per command. The CLI process is killed once it writes more than this.
+MAX_RAW_OUTPUT_BYTES = int(os.environ.get("AWS_CLI_MAX_RAW_OUTPUT_BYTES") or 8 * 1024 * 1024)
+# Characters of tool output handed to the model. Larger outputs are summarized and kept in the output buffer.
+MAX_LLM_OUTPUT_CHARS = int(os.environ.get("AWS_CLI_MAX_LLM_OUTPUT_CHARS") or 6000)
+# Injected into paginated commands that don't set their own page limits
+DEFAULT_MAX_ITEMS = int(os.environ.get("AWS_CLI_DEFAULT_MAX_ITEMS") or 100)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Field name suffixes that identify a resource, kept when items are projected
+IDENTIFYING_SUFFIXES = ("Id", "Ids", "Name", "Arn", "State", "Status", "Type", "Time", "Date", "Region", "Zone",
+                        "Key", "Value", "Code", "Cidr", "CidrBlock", "Size", "Count")
+
+
+class OutputBuffer:
+    """
+    Side buffer of full raw outputs that were too large for the model, bounded by total size.
+    Entries are scoped to the profile that produced them.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Optional[str], str]]" = OrderedDict()
+        self._size = 0
+
+    def put(self, profile: Optional[str], output: str) -> str:
+        output_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._entries[output_id] = (profile, output)
+            self._size += len(output)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return output_id
+
+    def get(self, profile: Optional[str], output_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(output_id)
+            if entry is None or entry[0] != profile:
+                return None
+            self._entries.move_to_end(output_id)
+            return entry[1]
+
+
+output_buffer = OutputBuffer(max_bytes=int(os.environ.get("AWS_CLI_OUTPUT_BUFFER_BYTES") or 64 * 1024 * 1024))
+
+
+def shape_output(result: dict, profile: Optional[str], limit: int = MAX_LLM_OUTPUT_CHARS) -> dict:
+    """
+    Keeps small results as they are. Large ones are stored in the output buffer and replaced by a summary
+    that tells the model how to page through the rest with `aws_cli_output_tool`.
+    """
+    message = result.get("message") or ""
+    if len(message) <= limit and not result.get("truncated"):
+        return result
+    output_id = output_buffer.put(profile, message)
+    summary = summarize_output(message, limit)
+    notes = [f"Output has {len(message)} characters, showing a summary."]
+    if result.get("truncated"):
+        notes.append(f"The command produced more than {MAX_RAW_OUTPUT_BYTES} bytes and was cut off; "
+                     f"narrow it down with --query, --filters or --max-items.")
+    notes.append(f"Use aws_cli_output_tool with output_id='{output_id}' to read the full output page by page "
+                 f"or to select fields with a JMESPath query.")
+    return {
+        "status": result["status"],
+        "message": summary,
+        "output_id": output_id,
+        "total_chars": len(message),
+        "truncated": bool(result.get("truncated")),
+        "note": " ".join(notes),
+    }
+
+
+def summarize_output(output: str, limit: int = MAX_LLM_OUTPUT_CHARS) -> str:
+    """
+    Projects JSON output to counts, identifying fields and the first items of every list until it fits in
+    `limit` characters. Non-JSON output is cut to its head.
+    """
+    try:
+        data = json.loads(output)
+    except ValueError:
+        return output[:limit]
+    for max_items in (20, 10, 5, 3, 1):
+        summary = json.dumps(_project(data, max_items, depth=0), default=str, separators=(",", ":"))
+        if len(summary) <= limit:
+            return summary
+    return summary[:limit]
+
+
+def _project(value: Any, max_items: int, depth: int) -> Any:
+    if isinstance(value, list):
+        items = [_project(item, max_items, depth + 1) for item in value[:max_items]]
+        if len(value) > max_items:
+            return {"count": len(value), "first_items": items}
+        return items
+    if not isinstance(value, dict):
+        return value
+    if depth < 2:
+        return {key: _project(item, max_items, depth + 1) for key, item in value.items()}
+    # Resource items: keep identifying scalars, reduce nested collections to counts
+    scalars = {key: item for key, item in value.items() if not isinstance(item, (dict, list))}
+    projected = {key: item for key, item in scalars.items() if key.endswith(IDENTIFYING_SUFFIXES)} or scalars
+    for key, item in value.items():
+        if key == "Tags" and isinstance(item, list):
+            projected[key] = item[:max_items]
+        elif isinstance(item, list) and depth < 4 and item and isinstance(item[0], dict):
+            projected[key] = _project(item, max_items, depth + 1)
+        elif isinstance(item, list):
+            projected[key] = {"count": len(item)}
+        elif isinstance(item, dict) and depth < 5:
+            projected[key] = _project(item, max_items, depth + 1)
+    return projected
+
+
+def page_output(output: str, offset: int = 0, length: int = MAX_LLM_OUTPUT_CHARS,
+                query: Optional[str] = None) -> Dict:
+    """
+    Returns one page of a buffered output, optionally after applying a JMESPath query to it.
+    """
+    if query:
+        try:
+            output = json.dumps(jmespath.search(query, json.loads(output)), default=str, indent=1)
+        except (ValueError, jmespath.exceptions.JMESPathError) as e:
+            return {"status": "error", "message": f"Invalid query: {e}"}
+    page = output[offset:offset + length]
+    next_offset = offset + len(page)
+    return {
+        "status": "success",
+        "message": page,
+        "offset": offset,
+        "total_chars": len(output),
+        "next_offset": next_offset if next_offset < len(output) else None,
+    }
+
+
+def read_capped(stream, limit: int = MAX_RAW_OUTPUT_BYTES) -> Tuple[bytes, bool]:
+    """
+    Reads a blocking stream up to `limit` bytes. Returns the data and whether the limit was hit.
+    """
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks), False
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return b"".join(chunks)[:limit], True
+
+
+async def aread_capped(stream, limit: int = MAX_RAW_OUTPUT_BYTES) -> Tuple[bytes, bool]:
+    """
+    Async variant of read_capped for asyncio subprocess streams.
+    """
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks), False
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return b"".join(chunks)[:limit], True
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from tools.command import command_service, normalize_command
+from tools.execution_context import ExecutionContext
+
+# Seconds a read-only response stays valid, per CLI service. Services that change rarely get longer TTLs.
+SERVICE_TTLS = {
+    "ec2": 30,
+    "ecs": 30,
+    "lambda": 60,
+    "rds": 60,
+    "s3api": 60,
+    "dynamodb": 60,
+    "cloudformation": 60,
+    "iam": 300,
+    "organizations": 300,
+    "sts": 900,
+}
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of successful read-only tool results keyed by (profile, region, command). Commands
+    are keyed by their canonical form, so the same read spelled differently is one entry.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 30, service_ttls: Optional[Dict] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.service_ttls = SERVICE_TTLS if service_ttls is None else service_ttls
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at, result, seconds the original call took)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(context: ExecutionContext, aws_cli_command: str) -> Tuple:
+        command = normalize_command(aws_cli_command)
+        return context.profile, context.region, command_service(command), command
+
+    def get(self, context: ExecutionContext, aws_cli_command: str) -> Optional[Any]:
+        key = self.key(context, aws_cli_command)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[1]
+
+    def put(self, context: ExecutionContext, aws_cli_command: str, result: Any, elapsed: float):
+        key = self.key(context, aws_cli_command)
+        ttl = self.service_ttls.get(key[2], self.default_ttl)
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, result, elapsed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, context: ExecutionContext, aws_cli_command: str):
+        """
+        Drops every cached response of the command's service for the profile, after a mutation.
+        """
+        service = command_service(normalize_command(aws_cli_command))
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == context.profile and key[2] == service]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "saved_aws_calls": self.hits,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("AWS_CLI_CACHE_MAX_ENTRIES") or 1024),
+    default_ttl=float(os.environ.get("AWS_CLI_CACHE_TTL") or 30),
+)
@@ -0,0 +1,197 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Iterator, Optional
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when the execution queue is full. The server answers with 429."""
+
+
+class _Waiter:
+    __slots__ = ("user", "event", "loop", "future", "granted", "enqueued_at")
+
+    def __init__(self, user: Hashable, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.user = user
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Slot:
+    """
+    A running slot of the scheduler, released when its block ends unless `hold_until` was called.
+    """
+    __slots__ = ("future",)
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+
+    def hold_until(self, future: Future):
+        """
+        Keeps the slot taken after the block until `future` is done, for work given up on that still runs on a
+        thread. Commands waiting for a slot then can't pile up behind it in the thread pool.
+        """
+        self.future = future
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"count": self.count, "avg": self.total / self.count if self.count else 0.0, "max": self.max}
+
+
+class ExecutionScheduler:
+    """
+    Caps how many AWS CLI commands run at once across all tools.
+
+    Waiting commands are queued per user and slots are handed out round-robin between users, so one user
+    issuing many commands can't starve the others. When the queue is full, `SchedulerOverloaded` is raised
+    right away instead of piling up work.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue_depth: int = 64, max_queue_per_user: int = 8):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_per_user = max_queue_per_user
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+        self._queues: "OrderedDict[Hashable, Deque[_Waiter]]" = OrderedDict()
+        self.rejected = 0
+        self.queue_wait = _Timing()
+        self.execution = _Timing()
+
+    @contextmanager
+    def slot(self, user: Hashable) -> Iterator[Slot]:
+        waiter = self._enqueue(user, None)
+        if waiter is not None:
+            waiter.event.wait()
+            self.queue_wait.observe(time.perf_counter() - waiter.enqueued_at)
+        start = time.perf_counter()
+        taken = Slot()
+        try:
+            yield taken
+        finally:
+            self.execution.observe(time.perf_counter() - start)
+            self._release_after(taken)
+
+    @asynccontextmanager
+    async def aslot(self, user: Hashable) -> AsyncIterator[Slot]:
+        waiter = self._enqueue(user, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._remove(waiter)
+                if granted:
+                    self._release()
+                raise
+            self.queue_wait.observe(time.perf_counter() - waiter.enqueued_at)
+        start = time.perf_counter()
+        taken = Slot()
+        try:
+            yield taken
+        finally:
+            self.execution.observe(time.perf_counter() - start)
+            self._release_after(taken)
+
+    def _release_after(self, taken: Slot):
+        if taken.future is None:
+            self._release()
+        else:
+            # Runs right away if the future is done already
+            taken.future.add_done_callback(lambda _: self._release())
+
+    def _enqueue(self, user: Hashable, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """
+        Takes a free slot and returns None, or queues a waiter and returns it.
+        """
+        with self._lock:
+            if self._running < self.max_concurrency and not self._queued:
+                self._running += 1
+                self.queue_wait.observe(0.0)
+                return None
+            queue = self._queues.get(user)
+            if self._queued >= self.max_queue_depth or (queue and len(queue) >= self.max_queue_per_user):
+                self.rejected += 1
+                raise SchedulerOverloaded("Too many AWS commands are queued, please retry shortly.")
+            waiter = _Waiter(user, loop)
+            if queue is None:
+                queue = self._queues[user] = deque()
+            queue.append(waiter)
+            self._queued += 1
+            return waiter
+
+    def _release(self):
+        with self._lock:
+            if not self._queues:
+                self._running -= 1
+                return
+            # Round-robin: serve the user at the front, then move them to the back if they still wait
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            waiter.granted = True
+        waiter.wake()
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.user)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[waiter.user]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self._queued,
+            "queued_users": len(self._queues),
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait.as_dict(),
+            "execution_seconds": self.execution.as_dict(),
+        }
+
+
+scheduler = ExecutionScheduler(
+    max_concurrency=int(os.environ.get("AWS_CLI_MAX_CONCURRENCY") or 8),
+    max_queue_depth=int(os.environ.get("AWS_CLI_MAX_QUEUE_DEPTH") or 64),
+    max_queue_per_user=int(os.environ.get("AWS_CLI_MAX_QUEUE_PER_USER") or 8),
+)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Identical read-only commands of one profile in flight at the same time share one AWS call
+SINGLE_FLIGHT = os.environ.get("AWS_CLI_SINGLE_FLIGHT", "true").lower() == "true"
+
+
+class _Abandoned(Exception):
+    """Set on a call whose caller was cancelled. The callers waiting for it run the call themselves."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the call, callers arriving while it
+    runs wait for its result, or its exception, instead of running their own. Nothing is kept once the call
+    finished, that's what the response cache is for.
+
+    Threads and coroutines can wait for the same call, the result is shared through a concurrent Future.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return function()
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except _Abandoned:
+                continue
+        try:
+            result = function()
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        self._settle(key, future, result=result)
+        return result
+
+    async def ado(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await function()
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return await asyncio.wrap_future(future)
+            except _Abandoned:
+                continue
+        try:
+            result = await function()
+        except BaseException as e:
+            self._settle(key, future, exception=e)
+            raise
+        self._settle(key, future, result=result)
+        return result
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Returns the future of the call in flight for `key` and whether the caller has to run the call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def _settle(self, key: Hashable, future: Future, result: Any = None,
+                exception: Optional[BaseException] = None):
+        with self._lock:
+            del self._calls[key]
+        if exception is None:
+            future.set_result(result)
+        elif isinstance(exception, Exception):
+            future.set_exception(exception)
+        else:
+            # Cancellation of one request must not fail the requests of other sessions waiting for it
+            future.set_exception(_Abandoned())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "single_flight": self.enabled,
+            "single_flight_calls": self.calls,
+            "coalesced_calls": self.coalesced,
+            "in_flight": len(self._calls),
+        }
+
+
+single_flight = SingleFlight(enabled=SINGLE_FLIGHT)